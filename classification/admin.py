@@ -19,12 +19,12 @@ class MLModelAdmin(admin.ModelAdmin):
     readonly_fields = [
         'created_at', 'updated_at', 'training_started_at', 
         'training_completed_at', 'model_size_display', 
-        'is_training_complete'
+        'is_training_complete', 'dataset_snapshot_version', 'dataset_snapshot_hash'
     ]
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'description', 'model_type', 'dataset')
+            'fields': ('name', 'description', 'model_type', 'dataset', 'dataset_snapshot_version', 'dataset_snapshot_hash')
         }),
         ('Training Configuration', {
             'fields': ('parameters', 'status', 'is_trained'),
@@ -17,7 +17,11 @@ from api.schemas import (
     HyperparameterOptimizationOut, ModelComparisonOut, ModelComparisonCreateIn,
     MessageResponse, ErrorResponse
 )
-from .tasks import start_model_training, predict_domains, optimize_hyperparameters
+from .tasks import start_model_training, predict_domains, predict_domains_batch, optimize_hyperparameters
+from .model_registry import get_model_registry
+from .micro_batching import get_micro_batcher, micro_batching_enabled
+from . import prediction_cache, execution_profiles, warmup, shared_weights
+from .result_writer import get_result_writer
 
 router = Router()
 
@@ -260,10 +264,7 @@ def classify_single(request: HttpRequest, payload: ClassificationIn):
             model = get_object_or_404(MLModel, id=payload.model_id, is_trained=True)
         else:
             # Use best available model (highest F1 score) that has a model file
-            model = MLModel.objects.filter(
-                is_trained=True,
-                model_path__isnull=False  # Only models with actual files
-            ).exclude(model_path='').order_by('-f1_score').first()
+            model = warmup.serving_candidates().first()
             
             if not model:
                 return ErrorResponse(
@@ -307,8 +308,9 @@ def classify_batch(request: HttpRequest, payload: BatchClassificationIn):
     """
     Classify multiple medical articles at once
     
-    Performs batch classification on multiple articles. More efficient than
-    individual requests for processing multiple articles.
+    Performs batch classification on multiple articles. The model is loaded once,
+    articles are classified in batched chunks and results are saved with a single
+    bulk insert, which is much more efficient than individual requests.
     """
     try:
         # Get model to use
@@ -324,41 +326,27 @@ def classify_batch(request: HttpRequest, payload: BatchClassificationIn):
                     error="No trained models available for classification"
                 )
         
-        # Process each article using actual prediction
-        results = []
+        # Classify all articles with a single model load and bulk insert
         processing_start = timezone.now()
         
-        for article in payload.articles:
-            # Call the actual prediction function
-            prediction_result = predict_domains(
-                model.id,
-                article.title,
-                article.abstract,
-                payload.threshold or 0.5
+        predictions = predict_domains_batch(
+            model,
+            [{'title': article.title, 'abstract': article.abstract} for article in payload.articles],
+            payload.threshold or 0.5
+        )
+        
+        results = [
+            ClassificationOut(
+                title=article.title,
+                predicted_domains=prediction.get("predicted_domains", []),
+                confidence_scores=prediction.get("confidence_scores", {}),
+                prediction_threshold=payload.threshold or 0.5,
+                inference_time_ms=prediction.get("inference_time_ms", 0.0),
+                model_used=model.name,
+                created_at=timezone.now()
             )
-            
-            # Check if prediction was successful
-            if prediction_result.get("status") == "success":
-                results.append(ClassificationOut(
-                    title=article.title,
-                    predicted_domains=prediction_result.get("predicted_domains", []),
-                    confidence_scores=prediction_result.get("confidence_scores", {}),
-                    prediction_threshold=payload.threshold or 0.5,
-                    inference_time_ms=prediction_result.get("inference_time_ms", 0.0),
-                    model_used=model.name,
-                    created_at=timezone.now()
-                ))
-            else:
-                # Add failed prediction with empty results but proper structure
-                results.append(ClassificationOut(
-                    title=article.title,
-                    predicted_domains=[],
-                    confidence_scores={},
-                    prediction_threshold=payload.threshold or 0.5,
-                    inference_time_ms=0.0,
-                    model_used=model.name,
-                    created_at=timezone.now()
-                ))
+            for article, prediction in zip(payload.articles, predictions)
+        ]
         
         processing_end = timezone.now()
         processing_time = (processing_end - processing_start).total_seconds()
@@ -374,6 +362,53 @@ def classify_batch(request: HttpRequest, payload: BatchClassificationIn):
         return ErrorResponse(error=str(e), details={"type": "batch_classification_error"})
 
 
+@router.get("/inference-stats", tags=["Classification"])
+def inference_stats(request: HttpRequest):
+    """
+    Get inference serving statistics for this process
+    
+    Returns model registry usage, prediction cache hit/miss counters,
+    write-behind result buffer state, micro-batching metrics (batch-size distribution and queueing delay),
+    warm-up readiness and unique vs shared process memory for tuning latency/throughput.
+    """
+    return {
+        "model_registry": get_model_registry().stats(),
+        "prediction_cache": prediction_cache.stats(),
+        "result_writer": get_result_writer().stats(),
+        "micro_batching": {
+            "enabled": micro_batching_enabled(),
+            **get_micro_batcher().stats()
+        },
+        "execution_profile": execution_profiles.status(),
+        "warmup": warmup.status(),
+        "shared_weights": shared_weights.status()
+    }
+
+
+@router.get("/ready", response={200: dict, 503: dict}, tags=["Classification"])
+def readiness(request: HttpRequest):
+    """
+    Readiness probe for this process
+    
+    Returns 200 once the hot models are loaded and have answered a synthetic
+    prediction (or warm-up is disabled), 503 while they are still warming, so
+    load balancers only route traffic to warm processes.
+    """
+    state = warmup.status()
+    return (200 if state['ready'] else 503), state
+
+
+@router.get("/execution-profile", tags=["Classification"])
+def execution_profile(request: HttpRequest):
+    """
+    Get the CPU execution profile of this process
+    
+    Returns the active profile (thread counts, tokenizer choice and why they were
+    chosen), the detected platform and the thread counts torch reports.
+    """
+    return execution_profiles.status()
+
+
 @router.get("/predictions", response=List[ClassificationResultOut], tags=["Classification"])
 @paginate(PageNumberPagination)
 def list_predictions(request: HttpRequest, model_id: Optional[int] = None):
@@ -457,6 +492,10 @@ def delete_model(request: HttpRequest, model_id: int):
         model_name = model.name
         model.delete()
         
+        # Release the loaded model from this process' registry and drop its cached predictions
+        get_model_registry().invalidate(model_id)
+        prediction_cache.invalidate_model(model_id)
+        
         return MessageResponse(
             message=f"Model '{model_name}' has been deleted successfully",
             success=True
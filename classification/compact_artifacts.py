@@ -0,0 +1,197 @@
+"""
+Compact artifact format for TF-IDF + linear models
+Replaces the pickled TfidfVectorizer and estimators with a small JSON manifest
+and plain .npy arrays (sorted vocabulary, IDF weights, fused linear head) that
+are memory-mapped on load, so load time and memory no longer grow with the
+size of a Python vocabulary dict
+"""
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, List
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = 'tfidf-linear'
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+
+# TfidfVectorizer parameters that affect transform(); callables cannot be stored
+VECTORIZER_PARAMS = [
+    'input', 'encoding', 'decode_error', 'strip_accents', 'lowercase', 'analyzer',
+    'stop_words', 'token_pattern', 'ngram_range', 'binary', 'norm', 'use_idf',
+    'smooth_idf', 'sublinear_tf',
+]
+
+
+def compact_dir(model_path: str) -> str:
+    """Directory holding the compact artifact of a ``.pkl`` model"""
+    return os.path.splitext(model_path)[0] + '_compact'
+
+
+def has_compact_artifact(model_path: str) -> bool:
+    return os.path.exists(os.path.join(compact_dir(model_path), MANIFEST_NAME))
+
+
+def remove_compact_artifact(model_path: str):
+    directory = compact_dir(model_path)
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+
+
+class CompactTfidfVectorizer:
+    """
+    TF-IDF transform over a sorted, memory-mapped vocabulary array
+
+    Produces the same matrix as the fitted ``TfidfVectorizer`` it was built
+    from: fitted vocabularies are sorted, so column ``j`` is ``vocabulary[j]``
+    and terms are looked up with a binary search over the whole batch.
+    """
+
+    def __init__(self, vocabulary: np.ndarray, idf: np.ndarray, params: Dict[str, Any], dtype: str = 'float64'):
+        self.vocabulary = vocabulary
+        self.idf_ = idf
+        self.params = params
+        self.dtype = np.dtype(dtype)
+        # Only the tokenization settings are needed to analyze new text
+        analyzer_params = {
+            name: value for name, value in params.items()
+            if name not in ('norm', 'use_idf', 'smooth_idf', 'sublinear_tf', 'binary')
+        }
+        self._analyze = TfidfVectorizer(**analyzer_params).build_analyzer()
+
+    @property
+    def n_features(self) -> int:
+        return len(self.vocabulary)
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer: TfidfVectorizer) -> 'CompactTfidfVectorizer':
+        params = vectorizer.get_params()
+        for name in ('preprocessor', 'tokenizer', 'analyzer'):
+            if callable(params.get(name)):
+                raise ValueError(f"Vectorizers with a custom {name} cannot be stored compactly")
+        if params['stop_words'] is not None and not isinstance(params['stop_words'], str):
+            params['stop_words'] = sorted(params['stop_words'])
+
+        vocabulary = np.array(vectorizer.get_feature_names_out(), dtype=str)
+        if np.any(vocabulary[1:] < vocabulary[:-1]):
+            raise ValueError("Vectorizer vocabulary is not in sorted column order")
+
+        stored = {name: params[name] for name in VECTORIZER_PARAMS}
+        stored['ngram_range'] = list(stored['ngram_range'])
+        idf = np.asarray(vectorizer.idf_, dtype=np.float64) if vectorizer.use_idf else np.ones(len(vocabulary))
+        return cls(vocabulary, idf, stored, np.dtype(vectorizer.dtype).name)
+
+    def transform(self, texts: List[str]):
+        """Return the (n_texts, n_features) CSR TF-IDF matrix"""
+        rows, terms = [], []
+        for i, text in enumerate(texts):
+            tokens = self._analyze(text)
+            terms.extend(tokens)
+            rows.extend([i] * len(tokens))
+
+        if terms and self.n_features:
+            lookup = np.asarray(terms)
+            rows = np.asarray(rows, dtype=np.int64)
+            # Terms longer than the longest vocabulary entry cannot match; dropping them
+            # lets the lookup use the vocabulary's own dtype, so the mapped array is not copied
+            fits = np.char.str_len(lookup) <= self.vocabulary.dtype.itemsize // 4
+            lookup = lookup[fits].astype(self.vocabulary.dtype)
+            rows = rows[fits]
+            columns = np.minimum(np.searchsorted(self.vocabulary, lookup), self.n_features - 1)
+            known = self.vocabulary[columns] == lookup
+            rows = rows[known]
+            columns = columns[known]
+        else:
+            rows = columns = np.empty(0, dtype=np.int64)
+
+        X = sp.csr_matrix(
+            (np.ones(len(columns), dtype=np.float64), (rows, columns)),
+            shape=(len(texts), self.n_features)
+        )
+        X.sum_duplicates()
+
+        if self.params['binary']:
+            X.data[:] = 1.0
+        if self.params['sublinear_tf']:
+            np.log(X.data, X.data)
+            X.data += 1.0
+        if self.params['use_idf']:
+            X.data *= self.idf_[X.indices]
+        if self.params['norm']:
+            X = normalize(X, norm=self.params['norm'], copy=False)
+        return X.astype(self.dtype, copy=False)
+
+
+def save_compact(model_path: str, vectorizer: TfidfVectorizer, fused_head: Any, metadata: Dict[str, Any]) -> str:
+    """Write the compact artifact next to ``model_path`` and return its directory
+
+    Args:
+        model_path: The model's ``.pkl`` path
+        vectorizer: The fitted TfidfVectorizer
+        fused_head: The model's FusedLinearHead
+        metadata: Model fields stored in the manifest (algorithm, labels, ...)
+    """
+    compact = CompactTfidfVectorizer.from_vectorizer(vectorizer)
+
+    directory = compact_dir(model_path)
+    remove_compact_artifact(model_path)
+    os.makedirs(directory)
+
+    arrays = {'vocabulary': compact.vocabulary, 'idf': compact.idf_}
+    arrays.update({name: getattr(fused_head, name) for name in fused_head.ARRAYS})
+    files = {}
+    for name, array in arrays.items():
+        files[name] = f"{name}.npy"
+        np.save(os.path.join(directory, files[name]), np.ascontiguousarray(array), allow_pickle=False)
+
+    manifest = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        **metadata,
+        'n_features': compact.n_features,
+        'vectorizer': {**compact.params, 'dtype': compact.dtype.name},
+        'files': files,
+    }
+    with open(os.path.join(directory, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    logger.info(f"Saved compact artifact to {directory} ({compact.n_features} features)")
+    return directory
+
+
+def load_compact(model_path: str, mmap: bool = True) -> Dict[str, Any]:
+    """Read a compact artifact; arrays are memory-mapped read-only unless ``mmap`` is False
+
+    Returns:
+        The manifest plus 'vectorizer' (CompactTfidfVectorizer) and 'arrays'
+        (the fused head arrays by name)
+    """
+    directory = compact_dir(model_path)
+    with open(os.path.join(directory, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != FORMAT_NAME or manifest.get('version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported compact artifact {manifest.get('format')} v{manifest.get('version')}")
+
+    mmap_mode = 'r' if mmap else None
+    arrays = {
+        name: np.load(os.path.join(directory, filename), mmap_mode=mmap_mode, allow_pickle=False)
+        for name, filename in manifest['files'].items()
+    }
+
+    params = dict(manifest['vectorizer'])
+    dtype = params.pop('dtype')
+    params['ngram_range'] = tuple(params['ngram_range'])
+    vectorizer = CompactTfidfVectorizer(arrays.pop('vocabulary'), arrays.pop('idf'), params, dtype)
+
+    if vectorizer.n_features != manifest['n_features']:
+        raise ValueError(f"Compact artifact {directory} is inconsistent with its manifest")
+
+    return {**manifest, 'vectorizer': vectorizer, 'arrays': arrays}
@@ -0,0 +1,216 @@
+"""
+CPU execution profiles for PyTorch training and inference
+Chooses per-process intra-op/inter-op thread counts and tokenizer settings from the
+platform, the usable cores and how many ML worker processes share the host
+"""
+import logging
+import os
+import platform
+import threading
+from typing import Any, Dict, Optional
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+# Profile names
+AUTO = 'auto'
+CPU = 'cpu'            # Share the host's cores between ML processes, fast tokenizers
+M1_SAFE = 'm1_safe'    # Single thread, slow tokenizers, MPS disabled (Apple Silicon stability)
+
+EXECUTION_PROFILES = [AUTO, CPU, M1_SAFE]
+
+# Process roles
+TRAINING = 'training'
+PREDICTION = 'prediction'
+
+EXECUTION_ROLES = [TRAINING, PREDICTION]
+
+
+class ExecutionProfile:
+    """Resolved thread and tokenizer settings for one process"""
+
+    def __init__(self, name: str, role: str, intra_op_threads: int, inter_op_threads: int,
+                 use_fast_tokenizer: bool, disable_mps: bool, host_processes: int,
+                 available_cpus: int, reason: str):
+        self.name = name
+        self.role = role
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.use_fast_tokenizer = use_fast_tokenizer
+        self.disable_mps = disable_mps
+        self.host_processes = host_processes
+        self.available_cpus = available_cpus
+        self.reason = reason
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'role': self.role,
+            'intra_op_threads': self.intra_op_threads,
+            'inter_op_threads': self.inter_op_threads,
+            'use_fast_tokenizer': self.use_fast_tokenizer,
+            'disable_mps': self.disable_mps,
+            'host_processes': self.host_processes,
+            'available_cpus': self.available_cpus,
+            'reason': self.reason,
+        }
+
+
+def is_apple_silicon() -> bool:
+    return platform.machine() == 'arm64' and platform.system() == 'Darwin'
+
+
+def available_cpus() -> int:
+    """Cores this process may use, honouring CPU affinity and cgroup (container) quotas"""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+
+    # cgroup v2 quota, e.g. "200000 100000" for two cores
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            quota, period = f.read().split()[:2]
+        if quota != 'max':
+            cpus = min(cpus, max(1, int(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, cpus)
+
+
+# Hints recorded by the Celery worker parent process before it forks its pool
+_process_hints: Dict[str, Any] = {}
+
+
+def set_process_hints(role: Optional[str] = None, host_processes: Optional[int] = None):
+    """Record what this (Celery) process serves and how many processes share the host"""
+    if role:
+        _process_hints['role'] = role
+    if host_processes:
+        _process_hints['host_processes'] = host_processes
+
+
+def role_for_queues(queues) -> str:
+    """Role of a Celery worker consuming ``queues``; mixed workers count as prediction"""
+    queues = set(queues)
+    if TRAINING in queues and PREDICTION not in queues:
+        return TRAINING
+    return PREDICTION
+
+
+def resolve_profile(name: str = AUTO, role: Optional[str] = None, host_processes: int = 0,
+                    intra_op_threads: int = 0) -> ExecutionProfile:
+    """Work out the execution profile for this process
+
+    Args:
+        name: 'auto', 'cpu' or 'm1_safe'
+        role: 'training' or 'prediction' (defaults to the Celery hint, then prediction)
+        host_processes: ML processes sharing this host (0 = Celery concurrency hint, else 1)
+        intra_op_threads: Explicit per-process thread count (0 = derive from the core budget)
+    """
+    if name not in EXECUTION_PROFILES:
+        raise ValueError(f"Unsupported execution profile: {name}")
+
+    role = role or _process_hints.get('role', PREDICTION)
+    host_processes = max(1, host_processes or _process_hints.get('host_processes', 1))
+    cpus = available_cpus()
+
+    if name == M1_SAFE or (name == AUTO and is_apple_silicon()):
+        reason = 'requested' if name == M1_SAFE else 'Apple Silicon detected'
+        return ExecutionProfile(M1_SAFE, role, 1, 1, use_fast_tokenizer=False, disable_mps=True,
+                                host_processes=host_processes, available_cpus=cpus, reason=reason)
+
+    # Split the cores evenly so concurrent worker processes don't oversubscribe the host
+    budget = max(1, cpus // host_processes)
+    intra = intra_op_threads or budget
+    # Training benefits from a second inter-op thread for independent backward ops
+    inter = 2 if role == TRAINING and intra >= 4 else 1
+    reason = f"{cpus} cpus / {host_processes} processes"
+    return ExecutionProfile(CPU, role, intra, inter, use_fast_tokenizer=True, disable_mps=False,
+                            host_processes=host_processes, available_cpus=cpus, reason=reason)
+
+
+def profile_from_settings() -> ExecutionProfile:
+    """Resolve the profile from Django settings when they are configured"""
+    options = {}
+    try:
+        from django.conf import settings
+        if settings.configured:
+            options = {
+                'name': getattr(settings, 'ML_EXECUTION_PROFILE', AUTO),
+                'role': getattr(settings, 'ML_EXECUTION_ROLE', '') or None,
+                'host_processes': getattr(settings, 'ML_HOST_PROCESSES', 0),
+                'intra_op_threads': getattr(settings, 'ML_INTRA_OP_THREADS', 0),
+            }
+    except ImportError:
+        pass
+    return resolve_profile(**options)
+
+
+_active_profile: Optional[ExecutionProfile] = None
+_apply_lock = threading.Lock()
+
+
+def apply_profile(profile: ExecutionProfile) -> ExecutionProfile:
+    """Apply a profile to torch and the native thread pools of this process"""
+    global _active_profile
+    with _apply_lock:
+        threads = str(profile.intra_op_threads)
+        os.environ['OMP_NUM_THREADS'] = threads
+        os.environ['MKL_NUM_THREADS'] = threads
+        # Tokenizer threads would fight torch for the same cores (and are not fork safe)
+        os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+
+        torch.set_num_threads(profile.intra_op_threads)
+        try:
+            torch.set_num_interop_threads(profile.inter_op_threads)
+        except RuntimeError:
+            # Only settable before the first inter-op parallel work in the process
+            logger.debug("Inter-op thread count already fixed for this process")
+
+        if profile.disable_mps:
+            os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '0'
+            if hasattr(torch.backends, 'mps'):
+                torch.backends.mps.enabled = False
+
+        _active_profile = profile
+
+    logger.info(
+        f"Execution profile '{profile.name}' ({profile.role}): {profile.intra_op_threads} intra-op / "
+        f"{profile.inter_op_threads} inter-op threads, fast tokenizer {profile.use_fast_tokenizer} "
+        f"[{profile.reason}]"
+    )
+    return profile
+
+
+def ensure_profile() -> ExecutionProfile:
+    """Return the active profile, applying the configured one on first use"""
+    if _active_profile is None:
+        return apply_profile(profile_from_settings())
+    return _active_profile
+
+
+def get_active_profile() -> Optional[ExecutionProfile]:
+    return _active_profile
+
+
+def status() -> Dict[str, Any]:
+    """Active profile plus what torch actually reports, for the status endpoint"""
+    profile = _active_profile
+    return {
+        'active': profile.as_dict() if profile else None,
+        'platform': {
+            'system': platform.system(),
+            'machine': platform.machine(),
+            'apple_silicon': is_apple_silicon(),
+            'cpu_count': os.cpu_count(),
+            'available_cpus': available_cpus(),
+        },
+        'torch': {
+            'num_threads': torch.get_num_threads(),
+            'num_interop_threads': torch.get_num_interop_threads(),
+        },
+        'pid': os.getpid(),
+    }
@@ -8,6 +8,7 @@ from typing import Dict, List, Callable, Any, Optional
 import numpy as np
 from sklearn.model_selection import cross_val_score
 from .ml_models import create_model, TransformerClassifier, TraditionalMLClassifier
+from . import token_cache
 
 logger = logging.getLogger(__name__)
 
@@ -18,9 +19,18 @@ class HyperparameterOptimizer:
     Supports both transformer and traditional ML models
     """
     
-    def __init__(self, model_type: str, optimization_metric: str = 'f1_macro'):
+    def __init__(self, model_type: str, optimization_metric: str = 'f1_macro',
+                 calibrated_max_lengths: Optional[Dict[str, int]] = None):
+        """
+        Args:
+            model_type: Model type to optimize
+            optimization_metric: Metric to maximize
+            calibrated_max_lengths: max_length per BERT-family model calibrated on the
+                training data; trials use these instead of searching over max_length
+        """
         self.model_type = model_type
         self.optimization_metric = optimization_metric
+        self.calibrated_max_lengths = calibrated_max_lengths or {}
         self.study = None
         self.best_params = None
         self.training_data = None
@@ -39,7 +49,11 @@ class HyperparameterOptimizer:
         # Additional transformer-specific parameters
         if 'bert' in self.model_type:
             bert_model = trial.suggest_categorical('bert_model', ['biobert', 'clinicalbert', 'scibert'])
-            max_length = trial.suggest_categorical('max_length', [256, 512])
+            if bert_model in self.calibrated_max_lengths:
+                max_length = self.calibrated_max_lengths[bert_model]
+                trial.set_user_attr('max_length', max_length)
+            else:
+                max_length = trial.suggest_categorical('max_length', [256, 512])
         else:
             bert_model = self.model_type
             max_length = 512
@@ -156,6 +170,8 @@ class HyperparameterOptimizer:
             
             # Set ensemble weights
             model.weights = {'transformer': transformer_weight, 'traditional': traditional_weight}
+            if transformer_type in self.calibrated_max_lengths:
+                model.transformer_classifier.max_length = self.calibrated_max_lengths[transformer_type]
             
             texts, labels = self.training_data
             
@@ -233,6 +249,7 @@ class HyperparameterOptimizer:
         
         # Run optimization
         try:
+            cache_before = token_cache.stats()
             self.study.optimize(
                 objective_fn,
                 n_trials=n_trials,
@@ -247,6 +264,18 @@ class HyperparameterOptimizer:
             logger.info(f"Best {self.optimization_metric}: {best_value:.4f}")
             logger.info(f"Best parameters: {self.best_params}")
             
+            # Trials sharing a tokenizer and max_length reuse one tokenization of the data
+            cache_after = token_cache.stats()
+            cache_stats = {
+                'hits': cache_after['hits'] - cache_before['hits'],
+                'misses': cache_after['misses'] - cache_before['misses'],
+                'tokenize_seconds': round(cache_after['tokenize_seconds'] - cache_before['tokenize_seconds'], 2),
+            }
+            logger.info(
+                f"Token cache over the study: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                f"{cache_stats['tokenize_seconds']}s tokenizing"
+            )
+            
             # Analyze optimization results
             trials_df = self.study.trials_dataframe()
             
@@ -257,7 +286,8 @@ class HyperparameterOptimizer:
                 'optimization_metric': self.optimization_metric,
                 'study': self.study,
                 'trials_dataframe': trials_df,
-                'model_type': self.model_type
+                'model_type': self.model_type,
+                'token_cache': cache_stats
             }
             
         except Exception as e:
@@ -297,7 +327,7 @@ class HyperparameterOptimizer:
         # Create model based on type
         if self.model_type in ['bert', 'biobert', 'clinicalbert', 'scibert']:
             bert_model = params.pop('bert_model', self.model_type)
-            max_length = params.pop('max_length', 512)
+            max_length = params.pop('max_length', self.calibrated_max_lengths.get(bert_model, 512))
             
             return create_model(
                 model_type=self.model_type,
@@ -327,6 +357,8 @@ class HyperparameterOptimizer:
                 transformer_type=transformer_type,
                 traditional_algorithm=traditional_algorithm
             )
+            if transformer_type in self.calibrated_max_lengths:
+                model.transformer_classifier.max_length = self.calibrated_max_lengths[transformer_type]
             
             # Set optimized ensemble weights
             if 'transformer_weight' in params:
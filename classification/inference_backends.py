@@ -0,0 +1,160 @@
+"""
+Alternative inference backends for trained transformer classifiers
+Exports the eager PyTorch model of a ``model_<id>_model`` directory to TorchScript
+or ONNX next to its weights and runs the exported graph for serving
+"""
+import logging
+import os
+from typing import Dict, List
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+# Optional ONNX Runtime support (not installed on every platform)
+try:
+    import onnxruntime as ort
+    ONNX_RUNTIME_AVAILABLE = True
+except ImportError:
+    ort = None
+    ONNX_RUNTIME_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+EAGER = 'eager'
+TORCHSCRIPT = 'torchscript'
+ONNX = 'onnx'
+
+INFERENCE_BACKENDS = [EAGER, TORCHSCRIPT, ONNX]
+
+ARTIFACT_NAMES = {
+    TORCHSCRIPT: 'model.torchscript.pt',
+    ONNX: 'model.onnx',
+}
+
+
+def artifact_path(model_dir: str, backend: str) -> str:
+    """Location of a backend's exported graph inside the model directory"""
+    return os.path.join(model_dir, ARTIFACT_NAMES[backend])
+
+
+def model_input_names(tokenizer) -> List[str]:
+    """Tokenizer outputs the exported graph takes, in positional order"""
+    return [
+        name for name in ('input_ids', 'attention_mask', 'token_type_ids')
+        if name in tokenizer.model_input_names
+    ]
+
+
+class _LogitsModule(nn.Module):
+    """Wraps a HF sequence classifier as a positional-args -> logits module for export"""
+
+    def __init__(self, model: nn.Module, input_names: List[str]):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        kwargs = dict(zip(self.input_names, inputs))
+        return self.model(**kwargs, return_dict=False)[0]
+
+
+class TorchScriptBackend:
+    """Runs a traced TorchScript graph"""
+
+    name = TORCHSCRIPT
+
+    def __init__(self, path: str, input_names: List[str]):
+        self.module = torch.jit.load(path, map_location='cpu')
+        self.module.eval()
+        self.input_names = input_names
+
+    def run(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        with torch.no_grad():
+            logits = self.module(*[inputs[name].cpu() for name in self.input_names])
+        return logits.float().numpy()
+
+
+class OnnxBackend:
+    """Runs an exported ONNX graph with ONNX Runtime on CPU"""
+
+    name = ONNX
+
+    def __init__(self, path: str, input_names: List[str]):
+        if not ONNX_RUNTIME_AVAILABLE:
+            raise ImportError("onnxruntime is not installed")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Follow the thread budget torch was given for this process
+        options.intra_op_num_threads = torch.get_num_threads()
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        self.input_names = input_names
+
+    def run(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        feed = {name: inputs[name].cpu().numpy().astype(np.int64) for name in self.input_names}
+        return self.session.run(None, feed)[0].astype(np.float32)
+
+
+def load_backend(backend: str, model_dir: str, backend_metadata: Dict):
+    """Load an exported backend, refusing artifacts that failed their parity check
+
+    Args:
+        backend: 'torchscript' or 'onnx'
+        model_dir: The ``model_<id>_model`` directory
+        backend_metadata: The backend's entry in the model's metadata JSON
+    """
+    if backend not in ARTIFACT_NAMES:
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    if not backend_metadata.get('parity_passed'):
+        raise ValueError(f"No {backend} export with a passing parity check for {model_dir}")
+
+    path = artifact_path(model_dir, backend)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{backend} artifact not found at {path}")
+
+    if backend == TORCHSCRIPT:
+        return TorchScriptBackend(path, backend_metadata['input_names'])
+    return OnnxBackend(path, backend_metadata['input_names'])
+
+
+def export_backend(backend: str, model: nn.Module, tokenizer, model_dir: str,
+                   example_inputs: Dict[str, torch.Tensor]) -> str:
+    """Export the eager model for ``backend`` and return the artifact path"""
+    input_names = model_input_names(tokenizer)
+    module = _LogitsModule(model.cpu().eval(), input_names).eval()
+    args = tuple(example_inputs[name] for name in input_names)
+    path = artifact_path(model_dir, backend)
+
+    with torch.no_grad():
+        if backend == TORCHSCRIPT:
+            traced = torch.jit.trace(module, args, strict=False)
+            traced = torch.jit.freeze(traced)
+            traced.save(path)
+        elif backend == ONNX:
+            dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+            dynamic_axes['logits'] = {0: 'batch'}
+            torch.onnx.export(
+                module,
+                args,
+                path,
+                input_names=input_names,
+                output_names=['logits'],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                do_constant_folding=True
+            )
+        else:
+            raise ValueError(f"Unsupported inference backend: {backend}")
+
+    logger.info(f"Exported {backend} graph to {path}")
+    return path
+
+
+def check_parity(reference: np.ndarray, candidate: np.ndarray, atol: float = 1e-4) -> Dict:
+    """Compare backend logits with the eager model's logits"""
+    max_abs_diff = float(np.abs(reference - candidate).max()) if reference.size else 0.0
+    return {
+        'max_abs_diff': max_abs_diff,
+        'atol': atol,
+        'parity_passed': bool(max_abs_diff <= atol),
+    }
@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Management command to benchmark cold-load time and peak memory of a trained model's artifact formats
+"""
+import multiprocessing
+import os
+import queue
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from classification.models import MLModel
+from classification import weight_files, compact_artifacts
+
+# Artifact formats of traditional models (and the traditional half of hybrids)
+PICKLE = 'pickle'
+COMPACT = 'compact'
+
+
+def _build_model(spec, mode):
+    """Create the classifier described by ``spec``, set up to load with ``mode``"""
+    from classification.ml_models import TransformerClassifier, TraditionalMLClassifier, HybridEnsembleClassifier
+
+    if spec['kind'] == 'transformer':
+        return TransformerClassifier(model_type=spec['model_type'], weights_load_mode=mode)
+    if spec['kind'] == 'traditional':
+        return TraditionalMLClassifier(algorithm=spec['algorithm'], use_compact_artifact=(mode == COMPACT))
+    ml_model = HybridEnsembleClassifier(
+        transformer_type=spec['transformer_type'], traditional_algorithm=spec['algorithm']
+    )
+    ml_model.traditional_classifier.use_compact_artifact = (mode == COMPACT)
+    return ml_model
+
+
+def _cold_load(model_file_path, spec, mode, results):
+    """Load the model in a fresh process and report time and memory (runs in a spawned child)"""
+    import django
+    django.setup()
+    from classification import memory_stats
+
+    ml_model = _build_model(spec, mode)
+    rss_before = memory_stats.current_rss_mb()
+    start = time.perf_counter()
+    ml_model.load_model(model_file_path)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ml_model.predict_batch(["Cold start probe for the first prediction"])
+    first_prediction_ms = (time.perf_counter() - start) * 1000
+
+    breakdown = memory_stats.memory_breakdown()
+    results.put({
+        'load_seconds': load_seconds,
+        'first_prediction_ms': first_prediction_ms,
+        'peak_increase_mb': memory_stats.peak_rss_mb() - rss_before,
+        'rss_increase_mb': memory_stats.current_rss_mb() - rss_before,
+        'unique_mb': breakdown.get('unique_mb', 0.0),
+        'shared_mb': breakdown.get('shared_mb', 0.0),
+    })
+
+
+class Command(BaseCommand):
+    help = 'Benchmark cold-load time and peak memory of pickled vs memory-mapped model artifacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_id',
+            type=int,
+            help='ID of the trained model to benchmark'
+        )
+        parser.add_argument(
+            '--modes',
+            default='',
+            help='Comma separated load modes to compare (default: bin,safetensors,mmap for BERT-family '
+                 'models, pickle,compact for traditional/hybrid models; unavailable ones are skipped)'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Fresh processes per load mode (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = MLModel.objects.get(id=options['model_id'], is_trained=True)
+        except MLModel.DoesNotExist:
+            raise CommandError(f"Trained model {options['model_id']} not found")
+
+        if not model.model_path:
+            raise CommandError(f"Model {model.id} has no model file")
+
+        model_file_path = os.path.join(settings.MEDIA_ROOT, str(model.model_path))
+        if not os.path.exists(model_file_path):
+            raise CommandError(f"Model file not found at {model_file_path}")
+
+        parameters = model.parameters or {}
+        if model.model_type in ['traditional', 'hybrid']:
+            algorithm_key = 'algorithm' if model.model_type == 'traditional' else 'traditional_algorithm'
+            spec = {
+                'kind': model.model_type,
+                'algorithm': parameters.get(algorithm_key, 'svm'),
+                'transformer_type': parameters.get('transformer_type', 'biobert'),
+            }
+            runnable = self._traditional_modes(model, model_file_path, options['modes'] or f"{PICKLE},{COMPACT}")
+        elif os.path.isdir(model_file_path):
+            spec = {
+                'kind': 'transformer',
+                'model_type': parameters.get('bert_model', 'biobert') if model.model_type == 'bert' else model.model_type,
+            }
+            runnable = self._transformer_modes(model_file_path, options['modes'] or 'bin,safetensors,mmap')
+        else:
+            raise CommandError(f"Model type {model.model_type} has no alternative artifact formats")
+
+        if not runnable:
+            raise CommandError("None of the requested load modes is available for this model")
+
+        self.stdout.write(f"Cold-loading model {model.id}: {model.name}, {options['repeat']} fresh processes per mode\n")
+        self.stdout.write(
+            f"{'mode':<12} {'load s':>8} {'1st pred ms':>12} {'peak +MB':>9} {'rss +MB':>9} "
+            f"{'unique MB':>10} {'shared MB':>10}"
+        )
+
+        # Spawned (not forked) children so every load starts without warm allocator state
+        context = multiprocessing.get_context('spawn')
+        for mode in runnable:
+            runs = []
+            for _ in range(options['repeat']):
+                results = context.Queue()
+                process = context.Process(target=_cold_load, args=(model_file_path, spec, mode, results))
+                process.start()
+                process.join()
+                try:
+                    runs.append(results.get(timeout=10))
+                except queue.Empty:
+                    self.stdout.write(self.style.ERROR(f"{mode:<12} ❌ load failed (exit code {process.exitcode})"))
+                    break
+            if not runs:
+                continue
+
+            median = {key: float(np.median([run[key] for run in runs])) for key in runs[0]}
+            self.stdout.write(
+                f"{mode:<12} {median['load_seconds']:>8.2f} {median['first_prediction_ms']:>12.1f} "
+                f"{median['peak_increase_mb']:>9.1f} {median['rss_increase_mb']:>9.1f} "
+                f"{median['unique_mb']:>10.1f} {median['shared_mb']:>10.1f}"
+            )
+
+        self.stdout.write("\nMedians over the fresh processes. Memory-mapped arrays are file-backed pages: they count")
+        self.stdout.write("towards RSS once touched, but are shared through the page cache and can be reclaimed.")
+
+    def _transformer_modes(self, model_file_path, modes_option):
+        modes = [mode.strip() for mode in modes_option.split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in weight_files.LOAD_MODES]
+        if unknown:
+            raise CommandError(f"Unsupported load modes: {', '.join(unknown)}")
+
+        available = weight_files.weights_format(model_file_path)
+        has_legacy = os.path.exists(os.path.join(model_file_path, weight_files.LEGACY_NAME))
+        runnable = []
+        for mode in modes:
+            if mode == weight_files.LEGACY and not has_legacy:
+                self.stdout.write(self.style.WARNING(f"Skipping {mode}: no {weight_files.LEGACY_NAME}"))
+            elif mode in (weight_files.SAFETENSORS, weight_files.MMAP) and available != weight_files.SAFETENSORS:
+                self.stdout.write(self.style.WARNING(
+                    f"Skipping {mode}: no {weight_files.SAFETENSORS_NAME} (run convert_to_safetensors --keep-legacy)"
+                ))
+            else:
+                runnable.append(mode)
+        return runnable
+
+    def _traditional_modes(self, model, model_file_path, modes_option):
+        modes = [mode.strip() for mode in modes_option.split(',') if mode.strip()]
+        unknown = [mode for mode in modes if mode not in (PICKLE, COMPACT)]
+        if unknown:
+            raise CommandError(f"Unsupported load modes: {', '.join(unknown)}")
+
+        traditional_path = model_file_path
+        if model.model_type == 'hybrid':
+            traditional_path = model_file_path.replace('.pkl', '_traditional.pkl')
+        runnable = []
+        for mode in modes:
+            if mode == COMPACT and not compact_artifacts.has_compact_artifact(traditional_path):
+                self.stdout.write(self.style.WARNING(
+                    f"Skipping {mode}: no compact artifact (run convert_compact_artifacts)"
+                ))
+            else:
+                runnable.append(mode)
+        return runnable
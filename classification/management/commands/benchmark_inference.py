@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+"""
+Management command to benchmark inference latency and throughput of a trained model
+"""
+import os
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from classification.models import MLModel
+from classification.model_registry import build_inference_model
+from classification.ml_models import TransformerClassifier, TraditionalMLClassifier, HybridEnsembleClassifier
+from classification.inference_backends import EAGER
+from dataset_management.models import DatasetSample
+
+
+class Command(BaseCommand):
+    help = 'Benchmark inference latency and throughput of a trained model'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_id',
+            type=int,
+            help='ID of the trained model to benchmark'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=128,
+            help='Number of dataset samples to classify (default: 128)'
+        )
+        parser.add_argument(
+            '--batch-sizes',
+            default='1,8,16,32',
+            help='Comma separated micro-batch sizes for the batched path (default: 1,8,16,32)'
+        )
+        parser.add_argument(
+            '--backends',
+            default='',
+            help='Comma separated transformer backends to compare, e.g. eager,torchscript,onnx'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of timed runs per configuration (default: 3)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = MLModel.objects.get(id=options['model_id'], is_trained=True)
+        except MLModel.DoesNotExist:
+            raise CommandError(f"Trained model {options['model_id']} not found")
+
+        if not model.model_path:
+            raise CommandError(f"Model {model.id} has no model file")
+
+        model_file_path = os.path.join(settings.MEDIA_ROOT, str(model.model_path))
+        if not os.path.exists(model_file_path):
+            raise CommandError(f"Model file not found at {model_file_path}")
+
+        texts = self._load_texts(model, options['samples'])
+        if not texts:
+            raise CommandError(f"No samples found in dataset {model.dataset_id}")
+
+        self.stdout.write(f"Loading model {model.id}: {model.name} ({model.model_type})")
+        ml_model = build_inference_model(model)
+        ml_model.load_model(model_file_path)
+
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',') if size.strip()]
+        repeat = options['repeat']
+
+        self.stdout.write(f"Benchmarking on {len(texts)} texts, {repeat} runs per configuration\n")
+        rows = []
+
+        backends = [backend.strip() for backend in options['backends'].split(',') if backend.strip()]
+        if backends:
+            if not isinstance(ml_model, TransformerClassifier):
+                raise CommandError("--backends is only supported for transformer models")
+            self._benchmark_backends(ml_model, model_file_path, backends, texts, batch_sizes, repeat)
+            return
+
+        if isinstance(ml_model, TransformerClassifier):
+            if ml_model.model is None:
+                # Configured with an exported backend; the baseline needs the eager model
+                ml_model = TransformerClassifier(model_type=ml_model.model_type, backend=EAGER)
+                ml_model.load_model(model_file_path)
+            ml_model.model.eval()
+            # Original behaviour: one forward pass per text, padded to max_length
+            rows.append(self._time_configuration(
+                'per-text, max_length padding',
+                lambda: ml_model._predict_logits(texts, batch_size=1, dynamic_padding=False),
+                len(texts), repeat
+            ))
+            for batch_size in batch_sizes:
+                rows.append(self._time_configuration(
+                    f'batched ({batch_size}), dynamic padding',
+                    lambda: ml_model._predict_logits(texts, batch_size=batch_size),
+                    len(texts), repeat
+                ))
+        elif isinstance(ml_model, TraditionalMLClassifier) and ml_model.fused_head is not None:
+            # Original behaviour: one predict_proba call per label estimator
+            rows.append(self._time_configuration(
+                'per-label predict_proba',
+                lambda: ml_model._score_matrix(ml_model.vectorizer.transform(texts), use_fused=False),
+                len(texts), repeat
+            ))
+            rows.append(self._time_configuration(
+                'fused sparse matmul',
+                lambda: ml_model._score_matrix(ml_model.vectorizer.transform(texts)),
+                len(texts), repeat
+            ))
+            X = ml_model.vectorizer.transform(texts)
+            max_diff = np.abs(ml_model._score_matrix(X) - ml_model._score_matrix(X, use_fused=False)).max()
+            self.stdout.write(f"Fused vs per-label max score difference: {max_diff:.2e}\n")
+        elif isinstance(ml_model, HybridEnsembleClassifier):
+            self._benchmark_hybrid(ml_model, texts, batch_sizes, repeat)
+            return
+        else:
+            rows.append(self._time_configuration(
+                'predict',
+                lambda: ml_model.predict(texts),
+                len(texts), repeat
+            ))
+
+        self._print_rows(rows)
+
+    def _benchmark_backends(self, reference, model_file_path, backends, texts, batch_sizes, repeat):
+        """Per-request latency percentiles and batched throughput for each serving backend"""
+        self.stdout.write(
+            f"{'backend':<12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+            + ' '.join(f"{f'texts/s@{size}':>12}" for size in batch_sizes)
+        )
+        for backend in backends:
+            ml_model = TransformerClassifier(model_type=reference.model_type, backend=backend)
+            ml_model.load_model(model_file_path)
+            if backend != EAGER and ml_model.inference_backend is None:
+                self.stdout.write(self.style.WARNING(f"{backend:<12} not exported (run export_inference_backends)"))
+                continue
+
+            # Single-text requests, as served by classify_single
+            ml_model.predict_batch(texts[:1])
+            latencies_ms = []
+            for _ in range(repeat):
+                for text in texts:
+                    start = time.perf_counter()
+                    ml_model.predict_batch([text])
+                    latencies_ms.append((time.perf_counter() - start) * 1000)
+            p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+
+            throughputs = []
+            for batch_size in batch_sizes:
+                row = self._time_configuration(
+                    f'{backend} batched ({batch_size})',
+                    lambda: ml_model.predict_batch(texts, batch_size=batch_size),
+                    len(texts), repeat
+                )
+                throughputs.append(row['texts_per_second'])
+
+            self.stdout.write(
+                f"{backend:<12} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} "
+                + ' '.join(f"{throughput:>12.1f}" for throughput in throughputs)
+            )
+
+    def _benchmark_hybrid(self, ml_model, texts, batch_sizes, repeat):
+        """Sequential vs concurrent components, with and without pipelined stages"""
+        configurations = [('sequential', False, 0), ('concurrent', True, 0)]
+        configurations += [(f'pipelined ({size})', True, size) for size in batch_sizes if size < len(texts)]
+        
+        rows, timings = [], []
+        for name, concurrent, stage_size in configurations:
+            ml_model.concurrent_components = concurrent
+            rows.append(self._time_configuration(
+                name,
+                lambda: ml_model.predict_batch(texts, batch_size=stage_size or len(texts)),
+                len(texts), repeat
+            ))
+            timings.append(ml_model.last_timing)
+        
+        self._print_rows(rows)
+        self.stdout.write(f"\n{'configuration':<40} {'transformer ms':>15} {'traditional ms':>15} {'wall ms':>9} {'overlap ms':>11}")
+        for row, timing in zip(rows, timings):
+            self.stdout.write(
+                f"{row['name']:<40} {timing['transformer_ms']:>15.1f} {timing['traditional_ms']:>15.1f} "
+                f"{timing['wall_ms']:>9.1f} {timing['overlap_ms']:>11.1f}"
+            )
+    
+    def _load_texts(self, model, limit):
+        """Return combined title + abstract texts from the model's dataset"""
+        samples = DatasetSample.objects.filter(dataset=model.dataset).values_list('title', 'abstract')[:limit]
+        return [f"{title} {abstract}".strip() for title, abstract in samples]
+
+    def _time_configuration(self, name, run, num_texts, repeat):
+        """Time ``run`` after one untimed warm-up call"""
+        run()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            run()
+            timings.append(time.perf_counter() - start)
+
+        best = min(timings)
+        return {
+            'name': name,
+            'mean_s': float(np.mean(timings)),
+            'best_s': best,
+            'ms_per_text': best / num_texts * 1000,
+            'texts_per_second': num_texts / best if best > 0 else 0.0,
+        }
+
+    def _print_rows(self, rows):
+        baseline = rows[0]['best_s']
+        self.stdout.write(f"{'configuration':<40} {'mean s':>9} {'best s':>9} {'ms/text':>9} {'texts/s':>9} {'speedup':>8}")
+        for row in rows:
+            speedup = baseline / row['best_s'] if row['best_s'] > 0 else 0.0
+            self.stdout.write(
+                f"{row['name']:<40} {row['mean_s']:>9.3f} {row['best_s']:>9.3f} "
+                f"{row['ms_per_text']:>9.2f} {row['texts_per_second']:>9.1f} {speedup:>7.2f}x"
+            )
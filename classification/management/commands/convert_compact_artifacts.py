@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""
+Management command to convert pickled traditional/hybrid models to the compact manifest + .npy format
+"""
+import os
+import pickle
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from classification.ml_models import TraditionalMLClassifier, HybridEnsembleClassifier
+from classification.compact_artifacts import compact_dir, has_compact_artifact, remove_compact_artifact
+
+
+class Command(BaseCommand):
+    help = 'Convert pickled traditional/hybrid model artifacts (e.g. model_13.pkl) to the compact mmap format'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help='.pkl files to convert (default: every .pkl under MODEL_STORAGE_PATH)'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Rewrite compact artifacts that already exist'
+        )
+        parser.add_argument(
+            '--verify-samples',
+            type=int,
+            default=64,
+            help='Synthetic texts scored by both formats to verify the conversion (default: 64)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list what would be converted'
+        )
+
+    def handle(self, *args, **options):
+        paths = options['paths']
+        if not paths:
+            root = str(settings.MODEL_STORAGE_PATH)
+            if not os.path.isdir(root):
+                raise CommandError(f"Directory not found: {root}")
+            paths = sorted(
+                os.path.join(directory, name)
+                for directory, _dirs, files in os.walk(root)
+                for name in files if name.endswith('.pkl')
+            )
+
+        converted = 0
+        for path in paths:
+            if not os.path.isfile(path):
+                self.stdout.write(self.style.ERROR(f"❌ {path}: not found"))
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    data = pickle.load(f)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ {path}: cannot unpickle ({str(e)})"))
+                continue
+
+            if isinstance(data, dict) and 'transformer_path' in data:
+                converted += self._convert_hybrid(path, data, options)
+            elif isinstance(data, dict) and 'vectorizer' in data:
+                converted += self._convert_traditional(path, options)
+            else:
+                self.stdout.write(f"   {path}: not a traditional or hybrid model, skipped")
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted} artifacts"))
+
+    def _convert_traditional(self, path, options) -> int:
+        if has_compact_artifact(path) and not options['force']:
+            self.stdout.write(f"   {path}: compact artifact already exists (use --force to rewrite)")
+            return 0
+        if options['dry_run']:
+            self.stdout.write(f"   {path}: would write {compact_dir(path)}")
+            return 0
+
+        model = TraditionalMLClassifier(use_compact_artifact=False)
+        model.load_model(path)
+        if model.fused_head is None:
+            self.stdout.write(self.style.WARNING(
+                f"⚠️  {path}: {model.algorithm} is not linear, only linear models have a compact format"
+            ))
+            return 0
+
+        pickle_size = os.path.getsize(path)
+        directory = model.save_compact(path)
+
+        try:
+            max_diff = self._verify(model, path, options['verify_samples'])
+        except ValueError as e:
+            remove_compact_artifact(path)
+            self.stdout.write(self.style.ERROR(f"❌ {path}: {str(e)}, compact artifact removed"))
+            return 0
+        compact_size = sum(
+            os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {path}: {pickle_size / (1024 * 1024):.1f} MB pickle -> {compact_size / (1024 * 1024):.1f} MB "
+            f"compact, max |Δscore| {max_diff:.2e}"
+        ))
+        return 1
+
+    def _convert_hybrid(self, path, data, options) -> int:
+        """Make component paths relative and convert the traditional component"""
+        traditional_path = HybridEnsembleClassifier._component_path(path, data['traditional_path'])
+        relative = {
+            key: os.path.basename(data[key]) for key in ('transformer_path', 'traditional_path')
+        }
+
+        if options['dry_run']:
+            self.stdout.write(f"   {path}: hybrid, would store relative component paths and convert its traditional part")
+            return self._convert_traditional(traditional_path, options)
+
+        if any(data[key] != value for key, value in relative.items()):
+            with open(path, 'wb') as f:
+                pickle.dump({**data, **relative}, f)
+            self.stdout.write(f"   {path}: component paths made relative")
+        return self._convert_traditional(traditional_path, options)
+
+    def _verify(self, model, path, samples) -> float:
+        """Max score difference between the pickled model and its compact artifact on synthetic texts
+
+        Raises:
+            ValueError: If the compact artifact cannot be loaded or scores differently
+        """
+        if samples <= 0:
+            return 0.0
+        vocabulary = model.vectorizer.get_feature_names_out()
+        rng = np.random.default_rng(42)
+        texts = [
+            ' '.join(rng.choice(vocabulary, size=min(40, len(vocabulary)), replace=False))
+            for _ in range(samples)
+        ]
+
+        compact = TraditionalMLClassifier()
+        compact.load_model(path)
+        if compact.classifier is not None:
+            raise ValueError("compact artifact was written but could not be loaded")
+
+        max_diff = float(np.abs(model.predict_batch(texts).scores - compact.predict_batch(texts).scores).max())
+        tfidf_diff = abs(model.vectorizer.transform(texts) - compact.vectorizer.transform(texts)).max()
+        if tfidf_diff > 1e-6 or max_diff > 1e-4:
+            raise ValueError(f"compact artifact differs from the pickle (max |Δscore| {max_diff:.2e})")
+        return max_diff
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Management command to convert pickled transformer weights in media/trained_models/ to safetensors
+"""
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from transformers import AutoModelForSequenceClassification
+from classification.ml_models import TransformerClassifier
+from classification.weight_files import LEGACY_NAME, SAFETENSORS, SAFETENSORS_NAME, convert_to_safetensors
+
+
+class Command(BaseCommand):
+    help = 'Convert pytorch_model.bin artifacts to model.safetensors so they can be memory-mapped'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=str(settings.MODEL_STORAGE_PATH),
+            help='Directory to scan for model directories (default: MODEL_STORAGE_PATH)'
+        )
+        parser.add_argument(
+            '--keep-legacy',
+            action='store_true',
+            help='Keep pytorch_model.bin next to the converted weights'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the model directories that would be converted'
+        )
+
+    def handle(self, *args, **options):
+        root = options['path']
+        if not os.path.isdir(root):
+            raise CommandError(f"Directory not found: {root}")
+
+        # Hybrid models keep their transformer in a nested *_transformer_model directory
+        model_dirs = sorted(
+            directory for directory, _dirs, files in os.walk(root)
+            if LEGACY_NAME in files and 'config.json' in files
+        )
+        pending = [d for d in model_dirs if not os.path.exists(os.path.join(d, SAFETENSORS_NAME))]
+        already = len(model_dirs) - len(pending)
+
+        self.stdout.write(f"🔍 {len(pending)} model directories to convert under {root}")
+        if already:
+            self.stdout.write(f"   {already} already have {SAFETENSORS_NAME} (left untouched)")
+
+        if options['dry_run']:
+            for model_dir in pending:
+                self.stdout.write(f"   {model_dir}")
+            return
+
+        converted = 0
+        for model_dir in pending:
+            self.stdout.write(f"Converting {model_dir}...")
+            try:
+                record = convert_to_safetensors(
+                    AutoModelForSequenceClassification, model_dir, keep_legacy=options['keep_legacy']
+                )
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ {model_dir}: {str(e)}"))
+                continue
+
+            self._record_format(model_dir)
+            converted += 1
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {record['verified_tensors']} tensors verified, "
+                f"{record['legacy_size_mb']:.1f} MB -> {record['safetensors_size_mb']:.1f} MB"
+            ))
+
+        self.stdout.write(self.style.SUCCESS(f"Converted {converted}/{len(pending)} model directories"))
+
+    def _record_format(self, model_dir):
+        """Note the new weights format in the model's metadata JSON, when it has one"""
+        _, metadata_path = TransformerClassifier._artifact_paths(model_dir)
+        if not os.path.exists(metadata_path):
+            return
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        metadata['weights_format'] = SAFETENSORS
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Management command to export a trained transformer model to TorchScript / ONNX serving backends
+"""
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from classification.models import MLModel
+from classification.ml_models import TransformerClassifier, create_model
+from classification.inference_backends import ARTIFACT_NAMES, EAGER
+from classification.model_registry import get_model_registry
+from classification import prediction_cache
+from dataset_management.models import DatasetSample
+
+
+class Command(BaseCommand):
+    help = 'Export a trained transformer model to TorchScript/ONNX and check parity with eager PyTorch'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_id',
+            type=int,
+            help='ID of the trained transformer model to export'
+        )
+        parser.add_argument(
+            '--backends',
+            default='torchscript,onnx',
+            help='Comma separated backends to export (default: torchscript,onnx)'
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=32,
+            help='Number of dataset samples used for the parity check (default: 32)'
+        )
+        parser.add_argument(
+            '--atol',
+            type=float,
+            default=1e-4,
+            help='Maximum absolute logit difference allowed versus eager (default: 1e-4)'
+        )
+        parser.add_argument(
+            '--activate',
+            help='Serve the model with this backend (sets MLModel.parameters["inference_backend"])'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = MLModel.objects.get(id=options['model_id'], is_trained=True)
+        except MLModel.DoesNotExist:
+            raise CommandError(f"Trained model {options['model_id']} not found")
+
+        if not model.model_path:
+            raise CommandError(f"Model {model.id} has no model file")
+
+        model_file_path = os.path.join(settings.MEDIA_ROOT, str(model.model_path))
+        if not os.path.isdir(model_file_path):
+            raise CommandError(f"Model {model.id} is not a transformer model directory: {model_file_path}")
+
+        backends = [backend.strip() for backend in options['backends'].split(',') if backend.strip()]
+        unknown = [backend for backend in backends if backend not in ARTIFACT_NAMES]
+        if unknown:
+            raise CommandError(f"Unsupported backends: {', '.join(unknown)}")
+
+        activate = options['activate']
+        if activate and activate != EAGER and activate not in backends:
+            raise CommandError(f"--activate {activate} must be one of the exported backends or 'eager'")
+
+        samples = DatasetSample.objects.filter(dataset=model.dataset).values_list('title', 'abstract')[:options['samples']]
+        texts = [f"{title} {abstract}".strip() for title, abstract in samples]
+        if not texts:
+            raise CommandError(f"No samples found in dataset {model.dataset_id}")
+
+        self.stdout.write(f"Loading eager model {model.id}: {model.name}")
+        parameters = model.parameters or {}
+        model_type = parameters.get('bert_model', 'biobert') if model.model_type == 'bert' else model.model_type
+        ml_model = create_model(model_type=model_type, backend=EAGER)
+        if not isinstance(ml_model, TransformerClassifier):
+            raise CommandError(f"Model type {model.model_type} does not support exported backends")
+        ml_model.load_model(model_file_path)
+
+        passed = {EAGER}
+        for backend in backends:
+            self.stdout.write(f"Exporting {backend}...")
+            try:
+                report = ml_model.export_backend(backend, model_file_path, texts, atol=options['atol'])
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"❌ {backend} export failed: {str(e)}"))
+                continue
+
+            if report['parity_passed']:
+                passed.add(backend)
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {backend}: max |Δlogit| {report['max_abs_diff']:.2e} over {len(texts)} samples"
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(
+                    f"❌ {backend}: parity failed, max |Δlogit| {report['max_abs_diff']:.2e} > {report['atol']:.0e}"
+                ))
+
+        if activate:
+            if activate not in passed:
+                raise CommandError(f"Not activating {activate}: export did not pass the parity check")
+            model.parameters = {**parameters, 'inference_backend': activate}
+            model.save(update_fields=['parameters'])
+            get_model_registry().invalidate(model.id)
+            prediction_cache.invalidate_model(model.id)
+            self.stdout.write(self.style.SUCCESS(f"Model {model.id} now serves with the {activate} backend"))
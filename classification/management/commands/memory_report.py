@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+"""
+Management command to report unique vs shared memory of the ML worker processes on this host
+"""
+from django.core.management.base import BaseCommand, CommandError
+from classification.memory_stats import find_processes, memory_breakdown, process_cmdline
+
+
+class Command(BaseCommand):
+    help = 'Report per-process unique (USS), proportional (PSS) and shared memory of Celery/web workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--match',
+            default=r'celery|gunicorn|uvicorn|daphne',
+            help='Regular expression matched against process command lines (default: celery|gunicorn|uvicorn|daphne)'
+        )
+        parser.add_argument(
+            '--pids',
+            default='',
+            help='Comma separated PIDs to report instead of matching command lines'
+        )
+
+    def handle(self, *args, **options):
+        if options['pids']:
+            pids = [int(pid) for pid in options['pids'].split(',') if pid.strip()]
+        else:
+            pids = find_processes(options['match'])
+
+        if not pids:
+            raise CommandError(f"No processes matching '{options['match']}'")
+
+        rows = [memory_breakdown(pid) for pid in pids]
+        rows = [row for row in rows if row.get('available')]
+        if not rows:
+            raise CommandError("No readable /proc/<pid>/smaps (Linux only, same user or root required)")
+
+        self.stdout.write(
+            f"{'pid':>7} {'rss MB':>9} {'pss MB':>9} {'unique MB':>10} {'shared MB':>10}  command"
+        )
+        for row in rows:
+            command = process_cmdline(row['pid'])[:60]
+            self.stdout.write(
+                f"{row['pid']:>7} {row['rss_mb']:>9.1f} {row['pss_mb']:>9.1f} "
+                f"{row['unique_mb']:>10.1f} {row['shared_mb']:>10.1f}  {command}"
+            )
+
+        total_rss = sum(row['rss_mb'] for row in rows)
+        total_pss = sum(row['pss_mb'] for row in rows)
+        total_unique = sum(row['unique_mb'] for row in rows)
+        self.stdout.write("")
+        self.stdout.write(f"📊 {len(rows)} processes")
+        self.stdout.write(f"   Sum of RSS (shared pages counted per process):  {total_rss:.1f} MB")
+        self.stdout.write(f"   Sum of PSS (actual combined footprint):         {total_pss:.1f} MB")
+        self.stdout.write(f"   Sum of unique memory:                           {total_unique:.1f} MB")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Shared pages save {total_rss - total_pss:.1f} MB "
+            f"({(1 - total_pss / total_rss) * 100 if total_rss else 0:.1f}%)"
+        ))
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""
+Management command to profile a dataset's token lengths and show the calibrated max_length
+"""
+from django.core.management.base import BaseCommand, CommandError
+from dataset_management.models import Dataset
+from classification.ml_models import MEDICAL_BERT_MODELS
+from classification import sequence_length
+
+
+class Command(BaseCommand):
+    help = "Profile a dataset's token-length distribution under a transformer tokenizer"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dataset_id',
+            type=int,
+            help='ID of the dataset to profile'
+        )
+        parser.add_argument(
+            '--model',
+            default='biobert',
+            choices=sorted(MEDICAL_BERT_MODELS),
+            help='Transformer whose tokenizer is used (default: biobert)'
+        )
+        parser.add_argument(
+            '--percentile',
+            type=float,
+            default=None,
+            help='Coverage percentile for the recommendation (default: MAX_LENGTH_COVERAGE_PERCENTILE)'
+        )
+        parser.add_argument(
+            '--no-save',
+            action='store_true',
+            help='Do not store the profile on the dataset'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            dataset = Dataset.objects.get(id=options['dataset_id'])
+        except Dataset.DoesNotExist:
+            raise CommandError(f"Dataset {options['dataset_id']} not found")
+
+        percentile = options['percentile'] or sequence_length.coverage_percentile()
+        if not 0 < percentile <= 100:
+            raise CommandError("--percentile must be in (0, 100]")
+
+        tokenizer_name = MEDICAL_BERT_MODELS[options['model']]['model_name']
+        texts = sequence_length.dataset_texts(dataset)
+        if not texts:
+            raise CommandError(f"Dataset {dataset.id} has no labelled samples")
+
+        profile = sequence_length.profile_dataset(dataset, tokenizer_name, texts, save=not options['no_save'])
+
+        self.stdout.write(f"📏 {dataset.name}: {profile['samples']} texts under {tokenizer_name}\n")
+        self.stdout.write(f"{'percentile':>10} {'tokens':>8}")
+        for p, length in profile['percentiles'].items():
+            self.stdout.write(f"{'P' + p:>10} {length:>8}")
+        self.stdout.write(f"\nMean {profile['mean']} tokens, {profile['truncated_fraction']:.1%} truncated at "
+                          f"{sequence_length.MODEL_MAX_LENGTH}")
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Recommended max_length for P{percentile:g}: "
+            f"{sequence_length.recommend_max_length(profile, percentile)}"
+        ))
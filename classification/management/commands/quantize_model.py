@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+"""
+Management command to create a dynamic INT8 serving variant of a trained BERT-family model
+"""
+import hashlib
+import os
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from sklearn.model_selection import train_test_split
+from classification.models import MLModel
+from classification.ml_models import TransformerClassifier, create_model
+from classification.inference_backends import EAGER
+from classification.model_registry import get_model_registry
+from classification import prediction_cache
+from dataset_management.models import DatasetSample
+
+
+class Command(BaseCommand):
+    help = 'Quantize a trained BERT-family model to INT8 and evaluate it on its validation split'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_id',
+            type=int,
+            help='ID of the trained BERT-family model to quantize'
+        )
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=settings.DEFAULT_PREDICTION_THRESHOLD,
+            help='Prediction threshold used for the evaluation'
+        )
+        parser.add_argument(
+            '--activate',
+            action='store_true',
+            help='Serve the quantized weights (sets MLModel.parameters["quantized"])'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = MLModel.objects.get(id=options['model_id'], is_trained=True)
+        except MLModel.DoesNotExist:
+            raise CommandError(f"Trained model {options['model_id']} not found")
+
+        if not model.model_path:
+            raise CommandError(f"Model {model.id} has no model file")
+
+        model_file_path = os.path.join(settings.MEDIA_ROOT, str(model.model_path))
+        if not os.path.isdir(model_file_path):
+            raise CommandError(f"Model {model.id} is not a BERT-family model directory: {model_file_path}")
+
+        parameters = model.parameters or {}
+        model_type = parameters.get('bert_model', 'biobert') if model.model_type == 'bert' else model.model_type
+
+        self.stdout.write(f"Loading float32 model {model.id}: {model.name}")
+        float_model = create_model(model_type=model_type, backend=EAGER)
+        if not isinstance(float_model, TransformerClassifier):
+            raise CommandError(f"Model type {model.model_type} cannot be quantized")
+        float_model.load_model(model_file_path)
+
+        texts, labels = self._validation_split(model, float_model.validation_text_sha1)
+        if not texts:
+            raise CommandError(f"No labelled validation samples found in dataset {model.dataset_id}")
+        self.stdout.write(f"Evaluating on {len(texts)} validation samples")
+
+        threshold = options['threshold']
+        float_metrics = float_model.evaluate(texts, labels, threshold)
+
+        record = float_model.quantize_dynamic(model_file_path)
+        del float_model
+
+        quantized_model = TransformerClassifier(model_type=model_type, backend=EAGER, quantized=True)
+        quantized_model.load_model(model_file_path)
+        int8_metrics = quantized_model.evaluate(texts, labels, threshold)
+
+        record['evaluation'] = {
+            'threshold': threshold,
+            'float32': float_metrics,
+            'int8': int8_metrics,
+            'delta': {
+                metric: int8_metrics[metric] - float_metrics[metric]
+                for metric in ['accuracy', 'f1_macro', 'f1_micro']
+            },
+            'speedup': float_metrics['ms_per_text'] / int8_metrics['ms_per_text']
+            if int8_metrics['ms_per_text'] > 0 else 0.0,
+            'size_reduction': 1.0 - record['int8_size_mb'] / record['float32_size_mb']
+            if record['float32_size_mb'] > 0 else 0.0,
+        }
+        quantized_model.update_metadata(model_file_path, 'quantization', record)
+
+        model.training_metrics = {**(model.training_metrics or {}), 'quantization': record}
+        update_fields = ['training_metrics']
+        if options['activate']:
+            model.parameters = {**parameters, 'quantized': True}
+            update_fields.append('parameters')
+        model.save(update_fields=update_fields)
+        get_model_registry().invalidate(model.id)
+        prediction_cache.invalidate_model(model.id)
+
+        self._print_report(record)
+        if options['activate']:
+            self.stdout.write(self.style.SUCCESS(f"✅ Model {model.id} now serves INT8 weights"))
+
+    def _validation_split(self, model, validation_text_sha1):
+        """Return the (texts, labels) the model was validated on during training"""
+        samples = DatasetSample.objects.filter(dataset=model.dataset).values_list('title', 'abstract', 'medical_domains')
+        data = [
+            (f"{title} {abstract}".strip(), domains)
+            for title, abstract, domains in samples
+            if domains
+        ]
+
+        if validation_text_sha1:
+            wanted = set(validation_text_sha1)
+            data = [
+                (text, domains) for text, domains in data
+                if hashlib.sha1(text.encode('utf-8')).hexdigest() in wanted
+            ]
+        else:
+            # Models trained before the split was recorded: repeat the training split
+            self.stdout.write(self.style.WARNING("No stored validation split, re-deriving it from the dataset"))
+            if len(data) < 2:
+                return [], []
+            _, data = train_test_split(data, test_size=0.2, random_state=42)
+
+        return [text for text, _ in data], [list(domains) for _, domains in data]
+
+    def _print_report(self, record):
+        evaluation = record['evaluation']
+        self.stdout.write(f"{'':<10} {'accuracy':>9} {'f1_macro':>9} {'f1_micro':>9} {'ms/text':>9} {'size MB':>9}")
+        for name, size in [('float32', record['float32_size_mb']), ('int8', record['int8_size_mb'])]:
+            metrics = evaluation[name]
+            self.stdout.write(
+                f"{name:<10} {metrics['accuracy']:>9.4f} {metrics['f1_macro']:>9.4f} "
+                f"{metrics['f1_micro']:>9.4f} {metrics['ms_per_text']:>9.2f} {size:>9.1f}"
+            )
+        delta = evaluation['delta']
+        self.stdout.write(
+            f"{'delta':<10} {delta['accuracy']:>+9.4f} {delta['f1_macro']:>+9.4f} {delta['f1_micro']:>+9.4f} "
+            f"{evaluation['speedup']:>8.2f}x {-evaluation['size_reduction'] * 100:>8.1f}%"
+        )
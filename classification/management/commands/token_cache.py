@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Management command to inspect, evict or clear the persistent token cache
+"""
+import json
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from classification import token_cache
+
+
+class Command(BaseCommand):
+    help = 'List token cache entries, evict stale ones (TOKEN_CACHE_MAX_SIZE_MB / MAX_AGE_DAYS) or clear it'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--evict',
+            action='store_true',
+            help='Apply the eviction policy now'
+        )
+        parser.add_argument(
+            '--max-size-mb',
+            type=float,
+            help='Size budget for --evict (default: TOKEN_CACHE_MAX_SIZE_MB)'
+        )
+        parser.add_argument(
+            '--max-age-days',
+            type=float,
+            help='Age limit for --evict (default: TOKEN_CACHE_MAX_AGE_DAYS)'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Remove every entry'
+        )
+
+    def handle(self, *args, **options):
+        if not token_cache.cache_enabled():
+            raise CommandError("The token cache is disabled (TOKEN_CACHE_ENABLED / TOKEN_CACHE_PATH)")
+
+        if options['clear']:
+            removed = token_cache.clear()
+            self.stdout.write(self.style.SUCCESS(f"🧹 Removed {removed} token cache entries"))
+            return
+
+        if options['evict']:
+            result = token_cache.evict(options['max_size_mb'], options['max_age_days'])
+            self.stdout.write(self.style.SUCCESS(
+                f"🧹 Evicted {len(result['removed'])} entries, {result['size_mb']:.1f} MB kept"
+            ))
+
+        entries = sorted(token_cache.list_entries(), key=lambda entry: entry['last_used'], reverse=True)
+        self.stdout.write(f"📦 {len(entries)} entries in {token_cache.cache_root()}")
+        if not entries:
+            return
+
+        self.stdout.write(
+            f"{'key':<14} {'tokenizer':<45} {'max_len':>7} {'texts':>7} {'tokens':>10} {'MB':>8} {'unused h':>9}"
+        )
+        for entry in entries:
+            with open(os.path.join(entry['path'], token_cache.MANIFEST_NAME), 'r') as f:
+                manifest = json.load(f)
+            self.stdout.write(
+                f"{entry['key'][:12]:<14} {manifest['tokenizer'][:45]:<45} {manifest['max_length']:>7} "
+                f"{manifest['texts']:>7} {manifest['tokens']:>10} {entry['size_bytes'] / (1024 * 1024):>8.1f} "
+                f"{(time.time() - entry['last_used']) / 3600:>9.1f}"
+            )
+        total_mb = sum(entry['size_bytes'] for entry in entries) / (1024 * 1024)
+        self.stdout.write(f"\nTotal {total_mb:.1f} MB")
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Management command to load the hot models and run a synthetic warm-up inference through them
+"""
+from django.core.management.base import BaseCommand, CommandError
+from classification.warmup import READY, hot_models, serving_candidates, warm_up
+
+
+class Command(BaseCommand):
+    help = 'Warm the hot models (ML_WARMUP_MODEL_IDS or the best-F1 model per type) and report load times'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'model_ids',
+            nargs='*',
+            type=int,
+            help='Models to warm (default: the configured hot models)'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Only list the models that would be warmed'
+        )
+        parser.add_argument(
+            '--no-pin',
+            action='store_true',
+            help='Do not exempt the warmed models from registry TTL/LRU eviction'
+        )
+
+    def handle(self, *args, **options):
+        if options['model_ids']:
+            found = {model.id: model for model in serving_candidates().filter(id__in=options['model_ids'])}
+            missing = [model_id for model_id in options['model_ids'] if model_id not in found]
+            if missing:
+                raise CommandError(f"Trained models with artifacts not found: {', '.join(map(str, missing))}")
+            models = [found[model_id] for model_id in options['model_ids']]
+        else:
+            models = hot_models()
+
+        if not models:
+            self.stdout.write(self.style.WARNING("No trained models with artifacts to warm"))
+            return
+
+        self.stdout.write(f"🔥 Hot models ({len(models)}):")
+        for model in models:
+            self.stdout.write(f"   {model.id:>5}  {model.model_type:<12} F1 {model.f1_score or 0:.4f}  {model.name}")
+
+        if options['list']:
+            return
+
+        state = warm_up(models=models, trigger='manual', pin=not options['no_pin'])
+
+        self.stdout.write("")
+        self.stdout.write(f"{'model':>7} {'load s':>8} {'1 text ms':>10} {'batch ms':>10}")
+        for model_id, report in state['models'].items():
+            if 'error' in report:
+                self.stdout.write(self.style.ERROR(f"{model_id:>7} ❌ {report['error']}"))
+                continue
+            timings = list(report['warmup_inference_ms'].values())
+            self.stdout.write(
+                f"{model_id:>7} {report['load_seconds']:>8.2f} {timings[0]:>10.2f} {timings[-1]:>10.2f}"
+            )
+
+        if state['status'] == READY:
+            self.stdout.write(self.style.SUCCESS(
+                f"✅ {len(models)} models warm in {state['duration_seconds']:.2f}s"
+            ))
+        else:
+            failed = sum(1 for report in state['models'].values() if 'error' in report)
+            self.stdout.write(self.style.WARNING(f"⚠️  {failed}/{len(models)} models failed to warm"))
@@ -0,0 +1,95 @@
+"""
+Process memory measurements for sizing ML worker processes
+"""
+import os
+import platform
+import re
+import resource
+from typing import Any, Dict, List, Optional
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+    if platform.system() == 'Darwin':
+        return peak / (1024 * 1024)
+    return peak / 1024
+
+
+def current_rss_mb() -> float:
+    """Current resident set size of this process in MB (falls back to the peak off Linux)"""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+# smaps fields (kB) summed into the unique/shared breakdown
+_SMAPS_FIELDS = ['Rss', 'Pss', 'Shared_Clean', 'Shared_Dirty', 'Private_Clean', 'Private_Dirty', 'Swap']
+
+
+def _read_smaps(pid) -> Optional[Dict[str, int]]:
+    """Sum the smaps fields of a process in kB (smaps_rollup when the kernel has it)"""
+    totals = dict.fromkeys(_SMAPS_FIELDS, 0)
+    for name in ('smaps_rollup', 'smaps'):
+        try:
+            with open(f'/proc/{pid}/{name}') as f:
+                for line in f:
+                    field, _, rest = line.partition(':')
+                    if field in totals:
+                        totals[field] += int(rest.split()[0])
+            return totals
+        except (OSError, ValueError, IndexError):
+            continue
+    return None
+
+
+def memory_breakdown(pid='self') -> Dict[str, Any]:
+    """Unique vs shared memory of a process in MB (Linux only)
+
+    ``unique_mb`` (USS) is what the process alone costs and what killing it would free;
+    ``shared_mb`` are pages it shares with other processes, e.g. model weights inherited
+    copy-on-write from a Celery/gunicorn parent or a memory-mapped weight file.
+    ``pss_mb`` charges each shared page proportionally, so PSS summed over all
+    workers is their real combined footprint.
+    """
+    totals = _read_smaps(pid)
+    if totals is None:
+        rss = current_rss_mb() if pid == 'self' else 0.0
+        return {'pid': os.getpid() if pid == 'self' else pid, 'available': False, 'rss_mb': round(rss, 1)}
+
+    def mb(kb):
+        return round(kb / 1024, 1)
+
+    return {
+        'pid': os.getpid() if pid == 'self' else pid,
+        'available': True,
+        'rss_mb': mb(totals['Rss']),
+        'pss_mb': mb(totals['Pss']),
+        'unique_mb': mb(totals['Private_Clean'] + totals['Private_Dirty']),
+        'shared_mb': mb(totals['Shared_Clean'] + totals['Shared_Dirty']),
+        'swap_mb': mb(totals['Swap']),
+    }
+
+
+def process_cmdline(pid) -> str:
+    try:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return f.read().replace(b'\0', b' ').decode('utf-8', 'replace').strip()
+    except OSError:
+        return ''
+
+
+def find_processes(pattern: str) -> List[int]:
+    """PIDs whose command line matches ``pattern`` (regular expression), excluding this process"""
+    regex = re.compile(pattern)
+    pids = []
+    for entry in os.listdir('/proc'):
+        if entry.isdigit() and int(entry) != os.getpid() and regex.search(process_cmdline(entry)):
+            pids.append(int(entry))
+    return sorted(pids)
@@ -0,0 +1,201 @@
+"""
+Request coalescing for single-article classification
+Collects concurrent predict requests for the same model over a short window and
+serves them with one batched forward pass
+"""
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Hashable, List
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingRequest:
+    """A single text waiting to be classified"""
+
+    def __init__(self, ml_model: Any, text: str):
+        self.ml_model = ml_model
+        self.text = text
+        self.enqueued_at = time.perf_counter()
+        self.future = Future()
+
+
+class _QueueStats:
+    """Batch-size distribution and queueing delay for one model queue"""
+
+    def __init__(self):
+        self.batches = 0
+        self.requests = 0
+        self.batch_size_histogram: Dict[int, int] = {}
+        self.total_queue_delay_ms = 0.0
+        self.max_queue_delay_ms = 0.0
+        self.total_inference_ms = 0.0
+        self.errors = 0
+
+    def record(self, batch_size: int, queue_delays_ms: List[float], inference_ms: float):
+        self.batches += 1
+        self.requests += batch_size
+        self.batch_size_histogram[batch_size] = self.batch_size_histogram.get(batch_size, 0) + 1
+        self.total_queue_delay_ms += sum(queue_delays_ms)
+        self.max_queue_delay_ms = max(self.max_queue_delay_ms, max(queue_delays_ms))
+        self.total_inference_ms += inference_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'avg_batch_size': round(self.requests / self.batches, 2) if self.batches else 0.0,
+            'batch_size_histogram': dict(sorted(self.batch_size_histogram.items())),
+            'avg_queue_delay_ms': round(self.total_queue_delay_ms / self.requests, 3) if self.requests else 0.0,
+            'max_queue_delay_ms': round(self.max_queue_delay_ms, 3),
+            'avg_batch_inference_ms': round(self.total_inference_ms / self.batches, 3) if self.batches else 0.0,
+            'errors': self.errors,
+        }
+
+
+class MicroBatcher:
+    """
+    Per-model micro-batching of predict calls
+
+    Each queue key (model id and threshold) gets its own queue and worker thread.
+    The worker waits for the first request, then keeps collecting requests until
+    ``max_batch_size`` is reached or ``window_ms`` has elapsed, runs one batched
+    ``predict`` and hands every caller its own slice of the result. Idle workers
+    exit after ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, max_batch_size: int = 16, window_ms: float = 10.0,
+                 timeout: float = 30.0, idle_timeout: float = 60.0):
+        self.max_batch_size = max_batch_size
+        self.window_seconds = window_ms / 1000.0
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._queues: Dict[Hashable, queue.Queue] = {}
+        self._stats: Dict[Hashable, _QueueStats] = {}
+        self._lock = threading.Lock()
+
+    def predict(self, model_id: int, ml_model: Any, text: str, threshold: float = 0.5) -> Dict:
+        """Classify ``text`` with ``ml_model``, coalescing with concurrent callers
+
+        Raises:
+            concurrent.futures.TimeoutError: If no result arrives within ``timeout``
+        """
+        request = _PendingRequest(ml_model, text)
+        key = (model_id, threshold)
+
+        with self._lock:
+            request_queue = self._queues.get(key)
+            if request_queue is None:
+                request_queue = queue.Queue()
+                self._queues[key] = request_queue
+                self._stats.setdefault(key, _QueueStats())
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(key, request_queue, threshold),
+                    name=f"micro-batcher-{model_id}",
+                    daemon=True
+                )
+                worker.start()
+            request_queue.put(request)
+
+        return request.future.result(timeout=self.timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-queue metrics keyed by 'model_<id>@<threshold>'"""
+        with self._lock:
+            return {
+                'max_batch_size': self.max_batch_size,
+                'window_ms': self.window_seconds * 1000.0,
+                'active_queues': len(self._queues),
+                'queues': {
+                    f"model_{model_id}@{threshold}": stats.as_dict()
+                    for (model_id, threshold), stats in self._stats.items()
+                },
+            }
+
+    def _worker_loop(self, key: Hashable, request_queue: queue.Queue, threshold: float):
+        while True:
+            try:
+                first = request_queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                with self._lock:
+                    # Requests are only enqueued under the lock, so this check is race free
+                    if request_queue.empty():
+                        self._queues.pop(key, None)
+                        return
+                continue
+
+            batch = [first]
+            deadline = first.enqueued_at + self.window_seconds
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(request_queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._run_batch(key, batch, threshold)
+
+    def _run_batch(self, key: Hashable, batch: List[_PendingRequest], threshold: float):
+        # The registry may have reloaded the model mid-window; keep each model's requests together
+        groups: List[List[_PendingRequest]] = []
+        for request in batch:
+            for group in groups:
+                if group[0].ml_model is request.ml_model:
+                    group.append(request)
+                    break
+            else:
+                groups.append([request])
+
+        for group in groups:
+            started_at = time.perf_counter()
+            queue_delays_ms = [(started_at - request.enqueued_at) * 1000 for request in group]
+            try:
+                predictions = group[0].ml_model.predict([request.text for request in group], threshold=threshold)
+                if len(predictions) != len(group):
+                    raise ValueError(f"Expected {len(group)} predictions, got {len(predictions)}")
+            except Exception as e:
+                logger.warning(f"Micro-batch of {len(group)} requests failed: {str(e)}")
+                with self._lock:
+                    self._stats[key].errors += 1
+                for request in group:
+                    request.future.set_exception(e)
+                continue
+
+            inference_ms = (time.perf_counter() - started_at) * 1000
+            with self._lock:
+                self._stats[key].record(len(group), queue_delays_ms, inference_ms)
+
+            for request, prediction in zip(group, predictions):
+                request.future.set_result(prediction)
+
+
+_micro_batcher = None
+_micro_batcher_lock = threading.Lock()
+
+
+def get_micro_batcher() -> MicroBatcher:
+    """Return the process-wide micro-batcher, creating it from settings on first use"""
+    global _micro_batcher
+    if _micro_batcher is None:
+        with _micro_batcher_lock:
+            if _micro_batcher is None:
+                _micro_batcher = MicroBatcher(
+                    max_batch_size=getattr(settings, 'ML_MICRO_BATCH_MAX_SIZE', 16),
+                    window_ms=getattr(settings, 'ML_MICRO_BATCH_WINDOW_MS', 10),
+                    timeout=getattr(settings, 'ML_MICRO_BATCH_TIMEOUT', 30),
+                )
+    return _micro_batcher
+
+
+def micro_batching_enabled() -> bool:
+    """Whether single-article predictions should go through the micro-batcher"""
+    return getattr(settings, 'ML_MICRO_BATCHING_ENABLED', False)
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("classification", "0005_add_confusion_matrix"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="mlmodel",
+            name="dataset_snapshot_version",
+            field=models.IntegerField(
+                blank=True,
+                help_text="Version of the dataset snapshot the model was trained on",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="mlmodel",
+            name="dataset_snapshot_hash",
+            field=models.CharField(
+                blank=True,
+                help_text="Content hash of the dataset snapshot the model was trained on",
+                max_length=64,
+            ),
+        ),
+    ]
@@ -6,17 +6,33 @@ import logging
 import os
 import pickle
 import json
+import time
+import hashlib
+import inspect
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Tuple, Optional, Any
 import numpy as np
 import polars as pl
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, Sampler
 from transformers import (
-    AutoTokenizer, AutoModelForSequenceClassification, AutoModelForCausalLM,
-    TrainingArguments, Trainer, EvalPrediction
+    AutoConfig, AutoTokenizer, AutoModelForSequenceClassification, AutoModelForCausalLM,
+    TrainingArguments, Trainer, TrainerCallback, EvalPrediction
 )
 
+# KV cache container for prefix reuse in generation (newer transformers versions)
+try:
+    from transformers import DynamicCache
+except ImportError:
+    DynamicCache = None
+
+from .inference_backends import (
+    EAGER, INFERENCE_BACKENDS, load_backend, export_backend, check_parity, model_input_names
+)
+from .execution_profiles import ensure_profile
+from . import memory_stats, weight_files, compact_artifacts, token_cache
+
 # Optional quantization support (not available on all platforms)
 try:
     from transformers import BitsAndBytesConfig
@@ -27,11 +43,13 @@ except ImportError:
 from sklearn.model_selection import train_test_split
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.linear_model import LogisticRegression
-from sklearn.svm import SVC
+from sklearn.svm import SVC, LinearSVC
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.multioutput import MultiOutputClassifier
 from sklearn.metrics import classification_report, f1_score, accuracy_score, confusion_matrix
-from sklearn.preprocessing import MultiLabelBinarizer
+from sklearn.preprocessing import MultiLabelBinarizer, normalize
+import scipy.sparse as sp
+from joblib import Parallel, delayed
 # Import HuggingFace datasets properly to avoid conflicts
 try:
     import datasets as hf_datasets
@@ -73,14 +91,146 @@ GEMMA_MODELS = {
 }
 
 
+class PredictionBatch:
+    """
+    Predictions for a batch of texts backed by an (n_texts, n_labels) float32 score matrix
+    
+    All classifiers produce one of these from ``predict_batch``. Thresholding,
+    top-k selection and ensembling run as vectorized NumPy operations; the
+    per-text dicts returned by ``predict`` are only built by ``to_dicts``.
+    """
+    
+    def __init__(self, scores: np.ndarray, labels: List[str], threshold: float = 0.5,
+                 report_all_confidences: bool = True, extras: Optional[List[Dict]] = None,
+                 components: Optional[Dict[str, 'PredictionBatch']] = None):
+        """
+        Args:
+            scores: (n_texts, n_labels) per-label scores in [0, 1]
+            labels: Label names, one per score column
+            threshold: Default threshold for predicted labels
+            report_all_confidences: Whether ``confidence_scores`` in the dict form cover
+                every label (True) or only the predicted ones (False)
+            extras: Optional per-text fields merged into the dict form
+            components: Optional named sub-predictions (e.g. ensemble members)
+        """
+        self.scores = np.asarray(scores, dtype=np.float32).reshape(-1, len(labels))
+        self.labels = list(labels)
+        self.threshold = threshold
+        self.report_all_confidences = report_all_confidences
+        self.extras = extras
+        self.components = components or {}
+    
+    def __len__(self):
+        return self.scores.shape[0]
+    
+    def label_index(self) -> Dict[str, int]:
+        return {label: i for i, label in enumerate(self.labels)}
+    
+    def predicted_mask(self, threshold: float = None) -> np.ndarray:
+        """Boolean (n_texts, n_labels) matrix of labels at or above the threshold"""
+        return self.scores >= (self.threshold if threshold is None else threshold)
+    
+    def top_k(self, k: int = 1) -> List[List[Tuple[str, float]]]:
+        """Return the ``k`` highest scoring (label, score) pairs for each text"""
+        k = min(k, len(self.labels))
+        if k <= 0 or len(self) == 0:
+            return [[] for _ in range(len(self))]
+        top_indices = np.argsort(-self.scores, axis=1, kind='stable')[:, :k]
+        top_scores = np.take_along_axis(self.scores, top_indices, axis=1)
+        return [
+            [(self.labels[j], float(score)) for j, score in zip(row_indices, row_scores)]
+            for row_indices, row_scores in zip(top_indices, top_scores)
+        ]
+    
+    def align(self, labels: List[str]) -> 'PredictionBatch':
+        """Return a copy whose columns follow ``labels`` (unknown labels score 0)"""
+        if labels == self.labels:
+            return self
+        index = self.label_index()
+        aligned = np.zeros((len(self), len(labels)), dtype=np.float32)
+        for target, label in enumerate(labels):
+            source = index.get(label)
+            if source is not None:
+                aligned[:, target] = self.scores[:, source]
+        return PredictionBatch(aligned, labels, self.threshold, self.report_all_confidences,
+                               self.extras, self.components)
+    
+    @classmethod
+    def concatenate(cls, batches: List['PredictionBatch']) -> 'PredictionBatch':
+        """Stack batches over the same labels (e.g. consecutive chunks) into one"""
+        first = batches[0]
+        extras = None
+        if any(batch.extras for batch in batches):
+            extras = [extra for batch in batches for extra in (batch.extras or [{}] * len(batch))]
+        return cls(np.vstack([batch.scores for batch in batches]), first.labels, first.threshold,
+                   first.report_all_confidences, extras)
+    
+    @classmethod
+    def weighted_average(cls, batches: Dict[str, 'PredictionBatch'], weights: Dict[str, float],
+                         labels: List[str], threshold: float = 0.5,
+                         report_all_confidences: bool = False) -> 'PredictionBatch':
+        """Combine named batches with a weighted average over a shared label index"""
+        combined = np.zeros((len(next(iter(batches.values()))), len(labels)), dtype=np.float32)
+        for name, batch in batches.items():
+            combined += np.float32(weights[name]) * batch.align(labels).scores
+        return cls(combined, labels, threshold, report_all_confidences, components=batches)
+    
+    def to_dicts(self, threshold: float = None, include_components: bool = True) -> List[Dict]:
+        """Convert to the per-text prediction dicts returned by ``predict``
+        
+        Args:
+            threshold: Overrides the batch threshold
+            include_components: Add each component's dicts as 'individual_predictions'
+        """
+        mask = self.predicted_mask(threshold)
+        component_dicts = {
+            name: component.to_dicts(0.0) for name, component in self.components.items()
+        } if include_components else {}
+        
+        predictions = []
+        for i, (row_scores, row_mask) in enumerate(zip(self.scores.tolist(), mask)):
+            all_scores = dict(zip(self.labels, row_scores))
+            predicted_labels = [label for label, selected in zip(self.labels, row_mask) if selected]
+            if self.report_all_confidences:
+                confidence_scores = dict(all_scores)
+            else:
+                confidence_scores = {label: all_scores[label] for label in predicted_labels}
+            
+            prediction = {
+                'predicted_domains': predicted_labels,
+                'confidence_scores': confidence_scores,
+                'all_scores': all_scores
+            }
+            if component_dicts:
+                prediction['individual_predictions'] = {
+                    name: dicts[i] for name, dicts in component_dicts.items()
+                }
+            if self.extras:
+                prediction.update(self.extras[i])
+            predictions.append(prediction)
+        
+        return predictions
+
+
 class MedicalDataset(Dataset):
-    """PyTorch dataset for medical literature classification"""
+    """PyTorch dataset for medical literature classification
+    
+    With ``encodings`` (token ids from the token cache) items are built from the
+    stored ids instead of re-tokenizing the text on every access; ``indices``
+    map dataset positions to rows of ``encodings``. Without ``pad_to_max_length``
+    items are left unpadded for ``DynamicPaddingCollator``.
+    """
     
-    def __init__(self, texts: List[str], labels: np.ndarray, tokenizer, max_length: int = 512):
+    def __init__(self, texts: List[str], labels: np.ndarray, tokenizer, max_length: int = 512,
+                 encodings: Optional[token_cache.TokenizedTexts] = None, indices: Optional[np.ndarray] = None,
+                 pad_to_max_length: bool = True):
         self.texts = texts
         self.labels = labels  # Now expects binary encoded labels
         self.tokenizer = tokenizer
         self.max_length = max_length
+        self.encodings = encodings
+        self.indices = indices
+        self.pad_to_max_length = pad_to_max_length
     
     def __len__(self):
         return len(self.texts)
@@ -89,11 +239,21 @@ class MedicalDataset(Dataset):
         text = str(self.texts[idx])
         labels = self.labels[idx]
         
+        if self.encodings is not None:
+            token_ids = torch.from_numpy(np.asarray(self.encodings[self.indices[idx]], dtype=np.int64))
+            if self.pad_to_max_length:
+                return DynamicPaddingCollator.pad_item(token_ids, labels, self.tokenizer, self.max_length)
+            return {
+                'input_ids': token_ids,
+                'attention_mask': torch.ones(len(token_ids), dtype=torch.long),
+                'labels': torch.tensor(labels, dtype=torch.float)
+            }
+        
         # Tokenize text
         encoding = self.tokenizer(
             text,
             truncation=True,
-            padding='max_length',
+            padding='max_length' if self.pad_to_max_length else False,
             max_length=self.max_length,
             return_tensors='pt'
         )
@@ -103,6 +263,141 @@ class MedicalDataset(Dataset):
             'attention_mask': encoding['attention_mask'].flatten(),
             'labels': torch.tensor(labels, dtype=torch.float)
         }
+    
+    def token_lengths(self) -> np.ndarray:
+        """Truncated token length of every item, for length-bucketed sampling"""
+        if self.encodings is not None:
+            return np.asarray(self.encodings.lengths)[self.indices]
+        encodings = self.tokenizer([str(text) for text in self.texts], truncation=True, max_length=self.max_length)
+        return np.array([len(ids) for ids in encodings['input_ids']])
+
+
+class DynamicPaddingCollator:
+    """Pads each training batch only to its own longest member"""
+    
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+    
+    @staticmethod
+    def pad_item(token_ids: torch.Tensor, labels: np.ndarray, tokenizer, length: int) -> Dict[str, torch.Tensor]:
+        """Pad one item's ids to ``length`` on the tokenizer's padding side"""
+        input_ids = torch.full((length,), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros(length, dtype=torch.long)
+        real = len(token_ids)
+        window = slice(length - real, None) if tokenizer.padding_side == 'left' else slice(0, real)
+        input_ids[window] = token_ids
+        attention_mask[window] = 1
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'labels': torch.as_tensor(labels, dtype=torch.float)
+        }
+    
+    def __call__(self, features: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        longest = max(int(feature['attention_mask'].sum()) for feature in features)
+        items = [
+            self.pad_item(feature['input_ids'][feature['attention_mask'].bool()], feature['labels'],
+                          self.tokenizer, longest)
+            for feature in features
+        ]
+        return {key: torch.stack([item[key] for item in items]) for key in items[0]}
+
+
+class LengthBucketSampler(Sampler):
+    """
+    Orders training examples so that consecutive batches hold texts of similar token length
+    
+    Examples are sorted by length (random tie-breaking) and cut into buckets of
+    ``bucket_batches`` batches; each bucket is shuffled before being split into
+    batches, and the order of all batches is shuffled every epoch.
+    """
+    
+    def __init__(self, lengths: np.ndarray, batch_size: int, bucket_batches: int = 16, seed: int = 42):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = max(1, batch_size)
+        self.bucket_size = self.batch_size * max(1, bucket_batches)
+        self.rng = np.random.default_rng(seed)
+    
+    def __len__(self):
+        return len(self.lengths)
+    
+    def __iter__(self):
+        shuffled = self.rng.permutation(len(self.lengths))
+        by_length = shuffled[np.argsort(self.lengths[shuffled], kind='stable')]
+        
+        batches = []
+        for start in range(0, len(by_length), self.bucket_size):
+            bucket = self.rng.permutation(by_length[start:start + self.bucket_size])
+            batches.extend(bucket[i:i + self.batch_size] for i in range(0, len(bucket), self.batch_size))
+        
+        for batch_index in self.rng.permutation(len(batches)):
+            yield from batches[batch_index].tolist()
+
+
+class TrainingThroughputCallback(TrainerCallback):
+    """Counts real and padded tokens of every training step and reports them per epoch"""
+    
+    def __init__(self):
+        self.epochs = []
+        self._reset()
+    
+    def _reset(self):
+        self.real_tokens = 0
+        self.padded_tokens = 0
+        self.examples = 0
+        self.step_seconds = 0.0
+    
+    def record(self, attention_mask: torch.Tensor, seconds: float):
+        self.real_tokens += int(attention_mask.sum())
+        self.padded_tokens += attention_mask.numel()
+        self.examples += attention_mask.shape[0]
+        self.step_seconds += seconds
+    
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._reset()
+    
+    def on_epoch_end(self, args, state, control, **kwargs):
+        if not self.examples:
+            return
+        report = {
+            'epoch': round(state.epoch or len(self.epochs) + 1, 2),
+            'examples': self.examples,
+            'real_tokens': self.real_tokens,
+            'padded_tokens': self.padded_tokens,
+            'padding_ratio': round(1.0 - self.real_tokens / self.padded_tokens, 4),
+            'step_seconds': round(self.step_seconds, 2),
+            # Tokens that carry text, per second spent in forward/backward/optimizer steps
+            'tokens_per_second': round(self.real_tokens / self.step_seconds, 1) if self.step_seconds else 0.0,
+        }
+        self.epochs.append(report)
+        logger.info(
+            f"Epoch {report['epoch']}: {report['tokens_per_second']:.0f} effective tokens/s, "
+            f"padding ratio {report['padding_ratio']:.1%} ({report['examples']} examples, "
+            f"{report['step_seconds']:.1f}s in training steps)"
+        )
+
+
+class LengthBucketedTrainer(Trainer):
+    """Trainer that samples length buckets and records padding/throughput of each training step"""
+    
+    def __init__(self, *args, throughput: TrainingThroughputCallback = None, length_bucketing: bool = True,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self.throughput = throughput
+        self.length_bucketing = length_bucketing
+    
+    def _get_train_sampler(self, *args, **kwargs):
+        if not self.length_bucketing:
+            return super()._get_train_sampler(*args, **kwargs)
+        return LengthBucketSampler(self.train_dataset.token_lengths(), self.args.train_batch_size,
+                                   seed=self.args.seed)
+    
+    def training_step(self, model, inputs, *args, **kwargs):
+        start = time.perf_counter()
+        loss = super().training_step(model, inputs, *args, **kwargs)
+        if self.throughput is not None:
+            self.throughput.record(inputs['attention_mask'], time.perf_counter() - start)
+        return loss
 
 
 class TransformerClassifier:
@@ -111,17 +406,41 @@ class TransformerClassifier:
     Supports BioBERT, ClinicalBERT, SciBERT, etc.
     """
     
+    # confidence_scores in predictions cover every label, not only predicted ones
+    report_all_confidences = True
+    
     def __init__(self, model_type: str = 'biobert', num_labels: int = None, 
-                 max_length: int = 512, device: str = None):
+                 max_length: int = 512, device: str = None, inference_batch_size: int = 16,
+                 backend: str = EAGER, quantized: bool = False, weights_load_mode: str = weight_files.AUTO,
+                 use_token_cache: bool = True, length_bucketing: bool = True):
         self.model_type = model_type
         self.max_length = max_length
+        self.inference_batch_size = inference_batch_size
+        # Reuse token ids stored by the token cache for training and evaluation texts
+        self.use_token_cache = use_token_cache
+        # Train on batches of similar token length padded to their longest member, not max_length
+        self.length_bucketing = length_bucketing
+        # Serve the dynamic INT8 copy of the weights (eager backend only)
+        self.quantized = quantized
+        self.validation_text_sha1 = None
+        
+        if weights_load_mode not in weight_files.LOAD_MODES:
+            raise ValueError(f"Unsupported weights load mode: {weights_load_mode}")
+        # 'auto' memory-maps model.safetensors and falls back to pytorch_model.bin
+        self.weights_load_mode = weights_load_mode
+        self.load_stats = None
+        
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unsupported inference backend: {backend}")
+        self.backend = backend
+        self.inference_backend = None
         
         # M1 Mac specific device handling
         self.device = self._get_optimal_device(device)
         self.num_labels = num_labels
         
-        # Configure PyTorch for M1 compatibility
-        self._configure_m1_compatibility()
+        # Configure torch threads for this platform and process role
+        self._configure_execution_profile()
         
         # Get model configuration
         if model_type not in MEDICAL_BERT_MODELS:
@@ -158,27 +477,14 @@ class TransformerClassifier:
         else:
             return 'cpu'
     
-    def _configure_m1_compatibility(self):
-        """Configure PyTorch settings for M1 Mac compatibility"""
-        import torch
-        import os
-        
-        # Disable MPS backend explicitly
-        os.environ['PYTORCH_ENABLE_MPS_FALLBACK'] = '0'
-        
-        # Set number of threads for M1 optimization
-        if hasattr(torch, 'set_num_threads'):
-            torch.set_num_threads(1)  # Single thread for stability
+    def _configure_execution_profile(self):
+        """Apply the process's CPU execution profile (thread counts, tokenizer choice)
         
-        # Disable OpenMP if available (can cause hanging)
-        os.environ['OMP_NUM_THREADS'] = '1'
-        os.environ['MKL_NUM_THREADS'] = '1'
-        
-        # Configure memory management for M1
-        if hasattr(torch.backends, 'mps'):
-            torch.backends.mps.enabled = False
-        
-        logger.info("M1 compatibility settings applied")
+        On Apple Silicon the 'auto' profile resolves to 'm1_safe', the previous
+        single-thread configuration; elsewhere the host's cores are shared between
+        the ML worker processes.
+        """
+        self.execution_profile = ensure_profile()
     
     def _load_tokenizer_with_timeout(self, model_name: str, timeout: int = 300):
         """Load tokenizer with timeout protection for M1 compatibility"""
@@ -202,14 +508,14 @@ class TransformerClassifier:
             with timeout_context(timeout):
                 return AutoTokenizer.from_pretrained(
                     model_name,
-                    use_fast=False,  # Use slow tokenizer for M1 stability
+                    use_fast=self.execution_profile.use_fast_tokenizer,  # Slow tokenizer on the m1_safe profile
                     local_files_only=False
                 )
         except TimeoutError:
             logger.warning(f"Tokenizer loading timed out, trying with local files only")
             return AutoTokenizer.from_pretrained(
                 model_name,
-                use_fast=False,
+                use_fast=self.execution_profile.use_fast_tokenizer,
                 local_files_only=True
             )
     
@@ -238,7 +544,6 @@ class TransformerClassifier:
                     num_labels=num_labels,
                     problem_type="multi_label_classification",
                     torch_dtype=torch.float32,  # Explicit dtype for M1
-                    use_safetensors=False,  # Disable for M1 compatibility
                     local_files_only=False
                 )
         except TimeoutError:
@@ -248,7 +553,6 @@ class TransformerClassifier:
                 num_labels=num_labels,
                 problem_type="multi_label_classification",
                 torch_dtype=torch.float32,
-                use_safetensors=False,
                 local_files_only=True
             )
     
@@ -271,26 +575,39 @@ class TransformerClassifier:
         # Combine title and abstract
         combined_texts = [f"{text}" for text in texts]
         
-        # Split data
-        train_texts, val_texts, train_labels, val_labels = train_test_split(
-            combined_texts, binary_labels, test_size=0.2, random_state=42
-        )
+        # Tokenize the whole dataset once (or reuse an earlier run's ids), before the split
+        encodings = self._cached_encodings(combined_texts)
         
-        # Create datasets
-        def tokenize_function(examples):
-            return self.tokenizer(
-                examples['text'],
-                truncation=True,
-                padding='max_length',
-                max_length=self.max_length
-            )
+        # Split positions; same permutation as splitting the texts themselves
+        train_indices, val_indices = train_test_split(
+            np.arange(len(combined_texts)), test_size=0.2, random_state=42
+        )
+        train_texts = [combined_texts[i] for i in train_indices]
+        val_texts = [combined_texts[i] for i in val_indices]
+        train_labels = binary_labels[train_indices]
+        val_labels = binary_labels[val_indices]
+        # Remember the validation split so post-training steps can evaluate on it
+        self.validation_text_sha1 = [hashlib.sha1(text.encode('utf-8')).hexdigest() for text in val_texts]
         
         # Use custom PyTorch dataset class for compatibility with transformers
-        train_dataset = MedicalDataset(train_texts, train_labels, self.tokenizer, self.max_length)
-        val_dataset = MedicalDataset(val_texts, val_labels, self.tokenizer, self.max_length)
+        pad_to_max_length = not self.length_bucketing
+        train_dataset = MedicalDataset(train_texts, train_labels, self.tokenizer, self.max_length,
+                                       encodings, train_indices, pad_to_max_length)
+        val_dataset = MedicalDataset(val_texts, val_labels, self.tokenizer, self.max_length,
+                                     encodings, val_indices, pad_to_max_length)
         
         return train_dataset, val_dataset, self.all_labels
     
+    def _cached_encodings(self, texts: List[str]) -> Optional[token_cache.TokenizedTexts]:
+        """Token ids of ``texts`` from the persistent token cache (None when disabled)"""
+        if not self.use_token_cache:
+            return None
+        try:
+            return token_cache.get_or_tokenize(texts, self.tokenizer, self.max_length)
+        except Exception as e:
+            logger.warning(f"Token cache unavailable, tokenizing on the fly: {str(e)}")
+            return None
+    
     def train(self, texts: List[str], labels: List[List[str]], 
               training_args: Dict = None, callbacks: List = None) -> Dict:
         """Train the model"""
@@ -338,7 +655,7 @@ class TransformerClassifier:
                 'dataloader_pin_memory': False,  # Disable for M1
                 'fp16': False,  # Disable half precision on M1
                 'report_to': [],  # Disable wandb/tensorboard
-                'save_safetensors': False,  # Use legacy format for M1 compatibility
+                'save_safetensors': True,  # Checkpoints load zero-copy, like the final artifact
                 'no_cuda': True,  # Explicitly disable CUDA attempts
             }
             
@@ -364,14 +681,18 @@ class TransformerClassifier:
                     'accuracy': accuracy
                 }
             
-            # Initialize trainer
-            trainer = Trainer(
+            # Initialize trainer (length-bucketed batches with dynamic padding unless disabled)
+            throughput = TrainingThroughputCallback()
+            trainer = LengthBucketedTrainer(
                 model=self.model,
                 args=training_arguments,
                 train_dataset=train_dataset,
                 eval_dataset=val_dataset,
+                data_collator=DynamicPaddingCollator(self.tokenizer) if self.length_bucketing else None,
                 compute_metrics=compute_metrics,
-                callbacks=callbacks or []
+                callbacks=(callbacks or []) + [throughput],
+                throughput=throughput,
+                length_bucketing=self.length_bucketing
             )
             
             # Train model
@@ -433,53 +754,95 @@ class TransformerClassifier:
                 'model_type': self.model_type,
                 'num_labels': self.num_labels,
                 'all_labels': all_labels,
-                'confusion_matrix': confusion_matrix_data
+                'confusion_matrix': confusion_matrix_data,
+                'epoch_throughput': throughput.epochs
             }
             
         except Exception as e:
             logger.error(f"Training failed: {str(e)}", exc_info=True)
             raise
     
-    def predict(self, texts: List[str], threshold: float = 0.5) -> List[Dict]:
-        """Make predictions on new texts"""
-        if not self.model or not self.tokenizer:
-            raise ValueError("Model must be trained before making predictions")
+    def _predict_logits(self, texts: List[str], batch_size: int = None,
+                        dynamic_padding: bool = True, encodings: Dict[str, List] = None) -> np.ndarray:
+        """Run the forward pass over all texts in micro-batches
         
-        self.model.eval()
-        predictions = []
+        With dynamic padding the texts are tokenized once, sorted by token length
+        and each micro-batch is padded only to its longest member. Without it every
+        text is padded to max_length (the original one-by-one behaviour).
+        
+        Args:
+            encodings: Unpadded encodings of ``texts`` computed earlier (e.g. from the
+                token cache); used instead of tokenizing with dynamic padding
+        
+        Returns:
+            (n_texts, num_labels) logits matrix in the original text order
+        """
+        batch_size = batch_size or self.inference_batch_size
+        texts = [str(text) for text in texts]
+        logits = np.zeros((len(texts), len(self.all_labels)), dtype=np.float32)
+        if not texts:
+            return logits
+        
+        if dynamic_padding:
+            if encodings is None:
+                encodings = self.tokenizer(texts, truncation=True, max_length=self.max_length)
+            lengths = np.array([len(ids) for ids in encodings['input_ids']])
+            # Sort by length so each micro-batch holds similarly sized texts
+            order = np.argsort(lengths, kind='stable')
+        else:
+            encodings = None
+            order = np.arange(len(texts))
         
         with torch.no_grad():
-            for text in texts:
-                # Tokenize
-                inputs = self.tokenizer(
-                    text,
-                    truncation=True,
-                    padding='max_length',
-                    max_length=self.max_length,
-                    return_tensors='pt'
-                )
+            for start in range(0, len(texts), batch_size):
+                batch_indices = order[start:start + batch_size]
                 
-                # Get model predictions
-                outputs = self.model(**inputs)
-                logits = outputs.logits
-                probs = torch.sigmoid(logits).cpu().numpy()[0]
-                
-                # Apply threshold
-                predicted_labels = []
-                confidence_scores = {}
-                
-                for i, (label, prob) in enumerate(zip(self.all_labels, probs)):
-                    confidence_scores[label] = float(prob)
-                    if prob >= threshold:
-                        predicted_labels.append(label)
+                if dynamic_padding:
+                    features = {
+                        key: [encodings[key][i] for i in batch_indices]
+                        for key in encodings.keys()
+                    }
+                    inputs = self.tokenizer.pad(features, padding='longest', return_tensors='pt')
+                else:
+                    inputs = self.tokenizer(
+                        [texts[i] for i in batch_indices],
+                        truncation=True,
+                        padding='max_length',
+                        max_length=self.max_length,
+                        return_tensors='pt'
+                    )
                 
-                predictions.append({
-                    'predicted_domains': predicted_labels,
-                    'confidence_scores': confidence_scores,
-                    'all_scores': {label: float(prob) for label, prob in zip(self.all_labels, probs)}
-                })
+                logits[batch_indices] = self._forward(inputs)
         
-        return predictions
+        return logits
+    
+    def _forward(self, inputs: Dict[str, torch.Tensor]) -> np.ndarray:
+        """Run one padded batch through the active backend and return its logits"""
+        if self.inference_backend is not None:
+            return self.inference_backend.run(inputs)
+        
+        model_device = next(self.model.parameters()).device
+        inputs = {k: v.to(model_device) for k, v in inputs.items()}
+        return self.model(**inputs).logits.float().cpu().numpy()
+    
+    def predict_batch(self, texts: List[str], threshold: float = 0.5,
+                      batch_size: int = None, encodings: Dict[str, List] = None) -> PredictionBatch:
+        """Score texts in dynamically padded micro-batches of ``batch_size``
+        (defaults to ``inference_batch_size``), optionally from pre-computed ``encodings``"""
+        if not self.tokenizer or (not self.model and self.inference_backend is None):
+            raise ValueError("Model must be trained before making predictions")
+        
+        if self.model is not None:
+            self.model.eval()
+        
+        logits = self._predict_logits(texts, batch_size=batch_size, encodings=encodings)
+        probs = 1.0 / (1.0 + np.exp(-logits))
+        return PredictionBatch(probs, self.all_labels, threshold,
+                               report_all_confidences=self.report_all_confidences)
+    
+    def predict(self, texts: List[str], threshold: float = 0.5, batch_size: int = None) -> List[Dict]:
+        """Make predictions on new texts"""
+        return self.predict_batch(texts, threshold, batch_size).to_dicts()
     
     def save_model(self, model_path: str):
         """Save the trained model"""
@@ -489,11 +852,16 @@ class TransformerClassifier:
         # Create directory if it doesn't exist
         os.makedirs(os.path.dirname(model_path), exist_ok=True)
         
-        # Save model and tokenizer
+        # Save model and tokenizer (safetensors, so serving can memory-map the weights)
         model_dir = model_path.replace('.pkl', '_model')
-        self.model.save_pretrained(model_dir)
+        self.model.save_pretrained(model_dir, safe_serialization=True)
         self.tokenizer.save_pretrained(model_dir)
         
+        # Drop weights of an earlier save in the legacy format, they would be stale
+        legacy_path = os.path.join(model_dir, weight_files.LEGACY_NAME)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        
         # Save additional metadata
         metadata = {
             'model_type': self.model_type,
@@ -501,7 +869,9 @@ class TransformerClassifier:
             'max_length': self.max_length,
             'num_labels': self.num_labels,
             'all_labels': self.all_labels,
-            'label_encoder_classes': self.label_encoder.classes_.tolist() if self.label_encoder else None
+            'label_encoder_classes': self.label_encoder.classes_.tolist() if self.label_encoder else None,
+            'validation_text_sha1': self.validation_text_sha1,
+            'weights_format': weight_files.SAFETENSORS
         }
         
         with open(model_path.replace('.pkl', '_metadata.json'), 'w') as f:
@@ -509,8 +879,9 @@ class TransformerClassifier:
         
         logger.info(f"Model saved to {model_path}")
     
-    def load_model(self, model_path: str):
-        """Load a trained model"""
+    @staticmethod
+    def _artifact_paths(model_path: str) -> Tuple[str, str]:
+        """Return (model_dir, metadata_path) for a model directory or base path"""
         # Handle both directory paths and base paths
         if model_path.endswith('_model'):
             # Already a model directory path
@@ -519,9 +890,21 @@ class TransformerClassifier:
             base_path = model_path[:-6]  # Remove last 6 chars ('_model')
             metadata_path = f"{base_path}_metadata.json"
         else:
-            # Convert base path to model directory and metadata paths
+            # Convert base path (or the .pkl path save_model was given) to model directory and metadata paths
+            if model_path.endswith('.pkl'):
+                model_path = model_path[:-4]
             model_dir = f"{model_path}_model"
             metadata_path = f"{model_path}_metadata.json"
+        return model_dir, metadata_path
+    
+    def load_model(self, model_path: str):
+        """Load a trained model
+        
+        With a non-eager ``backend`` the exported graph is loaded instead of the
+        PyTorch weights; if it is missing or failed its parity check the eager
+        model is used.
+        """
+        model_dir, metadata_path = self._artifact_paths(model_path)
         
         # Load metadata
         with open(metadata_path, 'r') as f:
@@ -532,10 +915,31 @@ class TransformerClassifier:
         self.max_length = metadata['max_length']
         self.num_labels = metadata['num_labels']
         self.all_labels = metadata['all_labels']
+        self.validation_text_sha1 = metadata.get('validation_text_sha1')
         
         # Load model and tokenizer
-        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
-        self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(
+            model_dir, use_fast=self.execution_profile.use_fast_tokenizer
+        )
+        
+        self.model = None
+        self.inference_backend = None
+        if self.backend != EAGER:
+            try:
+                self.inference_backend = load_backend(
+                    self.backend, model_dir, metadata.get('backends', {}).get(self.backend, {})
+                )
+                logger.info(f"Serving {model_dir} with the {self.backend} backend")
+            except Exception as e:
+                logger.warning(f"Could not load {self.backend} backend: {str(e)}, using eager PyTorch")
+        if self.inference_backend is None and self.quantized:
+            try:
+                self.model = self._load_quantized(model_dir, metadata)
+                logger.info(f"Serving {model_dir} with dynamic INT8 weights")
+            except Exception as e:
+                logger.warning(f"Could not load quantized weights: {str(e)}, using float32")
+        if self.inference_backend is None and self.model is None:
+            self.model = self._load_eager_weights(model_dir)
         
         # Recreate label encoder
         if metadata.get('label_encoder_classes'):
@@ -543,6 +947,180 @@ class TransformerClassifier:
             self.label_encoder.classes_ = np.array(metadata['label_encoder_classes'])
         
         logger.info(f"Model loaded from {model_path}")
+    
+    def _load_eager_weights(self, model_dir: str) -> nn.Module:
+        """Load the float weights and record load time and memory in ``load_stats``
+        
+        model.safetensors is memory-mapped (zero-copy) unless another load mode
+        was requested; a failed mmap load falls back to the regular loader.
+        """
+        mode = weight_files.resolve_load_mode(self.weights_load_mode, model_dir)
+        start = time.perf_counter()
+        rss_before = memory_stats.current_rss_mb()
+        
+        model = None
+        if mode == weight_files.MMAP:
+            try:
+                model = weight_files.load_mmap_model(AutoModelForSequenceClassification, model_dir)
+            except Exception as e:
+                logger.warning(f"Memory-mapped load of {model_dir} failed: {str(e)}, using the regular loader")
+                mode = weight_files.SAFETENSORS
+        if model is None:
+            model = AutoModelForSequenceClassification.from_pretrained(
+                model_dir, use_safetensors=(mode == weight_files.SAFETENSORS)
+            )
+            model.eval()
+        
+        self.load_stats = {
+            'load_mode': mode,
+            'load_seconds': round(time.perf_counter() - start, 3),
+            'rss_increase_mb': round(memory_stats.current_rss_mb() - rss_before, 1),
+            'peak_rss_mb': round(memory_stats.peak_rss_mb(), 1),
+        }
+        logger.info(f"Loaded {model_dir} weights ({mode}) in {self.load_stats['load_seconds']}s, "
+                    f"+{self.load_stats['rss_increase_mb']} MB RSS")
+        return model
+    
+    @staticmethod
+    def _select_quantized_engine():
+        """Use qnnpack where fbgemm (x86) kernels are unavailable, e.g. on ARM"""
+        engines = torch.backends.quantized.supported_engines
+        if 'fbgemm' not in engines and 'qnnpack' in engines:
+            torch.backends.quantized.engine = 'qnnpack'
+    
+    def _load_quantized(self, model_dir: str, metadata: Dict) -> nn.Module:
+        """Rebuild the INT8 model from its config and load the quantized state dict"""
+        quantization = metadata.get('quantization')
+        if not quantization:
+            raise ValueError(f"No quantized artifact recorded for {model_dir}")
+        
+        self._select_quantized_engine()
+        config = AutoConfig.from_pretrained(model_dir)
+        model = AutoModelForSequenceClassification.from_config(config)
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+        state_dict = torch.load(
+            os.path.join(model_dir, quantization['artifact']), map_location='cpu', weights_only=False
+        )
+        model.load_state_dict(state_dict)
+        model.eval()
+        return model
+    
+    def quantize_dynamic(self, model_path: str) -> Dict:
+        """Write a dynamic INT8 copy of the linear layers next to the float weights
+        
+        Returns:
+            The quantization record stored under 'quantization' in the metadata JSON
+        """
+        if self.model is None:
+            raise ValueError("The float model must be loaded to quantize it")
+        
+        model_dir, _ = self._artifact_paths(model_path)
+        self._select_quantized_engine()
+        
+        self.model.eval()
+        self.model.to('cpu')
+        quantized_model = torch.ao.quantization.quantize_dynamic(self.model, {nn.Linear}, dtype=torch.qint8)
+        
+        artifact = 'model.int8.pt'
+        artifact_path = os.path.join(model_dir, artifact)
+        torch.save(quantized_model.state_dict(), artifact_path)
+        
+        float_bytes = sum(p.numel() * p.element_size() for p in self.model.parameters())
+        record = {
+            'artifact': artifact,
+            'dtype': 'qint8',
+            'modules': ['Linear'],
+            'engine': torch.backends.quantized.engine,
+            'float32_size_mb': round(float_bytes / (1024 * 1024), 2),
+            'int8_size_mb': round(os.path.getsize(artifact_path) / (1024 * 1024), 2),
+        }
+        self.update_metadata(model_path, 'quantization', record)
+        
+        logger.info(f"Saved INT8 weights to {artifact_path} "
+                    f"({record['float32_size_mb']} MB -> {record['int8_size_mb']} MB)")
+        return record
+    
+    def evaluate(self, texts: List[str], labels: List[List[str]], threshold: float = 0.5) -> Dict:
+        """Accuracy, F1 and batched latency on labelled texts
+        
+        Evaluation sets are scored repeatedly, so their token ids come from the
+        token cache when it is enabled; latency then excludes tokenization.
+        """
+        encodings = None
+        if self.tokenizer is not None:
+            cached = self._cached_encodings([str(text) for text in texts])
+            if cached is not None:
+                encodings = cached.as_encodings(input_names=model_input_names(self.tokenizer))
+        
+        start = time.perf_counter()
+        batch = self.predict_batch(texts, threshold, encodings=encodings)
+        elapsed = time.perf_counter() - start
+        
+        y_true = MultiLabelBinarizer(classes=self.all_labels).fit_transform(labels)
+        y_pred = batch.predicted_mask().astype(int)
+        return {
+            'samples': len(texts),
+            'accuracy': float(accuracy_score(y_true, y_pred)),
+            'f1_macro': float(f1_score(y_true, y_pred, average='macro', zero_division=0)),
+            'f1_micro': float(f1_score(y_true, y_pred, average='micro', zero_division=0)),
+            'ms_per_text': elapsed / max(len(texts), 1) * 1000,
+        }
+    
+    def update_metadata(self, model_path: str, key: str, value: Any):
+        """Set one top-level entry of the model's metadata JSON"""
+        _, metadata_path = self._artifact_paths(model_path)
+        with open(metadata_path, 'r') as f:
+            metadata = json.load(f)
+        metadata[key] = value
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+    
+    def export_backend(self, backend: str, model_path: str, sample_texts: List[str],
+                       atol: float = 1e-4) -> Dict:
+        """Export the loaded eager model for ``backend`` and check it against eager logits
+        
+        The artifact is written into the model directory and its parity result is
+        recorded in the metadata JSON; artifacts failing the check are removed.
+        """
+        if self.model is None:
+            raise ValueError("The eager model must be loaded to export a backend")
+        
+        model_dir, metadata_path = self._artifact_paths(model_path)
+        self.model.eval()
+        self.model.to('cpu')
+        
+        example_inputs = self.tokenizer(
+            sample_texts[:2], truncation=True, max_length=self.max_length,
+            padding='longest', return_tensors='pt'
+        )
+        artifact = export_backend(backend, self.model, self.tokenizer, model_dir, example_inputs)
+        
+        # Parity over dynamically padded batches of varying sequence length
+        reference = self._predict_logits(sample_texts)
+        backend_metadata = {
+            'artifact': os.path.basename(artifact),
+            'input_names': model_input_names(self.tokenizer),
+            'parity_passed': True,
+        }
+        self.inference_backend = load_backend(backend, model_dir, backend_metadata)
+        try:
+            candidate = self._predict_logits(sample_texts)
+        finally:
+            self.inference_backend = None
+        
+        parity = check_parity(reference, candidate, atol)
+        backend_metadata.update(parity)
+        backend_metadata['parity_samples'] = len(sample_texts)
+        if not parity['parity_passed']:
+            os.remove(artifact)
+            logger.warning(f"{backend} export failed parity (max diff {parity['max_abs_diff']:.2e}), removed")
+        
+        with open(metadata_path, 'r') as f:
+            backends = json.load(f).get('backends', {})
+        backends[backend] = backend_metadata
+        self.update_metadata(model_path, 'backends', backends)
+        
+        return backend_metadata
 
 
 class GemmaClassifier:
@@ -551,12 +1129,56 @@ class GemmaClassifier:
     Adapts generative Gemma models for classification tasks
     """
     
+    # Instruction that follows the article text in every prompt
+    PROMPT_TAIL = "\n\nClassification (respond with only the relevant domain names, separated by commas):"
+    
+    # Likelihood scoring asks one yes/no question per label after the article text
+    QUESTION_TAIL = "\n\nQuestion: Does the text belong to the domain"
+    QUESTION_TEMPLATE = " {label}? Answer yes or no:"
+    ANSWERS = {'yes': [' yes', ' Yes'], 'no': [' no', ' No']}
+    
+    # Scoring modes: free-text generation parsed for label names, or per-label yes/no likelihoods
+    SCORING_MODES = ['generate', 'likelihood']
+    
+    # confidence_scores in predictions only cover the predicted labels
+    report_all_confidences = False
+    
+    # Weight dtypes for the memory-lean CPU loading path
+    CPU_DTYPES = {'float32': torch.float32, 'bfloat16': torch.bfloat16, 'float16': torch.float16}
+    
     def __init__(self, model_type: str = 'gemma2-2b', num_labels: int = None, 
-                 max_length: int = 512, device: str = None):
+                 max_length: int = 512, device: str = None, generation_batch_size: int = 8,
+                 scoring: str = 'generate', low_memory: bool = False, cpu_dtype: str = 'bfloat16',
+                 weight_quantization: str = None, restore_scoring: bool = True,
+                 likelihood_max_rows: int = 8):
         self.model_type = model_type
         self.max_length = max_length
         self.device = self._get_optimal_device(device)
         self.num_labels = num_labels
+        self.generation_batch_size = generation_batch_size
+        
+        # Memory-lean CPU loading: reduced precision weights streamed from memory-mapped
+        # safetensors, optionally int8 weight-only quantized
+        if cpu_dtype not in self.CPU_DTYPES:
+            raise ValueError(f"Unsupported CPU dtype: {cpu_dtype}")
+        self.low_memory = low_memory
+        self.cpu_dtype = cpu_dtype
+        self.weight_quantization = weight_quantization
+        self.load_stats = None
+        
+        if scoring not in self.SCORING_MODES:
+            raise ValueError(f"Unsupported Gemma scoring mode: {scoring}")
+        self.scoring = scoring
+        # Serve a loaded model with the scoring mode it was saved (and evaluated) with
+        self.restore_scoring = restore_scoring
+        # (text, label) questions per likelihood forward pass; bounds the KV cache copies
+        self.likelihood_max_rows = max(1, likelihood_max_rows)
+        self.execution_profile = ensure_profile()
+        
+        # Encoded shared prompt prefix and its KV cache, built lazily per label set
+        self._prefix_state = None
+        self.prefix_caching = DynamicCache is not None
+        self.label_cache_reuse = DynamicCache is not None
         
         # Get model configuration
         if model_type not in GEMMA_MODELS:
@@ -633,24 +1255,19 @@ class GemmaClassifier:
         mlb.fit(labels)  # Fit on all labels
         val_labels_binary = mlb.transform(val_labels)
         
-        # Make predictions on validation set with progress tracking
+        # Make predictions on validation set through the batched path, with progress tracking
         predictions = []
         total_samples = len(val_texts)
         
-        for i, val_text in enumerate(val_texts):
-            if i % 10 == 0:  # Log progress every 10 samples
-                logger.info(f"Evaluation progress: {i}/{total_samples} ({i/total_samples*100:.1f}%)")
-                
+        for start in range(0, total_samples, self.generation_batch_size):
+            logger.info(f"Evaluation progress: {start}/{total_samples} ({start/total_samples*100:.1f}%)")
+            chunk = val_texts[start:start + self.generation_batch_size]
             try:
-                # Use existing predict method but get raw predictions
-                pred_result = self.predict([val_text], threshold=0.5)
-                if pred_result and 'predicted_domains' in pred_result[0]:
-                    predictions.append(pred_result[0]['predicted_domains'])
-                else:
-                    predictions.append([])  # Empty prediction if failed
+                pred_results = self.predict(chunk, threshold=0.5)
+                predictions.extend(result['predicted_domains'] for result in pred_results)
             except Exception as e:
-                logger.warning(f"Prediction failed for sample {i}, using empty: {e}")
-                predictions.append([])
+                logger.warning(f"Prediction failed for samples {start}-{start + len(chunk)}, using empty: {e}")
+                predictions.extend([] for _ in chunk)
         
         # Convert predictions to binary format
         pred_labels_binary = mlb.transform(predictions)
@@ -729,15 +1346,263 @@ class GemmaClassifier:
         else:
             return 'cpu'
     
+    def _prompt_prefix(self, labels: List[str]) -> str:
+        """Instruction part of the prompt, identical for every text"""
+        labels_str = ", ".join(labels)
+        return f"Classify the following medical text into one or more of these domains: {labels_str}\n\nText:"
+    
     def _create_classification_prompt(self, text: str, labels: List[str]) -> str:
         """Create a prompt for classification task"""
-        labels_str = ", ".join(labels)
-        prompt = f"""Classify the following medical text into one or more of these domains: {labels_str}
-
-Text: {text}
-
-Classification (respond with only the relevant domain names, separated by commas):"""
-        return prompt
+        return f"{self._prompt_prefix(labels)} {text}{self.PROMPT_TAIL}"
+    
+    def _get_prefix_state(self) -> Dict:
+        """Encode the shared prompt prefix once and precompute its KV cache"""
+        key = (id(self.model), tuple(self.all_labels))
+        if self._prefix_state is not None and self._prefix_state['key'] == key:
+            return self._prefix_state
+        
+        prefix_ids = self.tokenizer(self._prompt_prefix(self.all_labels))['input_ids']
+        tail_ids = self.tokenizer(self.PROMPT_TAIL, add_special_tokens=False)['input_ids']
+        # Likelihood scoring: the question tail and the per-label question continuing it
+        question_ids = self.tokenizer(self.QUESTION_TAIL, add_special_tokens=False)['input_ids']
+        label_ids = [
+            self.tokenizer(self.QUESTION_TEMPLATE.format(label=label), add_special_tokens=False)['input_ids']
+            for label in self.all_labels
+        ]
+        # First token of each spelling of the answers
+        answer_ids = {
+            answer: sorted({self.tokenizer(spelling, add_special_tokens=False)['input_ids'][0] for spelling in spellings})
+            for answer, spellings in self.ANSWERS.items()
+        }
+        
+        # Greedy decoding only needs room for the full label list; stop at a newline or EOS
+        labels_length = len(self.tokenizer(", ".join(self.all_labels), add_special_tokens=False)['input_ids'])
+        stop_ids = [self.tokenizer.eos_token_id]
+        newline_ids = self.tokenizer("\n", add_special_tokens=False)['input_ids']
+        if len(newline_ids) == 1:
+            stop_ids.append(newline_ids[0])
+        
+        # Only generation continues the bare prefix; likelihood scoring caches whole prompts
+        prefix_cache = None
+        if self.prefix_caching and self.scoring == 'generate':
+            try:
+                with torch.no_grad():
+                    outputs = self.model(
+                        input_ids=torch.tensor([prefix_ids], device=self.model.device),
+                        past_key_values=DynamicCache(),
+                        use_cache=True
+                    )
+                prefix_cache = outputs.past_key_values.to_legacy_cache()
+            except Exception as e:
+                logger.warning(f"Prompt prefix caching unavailable, encoding full prompts: {e}")
+                self.prefix_caching = False
+        
+        self._prefix_state = {
+            'key': key,
+            'prefix_ids': prefix_ids,
+            'tail_ids': tail_ids,
+            'question_ids': question_ids,
+            'label_ids': label_ids,
+            'answer_ids': answer_ids,
+            'stop_ids': stop_ids,
+            'max_new_tokens': min(100, labels_length + 8),
+            'prefix_cache': prefix_cache,
+        }
+        return self._prefix_state
+    
+    def _encode_suffixes(self, texts: List[str], state: Dict, tail_ids: List[int] = None) -> List[List[int]]:
+        """Token ids of each text plus the instruction tail, truncating the article, never the instruction"""
+        tail_ids = state['tail_ids'] if tail_ids is None else tail_ids
+        budget = max(1, self.max_length - len(state['prefix_ids']) - len(tail_ids))
+        return [
+            self.tokenizer(' ' + text, add_special_tokens=False, truncation=True, max_length=budget)['input_ids']
+            + tail_ids
+            for text in texts
+        ]
+    
+    def _last_logits_kwargs(self) -> Dict[str, int]:
+        """Forward kwargs that restrict the LM head to the last position, when supported"""
+        parameters = inspect.signature(self.model.forward).parameters
+        for name in ('logits_to_keep', 'num_logits_to_keep'):
+            if name in parameters:
+                return {name: 1}
+        return {}
+    
+    def _encode_question_prompts(self, prompts: List[List[int]]) -> Optional[Dict]:
+        """Encode left-padded prompts once and return their per-layer KV tensors
+        
+        Returns None when the model's cache has no per-row (legacy) layout to
+        reuse, e.g. Gemma 2's HybridCache with static sliding-window buffers.
+        """
+        pad_id = self.tokenizer.pad_token_id
+        device = self.model.device
+        longest = max(len(prompt) for prompt in prompts)
+        input_ids = torch.tensor([[pad_id] * (longest - len(p)) + p for p in prompts], device=device)
+        attention_mask = torch.tensor([[0] * (longest - len(p)) + [1] * len(p) for p in prompts], device=device)
+        
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=(attention_mask.cumsum(-1) - 1).clamp(min=0),
+            past_key_values=DynamicCache(),
+            use_cache=True,
+            **self._last_logits_kwargs()
+        )
+        past = outputs.past_key_values
+        if isinstance(past, tuple):
+            layers = past
+        elif isinstance(past, DynamicCache):
+            layers = past.to_legacy_cache()
+        else:
+            return None
+        return {'layers': layers, 'attention_mask': attention_mask}
+    
+    def _question_logits_cached(self, prompt_cache: Dict, rows: List[Tuple[int, int]], state: Dict) -> torch.Tensor:
+        """Next-token logits after each (text, label) question, continuing the prompts' KV cache"""
+        pad_id = self.tokenizer.pad_token_id
+        device = self.model.device
+        questions = [state['label_ids'][label] for _text, label in rows]
+        width = max(len(ids) for ids in questions)
+        text_rows = torch.tensor([text for text, _label in rows], device=device)
+        
+        # Only the rows of this pass are copied out of the prompt cache
+        cache = DynamicCache.from_legacy_cache(tuple(
+            (key.index_select(0, text_rows), value.index_select(0, text_rows))
+            for key, value in prompt_cache['layers']
+        ))
+        prompt_mask = prompt_cache['attention_mask'].index_select(0, text_rows)
+        question_mask = torch.tensor([[1] * len(ids) + [0] * (width - len(ids)) for ids in questions], device=device)
+        
+        outputs = self.model(
+            input_ids=torch.tensor([ids + [pad_id] * (width - len(ids)) for ids in questions], device=device),
+            attention_mask=torch.cat([prompt_mask, question_mask], dim=-1),
+            position_ids=prompt_mask.sum(-1, keepdim=True) + torch.arange(width, device=device),
+            past_key_values=cache,
+            use_cache=True
+        )
+        # The answer is predicted at the last real token of each question
+        last_positions = torch.tensor([len(ids) - 1 for ids in questions], device=device)
+        return outputs.logits[torch.arange(len(rows), device=device), last_positions].float()
+    
+    def _question_logits_full(self, prompts: List[List[int]], rows: List[Tuple[int, int]], state: Dict) -> torch.Tensor:
+        """Next-token logits after each (text, label) question, encoding the full prompt per row"""
+        pad_id = self.tokenizer.pad_token_id
+        device = self.model.device
+        sequences = [prompts[text] + state['label_ids'][label] for text, label in rows]
+        longest = max(len(ids) for ids in sequences)
+        attention_mask = torch.tensor([[0] * (longest - len(s)) + [1] * len(s) for s in sequences], device=device)
+        
+        outputs = self.model(
+            input_ids=torch.tensor([[pad_id] * (longest - len(s)) + s for s in sequences], device=device),
+            attention_mask=attention_mask,
+            position_ids=(attention_mask.cumsum(-1) - 1).clamp(min=0),
+            use_cache=False,
+            **self._last_logits_kwargs()
+        )
+        return outputs.logits[:, -1].float()
+    
+    def _label_yes_probabilities(self, texts: List[str]) -> np.ndarray:
+        """Probability of answering "yes" when asked whether each text belongs to each label
+        
+        The left-padded prompts (prefix, text, question tail) are encoded once
+        and every (text, label) question continues that KV cache. Questions are
+        scored in passes of at most ``likelihood_max_rows`` rows, so the cache
+        copied for a pass is bounded however many labels there are. Each score
+        is the yes/no next-token likelihood normalized over the two answers, so
+        labels are scored independently of each other. Nothing is generated.
+        
+        Returns:
+            (n_texts, n_labels) probabilities in [0, 1]
+        """
+        state = self._get_prefix_state()
+        num_labels = len(self.all_labels)
+        prompts = [
+            state['prefix_ids'] + suffix
+            for suffix in self._encode_suffixes(texts, state, tail_ids=state['question_ids'])
+        ]
+        rows = [(i, j) for i in range(len(texts)) for j in range(num_labels)]
+        probabilities = np.zeros(len(rows), dtype=np.float32)
+        
+        with torch.no_grad():
+            prompt_cache = None
+            if self.label_cache_reuse:
+                try:
+                    prompt_cache = self._encode_question_prompts(prompts)
+                except Exception as e:
+                    logger.warning(f"Prompt KV cache unavailable for label scoring ({e}), scoring full prompts")
+                else:
+                    if prompt_cache is None:
+                        logger.warning("Model cache cannot be reused per label, scoring full prompts")
+                if prompt_cache is None:
+                    self.label_cache_reuse = False
+            
+            for start in range(0, len(rows), self.likelihood_max_rows):
+                pass_rows = rows[start:start + self.likelihood_max_rows]
+                logits = None
+                if prompt_cache is not None:
+                    try:
+                        logits = self._question_logits_cached(prompt_cache, pass_rows, state)
+                    except Exception as e:
+                        logger.warning(f"Cached label scoring failed ({e}), falling back to full prompts")
+                        self.label_cache_reuse = False
+                        prompt_cache = None
+                if logits is None:
+                    logits = self._question_logits_full(prompts, pass_rows, state)
+                
+                yes = torch.logsumexp(logits[:, state['answer_ids']['yes']], dim=-1)
+                no = torch.logsumexp(logits[:, state['answer_ids']['no']], dim=-1)
+                probabilities[start:start + len(pass_rows)] = torch.sigmoid(yes - no).cpu().numpy()
+        
+        return probabilities.reshape(len(texts), num_labels)
+    
+    def _generate_batch(self, texts: List[str]) -> List[str]:
+        """Greedy batched generation; returns only the generated continuation of each prompt
+        
+        With prefix caching every row is laid out as [prefix][padding][text + tail]
+        and the prefix KV cache is shared; otherwise prompts are left-padded.
+        """
+        state = self._get_prefix_state()
+        prefix_ids = state['prefix_ids']
+        pad_id = self.tokenizer.pad_token_id
+        suffixes = self._encode_suffixes(texts, state)
+        longest = max(len(suffix) for suffix in suffixes)
+        use_prefix_cache = self.prefix_caching and state['prefix_cache'] is not None
+        
+        rows, masks = [], []
+        for suffix in suffixes:
+            padding = longest - len(suffix)
+            if use_prefix_cache:
+                rows.append(prefix_ids + [pad_id] * padding + suffix)
+                masks.append([1] * len(prefix_ids) + [0] * padding + [1] * len(suffix))
+            else:
+                rows.append([pad_id] * padding + prefix_ids + suffix)
+                masks.append([0] * padding + [1] * (len(prefix_ids) + len(suffix)))
+        
+        input_ids = torch.tensor(rows, device=self.model.device)
+        generation_kwargs = {
+            'input_ids': input_ids,
+            'attention_mask': torch.tensor(masks, device=self.model.device),
+            'max_new_tokens': state['max_new_tokens'],
+            'do_sample': False,
+            'eos_token_id': state['stop_ids'],
+            'pad_token_id': pad_id,
+        }
+        
+        if use_prefix_cache:
+            batch_cache = DynamicCache.from_legacy_cache(tuple(
+                (key.expand(len(texts), -1, -1, -1).contiguous(), value.expand(len(texts), -1, -1, -1).contiguous())
+                for key, value in state['prefix_cache']
+            ))
+            try:
+                outputs = self.model.generate(**generation_kwargs, past_key_values=batch_cache)
+            except Exception as e:
+                logger.warning(f"Prefix-cached generation failed ({e}), falling back to full prompts")
+                self.prefix_caching = False
+                return self._generate_batch(texts)
+        else:
+            outputs = self.model.generate(**generation_kwargs)
+        
+        return self.tokenizer.batch_decode(outputs[:, input_ids.shape[1]:], skip_special_tokens=True)
     
     def _parse_classification_response(self, response: str, all_labels: List[str]) -> List[str]:
         """Parse the model's classification response"""
@@ -777,35 +1642,10 @@ Classification (respond with only the relevant domain names, separated by commas
             # Load tokenizer and model
             logger.info("Loading Gemma tokenizer...")
             hf_token = self._get_hf_token()
-            self.tokenizer = AutoTokenizer.from_pretrained(
-                self.model_name,
-                use_fast=True,
-                trust_remote_code=True,
-                token=hf_token
-            )
-            
-            # Add padding token if not present
-            if self.tokenizer.pad_token is None:
-                self.tokenizer.pad_token = self.tokenizer.eos_token
+            self.tokenizer = self._load_tokenizer(hf_token)
             
             logger.info("Loading Gemma model...")
-            if self.device == 'cpu' or self.quantization_config is None:
-                # Load without quantization for CPU or when quantization unavailable
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    torch_dtype=torch.float32,
-                    device_map="cpu" if self.device == 'cpu' else "auto",
-                    trust_remote_code=True,
-                    token=hf_token
-                )
-            else:
-                self.model = AutoModelForCausalLM.from_pretrained(
-                    self.model_name,
-                    quantization_config=self.quantization_config,
-                    device_map="auto",
-                    trust_remote_code=True,
-                    token=hf_token
-                )
+            self.model = self._load_causal_lm(hf_token)
             
             # For now, we'll use the model in inference mode
             # Full fine-tuning would require LoRA or similar techniques
@@ -840,79 +1680,68 @@ Classification (respond with only the relevant domain names, separated by commas
     def predict(self, texts: List[str], threshold: float = 0.5) -> List[Dict]:
         """Make predictions using Gemma model
         
-        Note: threshold parameter is kept for API compatibility but not used since
-        Gemma generates text responses rather than probability scores.
+        Note: in 'generate' scoring mode the threshold is not used since Gemma
+        generates text responses rather than probability scores.
         """
-        # threshold parameter not used in text-based generation approach
-        _ = threshold  # Suppress linter warning
-        
+        return self.predict_batch(texts, threshold).to_dicts()
+    
+    def predict_batch(self, texts: List[str], threshold: float = 0.5) -> PredictionBatch:
+        """Classify texts with the configured scoring mode"""
         if not self.model or not self.tokenizer:
             raise ValueError("Model must be loaded before making predictions")
         
         self.model.eval()
-        predictions = []
+        if self.scoring == 'likelihood':
+            return self._predict_batch_likelihood(texts, threshold)
+        return self._predict_batch_generate(texts)
+    
+    def _predict_batch_likelihood(self, texts: List[str], threshold: float) -> PredictionBatch:
+        """Score every label independently by its yes/no answer likelihood
+        
+        Each score is the probability of "yes" to "does the text belong to this
+        domain", so any number of labels can clear the threshold.
+        """
+        scores = np.zeros((len(texts), len(self.all_labels)), dtype=np.float32)
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        
+        for start in range(0, len(order), self.generation_batch_size):
+            batch_indices = order[start:start + self.generation_batch_size]
+            scores[batch_indices] = self._label_yes_probabilities([str(texts[i]) for i in batch_indices])
+        
+        return PredictionBatch(scores, self.all_labels, threshold,
+                               report_all_confidences=self.report_all_confidences)
+    
+    def _predict_batch_generate(self, texts: List[str]) -> PredictionBatch:
+        """Classify texts by batched greedy generation; parsed labels score 0.8, all others 0.2"""
+        label_index = {label: j for j, label in enumerate(self.all_labels)}
+        scores = np.full((len(texts), len(self.all_labels)), 0.2, dtype=np.float32)
+        extras = [None] * len(texts)
+        
+        # Group similarly long texts so batches carry little padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
         
         with torch.no_grad():
-            for text in texts:
-                # Create classification prompt
-                prompt = self._create_classification_prompt(text, self.all_labels)
-                
-                # Tokenize
-                inputs = self.tokenizer(
-                    prompt,
-                    return_tensors="pt",
-                    max_length=self.max_length,
-                    truncation=True,
-                    padding=True
-                )
-                
-                if self.device != 'cpu':
-                    inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            for start in range(0, len(order), self.generation_batch_size):
+                batch_indices = order[start:start + self.generation_batch_size]
+                responses = self._generate_batch([str(texts[i]) for i in batch_indices])
                 
-                # Generate response
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=100,
-                    do_sample=True,
-                    temperature=0.1,
-                    top_p=0.9,
-                    pad_token_id=self.tokenizer.eos_token_id
-                )
-                
-                # Decode response
-                response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-                
-                # Extract the classification part (after the prompt)
-                classification_start = response.find("Classification (respond with only")
-                if classification_start != -1:
-                    classification_response = response[classification_start:].split(":")[-1].strip()
-                else:
-                    classification_response = response.split(":")[-1].strip()
-                
-                # Parse predicted labels
-                predicted_labels = self._parse_classification_response(
-                    classification_response, self.all_labels
-                )
-                
-                # Create confidence scores (simplified approach)
-                confidence_scores = {}
-                all_scores = {}
-                
-                for label in self.all_labels:
-                    if label in predicted_labels:
-                        confidence_scores[label] = 0.8  # High confidence for predicted
-                        all_scores[label] = 0.8
-                    else:
-                        all_scores[label] = 0.2  # Low confidence for not predicted
-                
-                predictions.append({
-                    'predicted_domains': predicted_labels,
-                    'confidence_scores': confidence_scores,
-                    'all_scores': all_scores,
-                    'raw_response': classification_response
-                })
+                for i, response in zip(batch_indices, responses):
+                    classification_response = response.strip()
+                    
+                    # Parse predicted labels
+                    predicted_labels = self._parse_classification_response(
+                        classification_response, self.all_labels
+                    )
+                    
+                    # Confidence scores (simplified approach): high for predicted labels
+                    for label in predicted_labels:
+                        scores[i, label_index[label]] = 0.8
+                    
+                    extras[i] = {'raw_response': classification_response}
         
-        return predictions
+        # Parsed labels are the prediction regardless of the requested threshold
+        return PredictionBatch(scores, self.all_labels, threshold=0.5,
+                               report_all_confidences=self.report_all_confidences, extras=extras)
     
     def save_model(self, model_path: str):
         """Save the Gemma model configuration"""
@@ -926,6 +1755,8 @@ Classification (respond with only the relevant domain names, separated by commas
             'max_length': self.max_length,
             'num_labels': self.num_labels,
             'all_labels': self.all_labels,
+            'scoring': self.scoring,
+            'load_stats': self.load_stats,
             'is_gemma': True
         }
         
@@ -947,37 +1778,310 @@ Classification (respond with only the relevant domain names, separated by commas
         self.max_length = metadata['max_length']
         self.num_labels = metadata['num_labels']
         self.all_labels = metadata['all_labels']
+        if self.restore_scoring:
+            # Models saved before likelihood scoring existed were evaluated by generation
+            self.scoring = metadata.get('scoring', 'generate')
         
         # Reload the model
         hf_token = self._get_hf_token()
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.model_name,
+        self.tokenizer = self._load_tokenizer(hf_token)
+        self.model = self._load_causal_lm(hf_token)
+        
+        logger.info(f"Gemma model loaded from {model_path}")
+    
+    def _from_pretrained(self, loader: Any, **kwargs) -> Any:
+        """Load from the local Hugging Face cache first; only go to the Hub if it is missing"""
+        try:
+            return loader.from_pretrained(self.model_name, local_files_only=True, **kwargs)
+        except OSError:
+            return loader.from_pretrained(self.model_name, **kwargs)
+    
+    def _load_tokenizer(self, hf_token: Optional[str]) -> Any:
+        tokenizer = self._from_pretrained(
+            AutoTokenizer,
             use_fast=True,
             trust_remote_code=True,
             token=hf_token
         )
         
-        if self.tokenizer.pad_token is None:
-            self.tokenizer.pad_token = self.tokenizer.eos_token
+        # Add padding token if not present
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return tokenizer
+    
+    def _load_causal_lm(self, hf_token: Optional[str]) -> Any:
+        """Load the causal LM and record its load time and memory footprint in ``load_stats``"""
+        start = time.perf_counter()
+        rss_before = memory_stats.current_rss_mb()
         
         if self.device == 'cpu' or self.quantization_config is None:
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
-                torch_dtype=torch.float32,
-                device_map="cpu" if self.device == 'cpu' else "auto",
-                trust_remote_code=True,
-                token=hf_token
-            )
+            # Load without bitsandbytes quantization for CPU or when it is unavailable
+            kwargs = {
+                'torch_dtype': torch.float32,
+                'device_map': "cpu" if self.device == 'cpu' else "auto",
+                'trust_remote_code': True,
+                'token': hf_token
+            }
+            if self.low_memory and self.device == 'cpu':
+                # Safetensors shards are memory-mapped and copied tensor by tensor into
+                # reduced precision weights instead of materializing a float32 copy first
+                kwargs.update(torch_dtype=self.CPU_DTYPES[self.cpu_dtype], low_cpu_mem_usage=True)
+            model = self._from_pretrained(AutoModelForCausalLM, **kwargs)
+            
+            if self.weight_quantization and self.device == 'cpu':
+                model = self._quantize_weights(model)
         else:
-            self.model = AutoModelForCausalLM.from_pretrained(
-                self.model_name,
+            model = self._from_pretrained(
+                AutoModelForCausalLM,
                 quantization_config=self.quantization_config,
                 device_map="auto",
                 trust_remote_code=True,
                 token=hf_token
             )
         
-        logger.info(f"Gemma model loaded from {model_path}")
+        rss_after = memory_stats.current_rss_mb()
+        self.load_stats = {
+            'load_seconds': round(time.perf_counter() - start, 2),
+            'peak_rss_mb': round(memory_stats.peak_rss_mb(), 1),
+            'rss_increase_mb': round(rss_after - rss_before, 1),
+            'dtype': str(next(model.parameters()).dtype).replace('torch.', ''),
+            'low_memory': self.low_memory,
+            'weight_quantization': self.weight_quantization,
+            'device': self.device,
+        }
+        logger.info(f"Gemma model loaded in {self.load_stats['load_seconds']}s, "
+                    f"+{self.load_stats['rss_increase_mb']} MB RSS (peak {self.load_stats['peak_rss_mb']} MB)")
+        return model
+    
+    def _quantize_weights(self, model: Any) -> Any:
+        """Quantize linear layer weights to int8 in place (torchao, CPU weight-only)"""
+        if self.weight_quantization != 'int8':
+            raise ValueError(f"Unsupported weight quantization: {self.weight_quantization}")
+        try:
+            from torchao.quantization import quantize_
+            try:
+                from torchao.quantization import Int8WeightOnlyConfig
+                config = Int8WeightOnlyConfig()
+            except ImportError:
+                from torchao.quantization import int8_weight_only
+                config = int8_weight_only()
+        except ImportError:
+            logger.warning("torchao is not installed, serving without weight-only quantization")
+            return model
+        
+        quantize_(model, config)
+        logger.info("Applied int8 weight-only quantization")
+        return model
+
+
+class FusedLinearHead:
+    """
+    All per-label linear estimators of a MultiOutputClassifier fused into one weight matrix
+    
+    Scores are ``sigmoid(slope * (X @ weights + intercept) + offset)``: one sparse
+    matmul over the TF-IDF matrix plus a vectorized sigmoid, instead of one
+    ``predict_proba`` call per label. ``slope``/``offset`` hold each label's
+    probability calibration (identity for logistic regression, Platt scaling for
+    SVC). Labels that only had one class in training get a constant score.
+    """
+    
+    ARRAYS = ('weights', 'intercept', 'slope', 'offset', 'constant')
+    
+    def __init__(self, weights: np.ndarray, intercept: np.ndarray, slope: np.ndarray,
+                 offset: np.ndarray, constant: np.ndarray):
+        self.weights = weights
+        self.intercept = intercept
+        self.slope = slope
+        self.offset = offset
+        self.constant = constant
+        self._constant_columns = np.flatnonzero(~np.isnan(constant))
+    
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.weights.shape
+    
+    def predict_proba(self, X) -> np.ndarray:
+        """Return the (n_texts, n_labels) positive-class probabilities"""
+        decision = np.asarray(X @ self.weights, dtype=np.float32) + self.intercept
+        scores = 1.0 / (1.0 + np.exp(-(self.slope * decision + self.offset)))
+        if self._constant_columns.size:
+            scores[:, self._constant_columns] = self.constant[self._constant_columns]
+        return scores.astype(np.float32, copy=False)
+    
+    @classmethod
+    def from_estimators(cls, estimators: List[Any], n_features: int,
+                        tolerance: float = 1e-4) -> Optional['FusedLinearHead']:
+        """Fuse fitted binary estimators, or return None if any of them is not linear
+        
+        Each label's fused scores are checked against the estimator's own
+        ``predict_proba`` on a synthetic TF-IDF-like sample before it is accepted.
+        """
+        n_labels = len(estimators)
+        weights = np.zeros((n_features, n_labels), dtype=np.float32)
+        intercept = np.zeros(n_labels, dtype=np.float32)
+        slope = np.ones(n_labels, dtype=np.float32)
+        offset = np.zeros(n_labels, dtype=np.float32)
+        constant = np.full(n_labels, np.nan, dtype=np.float32)
+        
+        X_check = cls._parity_sample(n_features)
+        
+        for j, estimator in enumerate(estimators):
+            classes = np.asarray(estimator.classes_)
+            if classes.size < 2:
+                constant[j] = 1.0 if classes[0] == 1 else 0.0
+                continue
+            
+            try:
+                # Non-linear SVC kernels raise AttributeError here
+                coef = estimator.coef_
+            except AttributeError:
+                return None
+            if not hasattr(estimator, 'predict_proba'):
+                return None
+            
+            coef = coef.toarray() if sp.issparse(coef) else np.asarray(coef)
+            weights[:, j] = coef.ravel()
+            intercept[j] = np.asarray(estimator.intercept_).ravel()[0]
+            
+            if isinstance(estimator, SVC):
+                # Platt scaling; sign conventions differ between libsvm and sklearn,
+                # so keep whichever candidate reproduces predict_proba
+                A, B = float(estimator.probA_[0]), float(estimator.probB_[0])
+                candidates = [(-A, B), (A, -B), (-A, -B), (A, B)]
+            else:
+                candidates = [(1.0, 0.0)]
+            
+            decision = np.asarray(X_check @ weights[:, j]).ravel() + intercept[j]
+            expected = estimator.predict_proba(X_check)[:, int(np.flatnonzero(classes == 1)[0])]
+            for candidate_slope, candidate_offset in candidates:
+                fused = 1.0 / (1.0 + np.exp(-(candidate_slope * decision + candidate_offset)))
+                if np.allclose(fused, expected, atol=tolerance):
+                    slope[j], offset[j] = candidate_slope, candidate_offset
+                    break
+            else:
+                logger.info(f"Label {j} calibration could not be fused, using per-label inference")
+                return None
+        
+        return cls(weights, intercept, slope, offset, constant)
+    
+    @staticmethod
+    def _parity_sample(n_features: int, n_rows: int = 32):
+        """Random sparse, L2-normalized, non-negative rows shaped like TF-IDF output"""
+        density = min(1.0, 50.0 / max(n_features, 1))
+        X = sp.random(n_rows, n_features, density=density, format='csr', random_state=42)
+        return normalize(X)
+    
+    def save(self, path: str):
+        np.savez(path, **{name: getattr(self, name) for name in self.ARRAYS})
+    
+    @classmethod
+    def load(cls, path: str) -> 'FusedLinearHead':
+        with np.load(path, allow_pickle=False) as data:
+            return cls(*(data[name] for name in cls.ARRAYS))
+
+
+def _fit_linear_label(algorithm: str, C: float, X_fit, y_fit: np.ndarray, X_cal, y_cal: np.ndarray,
+                      random_state: int) -> Tuple:
+    """Fit one label's linear model and its probability calibration
+    
+    Returns:
+        Tuple of (coef, intercept, slope, offset, constant, fit_seconds)
+    """
+    start = time.perf_counter()
+    
+    if np.unique(y_fit).size < 2:
+        # Label never (or always) present in the fit fold
+        constant = float(y_fit[0]) if y_fit.size else 0.0
+        return None, 0.0, 1.0, 0.0, constant, time.perf_counter() - start
+    
+    if algorithm == 'svm':
+        estimator = LinearSVC(C=C, random_state=random_state)
+    else:
+        estimator = LogisticRegression(C=C, solver='liblinear', random_state=random_state)
+    estimator.fit(X_fit, y_fit)
+    
+    slope, offset = 1.0, 0.0
+    if algorithm == 'svm':
+        # Platt scaling of the SVM margin on the shared held-out fold
+        if np.unique(y_cal).size == 2:
+            decision = estimator.decision_function(X_cal).reshape(-1, 1)
+            platt = LogisticRegression(C=1e4)
+            platt.fit(decision, y_cal)
+            slope, offset = float(platt.coef_[0, 0]), float(platt.intercept_[0])
+        else:
+            logger.warning("Calibration fold has a single class for a label, using an uncalibrated margin")
+    
+    return (np.asarray(estimator.coef_).ravel(), float(estimator.intercept_[0]), slope, offset,
+            np.nan, time.perf_counter() - start)
+
+
+class LinearOneVsRestEngine:
+    """
+    One-vs-rest linear training engine over sparse TF-IDF features
+    
+    Fits one liblinear model per label (linear SVM or logistic regression),
+    labels in parallel across ``n_jobs`` threads (liblinear releases the GIL, so
+    the feature matrix is shared rather than copied). SVM margins are calibrated
+    with Platt scaling on one held-out fold shared by all labels instead of
+    libsvm's internal 5-fold CV per label. The fitted model is a
+    ``FusedLinearHead``.
+    """
+    
+    def __init__(self, algorithm: str = 'svm', C: float = 1.0, n_jobs: int = -1,
+                 calibration_size: float = 0.1, random_state: int = 42):
+        if algorithm not in ['svm', 'logistic_regression']:
+            raise ValueError(f"Unsupported linear algorithm: {algorithm}")
+        self.algorithm = algorithm
+        self.C = C
+        self.n_jobs = n_jobs
+        self.calibration_size = calibration_size
+        self.random_state = random_state
+        self.head = None
+        self.fit_seconds_ = []
+    
+    def fit(self, X, Y: np.ndarray) -> 'LinearOneVsRestEngine':
+        Y = np.asarray(Y)
+        n_samples, n_features = X.shape
+        n_labels = Y.shape[1]
+        
+        indices = np.arange(n_samples)
+        if self.algorithm == 'svm' and n_samples >= 10 and self.calibration_size > 0:
+            fit_idx, cal_idx = train_test_split(
+                indices, test_size=self.calibration_size, random_state=self.random_state
+            )
+        else:
+            fit_idx, cal_idx = indices, indices
+        X_fit, X_cal = X[fit_idx], X[cal_idx]
+        
+        results = Parallel(n_jobs=self.n_jobs, prefer='threads')(
+            delayed(_fit_linear_label)(
+                self.algorithm, self.C, X_fit, Y[fit_idx, j], X_cal, Y[cal_idx, j], self.random_state
+            )
+            for j in range(n_labels)
+        )
+        
+        weights = np.zeros((n_features, n_labels), dtype=np.float32)
+        intercept = np.zeros(n_labels, dtype=np.float32)
+        slope = np.ones(n_labels, dtype=np.float32)
+        offset = np.zeros(n_labels, dtype=np.float32)
+        constant = np.full(n_labels, np.nan, dtype=np.float32)
+        for j, (coef, label_intercept, label_slope, label_offset, label_constant, _) in enumerate(results):
+            if coef is not None:
+                weights[:, j] = coef
+            intercept[j] = label_intercept
+            slope[j] = label_slope
+            offset[j] = label_offset
+            constant[j] = label_constant
+        
+        self.head = FusedLinearHead(weights, intercept, slope, offset, constant)
+        self.fit_seconds_ = [result[-1] for result in results]
+        return self
+    
+    def predict_proba(self, X) -> np.ndarray:
+        """Return the (n_texts, n_labels) positive-class probabilities"""
+        if self.head is None:
+            raise ValueError("Engine must be fitted before making predictions")
+        return self.head.predict_proba(X)
 
 
 class TraditionalMLClassifier:
@@ -986,27 +2090,42 @@ class TraditionalMLClassifier:
     Supports SVM, Random Forest, and Logistic Regression
     """
     
-    def __init__(self, algorithm: str = 'svm', max_features: int = 10000, **kwargs):
+    # confidence_scores in predictions cover every label, not only predicted ones
+    report_all_confidences = True
+    
+    def __init__(self, algorithm: str = 'svm', max_features: int = 10000,
+                 use_fused_inference: bool = True, C: float = 1.0, kernel: str = 'linear',
+                 n_estimators: int = 100, max_depth: int = None, n_jobs: int = -1,
+                 use_compact_artifact: bool = True, **kwargs):
         self.algorithm = algorithm
         self.max_features = max_features
+        self.use_fused_inference = use_fused_inference
+        # Load the memory-mapped manifest + .npy artifact instead of the pickle when present
+        self.use_compact_artifact = use_compact_artifact
         # Ignore any extra parameters that might be passed
         self.vectorizer = None
         self.classifier = None
         self.label_encoder = None
         self.all_labels = None
+        self.fused_head = None
         
         # Initialize classifier based on algorithm
-        if algorithm == 'svm':
-            base_classifier = SVC(probability=True, kernel='linear', C=1.0)
+        if algorithm in ['svm', 'logistic_regression'] and kernel == 'linear':
+            # Parallel one-vs-rest liblinear engine with shared held-out calibration
+            self.classifier = LinearOneVsRestEngine(algorithm=algorithm, C=C, n_jobs=n_jobs)
+        elif algorithm == 'svm':
+            # Non-linear kernels still need libsvm
+            self.classifier = MultiOutputClassifier(
+                SVC(probability=True, kernel=kernel, C=C), n_jobs=n_jobs
+            )
         elif algorithm == 'random_forest':
-            base_classifier = RandomForestClassifier(n_estimators=100, random_state=42)
-        elif algorithm == 'logistic_regression':
-            base_classifier = LogisticRegression(max_iter=1000, random_state=42)
+            self.classifier = MultiOutputClassifier(
+                RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, random_state=42),
+                n_jobs=n_jobs
+            )
         else:
             raise ValueError(f"Unsupported algorithm: {algorithm}")
         
-        self.classifier = MultiOutputClassifier(base_classifier)
-        
         logger.info(f"Initialized traditional ML classifier: {algorithm}")
     
     def train(self, texts: List[str], labels: List[List[str]]) -> Dict:
@@ -1041,11 +2160,23 @@ class TraditionalMLClassifier:
             )
             
             # Train classifier
+            fit_start = time.perf_counter()
             self.classifier.fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - fit_start
+            self._compile_fused_head()
+            
+            label_fit_seconds = None
+            if isinstance(self.classifier, LinearOneVsRestEngine):
+                label_fit_seconds = {
+                    label: round(seconds, 4)
+                    for label, seconds in zip(self.all_labels, self.classifier.fit_seconds_)
+                }
+                slowest = max(label_fit_seconds, key=label_fit_seconds.get)
+                logger.info(f"Fitted {len(self.all_labels)} labels in {fit_seconds:.2f}s "
+                            f"(slowest: {slowest} {label_fit_seconds[slowest]:.2f}s)")
             
             # Evaluate on validation set
-            y_pred = self.classifier.predict(X_val)
-            y_pred_proba = self.classifier.predict_proba(X_val)
+            y_pred = (self._score_matrix(X_val) >= 0.5).astype(int)
             
             # Calculate metrics
             f1_macro = f1_score(y_val, y_pred, average='macro', zero_division=0)
@@ -1082,49 +2213,67 @@ class TraditionalMLClassifier:
                 'num_labels': len(self.all_labels),
                 'all_labels': self.all_labels,
                 'feature_count': X.shape[1],
-                'confusion_matrix': confusion_matrix_data
+                'confusion_matrix': confusion_matrix_data,
+                'fit_seconds': fit_seconds,
+                'label_fit_seconds': label_fit_seconds
             }
             
         except Exception as e:
             logger.error(f"Training failed: {str(e)}", exc_info=True)
             raise
     
-    def predict(self, texts: List[str], threshold: float = 0.5) -> List[Dict]:
-        """Make predictions on new texts"""
-        if not self.classifier or not self.vectorizer:
+    def predict_batch(self, texts: List[str], threshold: float = 0.5) -> PredictionBatch:
+        """Score texts with every per-label estimator into one score matrix"""
+        if self.vectorizer is None or (self.classifier is None and self.fused_head is None):
             raise ValueError("Model must be trained before making predictions")
         
         # Transform texts
         X = self.vectorizer.transform(texts)
         
-        # Get predictions
-        predictions = []
+        return PredictionBatch(self._score_matrix(X), self.all_labels, threshold,
+                               report_all_confidences=self.report_all_confidences)
+    
+    def _score_matrix(self, X, use_fused: bool = True) -> np.ndarray:
+        """Positive-class probabilities for a TF-IDF matrix, fused when possible"""
+        if use_fused and self.fused_head is not None:
+            return self.fused_head.predict_proba(X)
+        if isinstance(self.classifier, LinearOneVsRestEngine):
+            return self.classifier.predict_proba(X)
+        
+        # MultiOutputClassifier returns one (n_texts, n_classes) array per label
         y_pred_proba = self.classifier.predict_proba(X)
-        
-        for i, text in enumerate(texts):
-            # Extract probabilities for this sample
-            sample_probs = []
-            for j in range(len(self.all_labels)):
-                # Each classifier in MultiOutputClassifier returns probabilities for [0, 1]
-                prob = y_pred_proba[j][i][1] if hasattr(y_pred_proba[j], '__len__') else y_pred_proba[j][i]
-                sample_probs.append(prob)
-            
-            # Apply threshold
-            predicted_labels = []
-            confidence_scores = {}
-            
-            for label, prob in zip(self.all_labels, sample_probs):
-                confidence_scores[label] = float(prob)
-                if prob >= threshold:
-                    predicted_labels.append(label)
-            
-            predictions.append({
-                'predicted_domains': predicted_labels,
-                'confidence_scores': confidence_scores,
-                'all_scores': confidence_scores
-            })
-        
-        return predictions
+        scores = np.empty((X.shape[0], len(self.all_labels)), dtype=np.float32)
+        for j, (estimator, proba) in enumerate(zip(self.classifier.estimators_, y_pred_proba)):
+            positive = np.flatnonzero(estimator.classes_ == 1)
+            # A label that only had one class in training has no positive column
+            scores[:, j] = proba[:, positive[0]] if positive.size else 0.0
+        return scores
+    
+    def _compile_fused_head(self):
+        """Fuse the per-label estimators if the algorithm is linear"""
+        self.fused_head = None
+        if not self.use_fused_inference:
+            return
+        if isinstance(self.classifier, LinearOneVsRestEngine):
+            # The engine's fitted model already is a fused head
+            self.fused_head = self.classifier.head
+            return
+        try:
+            self.fused_head = FusedLinearHead.from_estimators(
+                self.classifier.estimators_, len(self.vectorizer.vocabulary_)
+            )
+        except Exception as e:
+            logger.warning(f"Could not compile fused linear head: {str(e)}")
+        if self.fused_head is not None:
+            logger.info(f"Compiled fused linear head {self.fused_head.shape} for {self.algorithm}")
+    
+    @staticmethod
+    def _fused_head_path(model_path: str) -> str:
+        return os.path.splitext(model_path)[0] + '_linear.npz'
+    
+    def predict(self, texts: List[str], threshold: float = 0.5) -> List[Dict]:
+        """Make predictions on new texts"""
+        return self.predict_batch(texts, threshold).to_dicts()
     
     def save_model(self, model_path: str):
         """Save the trained model"""
@@ -1143,10 +2292,43 @@ class TraditionalMLClassifier:
         with open(model_path, 'wb') as f:
             pickle.dump(model_data, f)
         
+        # The fused head is exported alongside the pickle
+        fused_path = self._fused_head_path(model_path)
+        if self.fused_head is not None:
+            self.fused_head.save(fused_path)
+        elif os.path.exists(fused_path):
+            os.remove(fused_path)
+        
+        # Linear models also get the compact, memory-mappable artifact serving loads first
+        compact_artifacts.remove_compact_artifact(model_path)
+        if self.fused_head is not None:
+            try:
+                self.save_compact(model_path)
+            except ValueError as e:
+                logger.warning(f"Could not write compact artifact: {str(e)}")
+        
         logger.info(f"Model saved to {model_path}")
     
+    def save_compact(self, model_path: str) -> str:
+        """Write the manifest + .npy artifact (vocabulary, IDF, fused head) next to ``model_path``"""
+        if self.fused_head is None or not isinstance(self.vectorizer, TfidfVectorizer):
+            raise ValueError("The compact format needs a fitted TfidfVectorizer and a linear model")
+        return compact_artifacts.save_compact(model_path, self.vectorizer, self.fused_head, {
+            'algorithm': self.algorithm,
+            'all_labels': self.all_labels,
+            'max_features': self.max_features,
+        })
+    
     def load_model(self, model_path: str):
-        """Load a trained model"""
+        """Load a trained model, from its compact artifact when there is one"""
+        if (self.use_fused_inference and self.use_compact_artifact
+                and compact_artifacts.has_compact_artifact(model_path)):
+            try:
+                self._load_compact(model_path)
+                return
+            except Exception as e:
+                logger.warning(f"Could not load compact artifact: {str(e)}, loading the pickle")
+        
         with open(model_path, 'rb') as f:
             model_data = pickle.load(f)
         
@@ -1157,7 +2339,37 @@ class TraditionalMLClassifier:
         self.all_labels = model_data['all_labels']
         self.max_features = model_data['max_features']
         
+        self.fused_head = None
+        fused_path = self._fused_head_path(model_path)
+        if self.use_fused_inference and os.path.exists(fused_path):
+            fused_head = FusedLinearHead.load(fused_path)
+            if fused_head.shape == (len(self.vectorizer.vocabulary_), len(self.all_labels)):
+                self.fused_head = fused_head
+            else:
+                logger.warning(f"Ignoring stale fused linear head at {fused_path}")
+        if self.fused_head is None:
+            # Models saved before fused inference existed are compiled on load
+            self._compile_fused_head()
+        
         logger.info(f"Model loaded from {model_path}")
+    
+    def _load_compact(self, model_path: str):
+        """Serve from the memory-mapped arrays; no estimators or Python vocabulary are loaded"""
+        artifact = compact_artifacts.load_compact(model_path)
+        fused_head = FusedLinearHead(*(artifact['arrays'][name] for name in FusedLinearHead.ARRAYS))
+        if fused_head.shape != (artifact['vectorizer'].n_features, len(artifact['all_labels'])):
+            raise ValueError(f"Fused head shape {fused_head.shape} does not match the vocabulary and labels")
+        
+        self.algorithm = artifact['algorithm']
+        self.all_labels = artifact['all_labels']
+        self.max_features = artifact['max_features']
+        self.vectorizer = artifact['vectorizer']
+        self.fused_head = fused_head
+        self.classifier = None
+        self.label_encoder = MultiLabelBinarizer()
+        self.label_encoder.classes_ = np.array(self.all_labels)
+        
+        logger.info(f"Model loaded from compact artifact {compact_artifacts.compact_dir(model_path)}")
 
 
 class HybridEnsembleClassifier:
@@ -1165,13 +2377,25 @@ class HybridEnsembleClassifier:
     Ensemble classifier combining transformer and traditional ML approaches
     """
     
+    # confidence_scores in predictions only cover the predicted labels
+    report_all_confidences = False
+    
     def __init__(self, transformer_type: str = 'biobert', traditional_algorithm: str = 'svm',
-                 ensemble_method: str = 'voting'):
+                 ensemble_method: str = 'voting', concurrent_components: bool = True,
+                 pipeline_batch_size: int = 16):
         self.transformer_classifier = TransformerClassifier(model_type=transformer_type)
         self.traditional_classifier = TraditionalMLClassifier(algorithm=traditional_algorithm)
         self.ensemble_method = ensemble_method
         self.weights = {'transformer': 0.7, 'traditional': 0.3}  # Default weights
         
+        # Score the traditional model on a side thread, overlapping the transformer forward pass
+        self.concurrent_components = concurrent_components
+        # Texts per pipeline stage (0 = the whole batch in one stage)
+        self.pipeline_batch_size = pipeline_batch_size
+        self.last_timing = None
+        self._executor = None
+        self._executor_pid = None
+        
         logger.info(f"Initialized hybrid ensemble: {transformer_type} + {traditional_algorithm}")
     
     def train(self, texts: List[str], labels: List[List[str]], 
@@ -1194,51 +2418,81 @@ class HybridEnsembleClassifier:
             'weights': self.weights
         }
     
+    def _component_executor(self) -> ThreadPoolExecutor:
+        """Single side thread for the traditional model (recreated after a fork)"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hybrid-traditional')
+            self._executor_pid = os.getpid()
+        return self._executor
+    
+    def _score_traditional(self, texts: List[str]) -> Tuple[PredictionBatch, float]:
+        start = time.perf_counter()
+        batch = self.traditional_classifier.predict_batch(texts, threshold=0.0)
+        return batch, time.perf_counter() - start
+    
+    def predict_batch(self, texts: List[str], threshold: float = 0.5, batch_size: int = None) -> PredictionBatch:
+        """Weighted average of both models' score matrices
+        
+        Texts are processed in pipeline stages of ``batch_size`` (default
+        ``pipeline_batch_size``). With concurrent components every stage's
+        traditional scores are queued on a side thread up front, so TF-IDF
+        scoring of stage k+1 runs while the transformer (which releases the GIL
+        in its forward pass) processes stage k. Per-call timings, including the
+        overlap gained, are kept in ``last_timing``.
+        """
+        labels = self.transformer_classifier.all_labels
+        if not texts:
+            return PredictionBatch(np.zeros((0, len(labels)), dtype=np.float32), labels, threshold,
+                                   report_all_confidences=self.report_all_confidences)
+        
+        start = time.perf_counter()
+        stage_size = batch_size or self.pipeline_batch_size or len(texts)
+        stages = [texts[i:i + stage_size] for i in range(0, len(texts), stage_size)]
+        
+        futures = None
+        if self.concurrent_components:
+            executor = self._component_executor()
+            futures = [executor.submit(self._score_traditional, stage) for stage in stages]
+        
+        transformer_batches, traditional_batches = [], []
+        transformer_seconds = traditional_seconds = 0.0
+        for stage in stages:
+            stage_start = time.perf_counter()
+            transformer_batches.append(self.transformer_classifier.predict_batch(stage, threshold=0.0))
+            transformer_seconds += time.perf_counter() - stage_start
+            if futures is None:
+                batch, seconds = self._score_traditional(stage)
+                traditional_batches.append(batch)
+                traditional_seconds += seconds
+        
+        if futures is not None:
+            for future in futures:
+                batch, seconds = future.result()
+                traditional_batches.append(batch)
+                traditional_seconds += seconds
+        
+        batches = {
+            'transformer': PredictionBatch.concatenate(transformer_batches),
+            'traditional': PredictionBatch.concatenate(traditional_batches)
+        }
+        result = PredictionBatch.weighted_average(batches, self.weights, labels, threshold,
+                                                  self.report_all_confidences)
+        
+        wall_seconds = time.perf_counter() - start
+        self.last_timing = {
+            'concurrent': self.concurrent_components,
+            'stages': len(stages),
+            'transformer_ms': transformer_seconds * 1000,
+            'traditional_ms': traditional_seconds * 1000,
+            'wall_ms': wall_seconds * 1000,
+            # Time saved versus running the components back to back
+            'overlap_ms': max(0.0, (transformer_seconds + traditional_seconds - wall_seconds) * 1000),
+        }
+        return result
+    
     def predict(self, texts: List[str], threshold: float = 0.5) -> List[Dict]:
         """Make ensemble predictions"""
-        # Get predictions from both models
-        transformer_predictions = self.transformer_classifier.predict(texts, threshold=0.0)
-        traditional_predictions = self.traditional_classifier.predict(texts, threshold=0.0)
-        
-        ensemble_predictions = []
-        
-        for i, text in enumerate(texts):
-            trans_scores = transformer_predictions[i]['all_scores']
-            trad_scores = traditional_predictions[i]['all_scores']
-            
-            # Combine scores using weighted average
-            combined_scores = {}
-            for label in self.transformer_classifier.all_labels:
-                trans_score = trans_scores.get(label, 0.0)
-                trad_score = trad_scores.get(label, 0.0)
-                
-                combined_scores[label] = (
-                    self.weights['transformer'] * trans_score +
-                    self.weights['traditional'] * trad_score
-                )
-            
-            # Apply threshold to combined scores
-            predicted_labels = [
-                label for label, score in combined_scores.items()
-                if score >= threshold
-            ]
-            
-            confidence_scores = {
-                label: score for label, score in combined_scores.items()
-                if label in predicted_labels
-            }
-            
-            ensemble_predictions.append({
-                'predicted_domains': predicted_labels,
-                'confidence_scores': confidence_scores,
-                'all_scores': combined_scores,
-                'individual_predictions': {
-                    'transformer': transformer_predictions[i],
-                    'traditional': traditional_predictions[i]
-                }
-            })
-        
-        return ensemble_predictions
+        return self.predict_batch(texts, threshold).to_dicts()
     
     def save_model(self, model_path: str):
         """Save the ensemble model"""
@@ -1249,12 +2503,13 @@ class HybridEnsembleClassifier:
         self.transformer_classifier.save_model(transformer_path)
         self.traditional_classifier.save_model(traditional_path)
         
-        # Save ensemble metadata
+        # Save ensemble metadata (component paths relative to the ensemble file,
+        # so the artifacts survive moving media/trained_models/)
         ensemble_data = {
             'ensemble_method': self.ensemble_method,
             'weights': self.weights,
-            'transformer_path': transformer_path,
-            'traditional_path': traditional_path
+            'transformer_path': os.path.basename(transformer_path),
+            'traditional_path': os.path.basename(traditional_path)
         }
         
         with open(model_path, 'wb') as f:
@@ -1271,18 +2526,30 @@ class HybridEnsembleClassifier:
         self.weights = ensemble_data['weights']
         
         # Load individual models
-        self.transformer_classifier.load_model(ensemble_data['transformer_path'])
-        self.traditional_classifier.load_model(ensemble_data['traditional_path'])
+        self.transformer_classifier.load_model(self._component_path(model_path, ensemble_data['transformer_path']))
+        self.traditional_classifier.load_model(self._component_path(model_path, ensemble_data['traditional_path']))
         
         logger.info(f"Ensemble model loaded from {model_path}")
+    
+    @staticmethod
+    def _component_path(model_path: str, stored_path: str) -> str:
+        """Resolve a component path stored in the ensemble file
+        
+        Older ensembles stored absolute paths; if those no longer exist the
+        component is looked up next to the ensemble file instead.
+        """
+        if os.path.isabs(stored_path) and os.path.exists(stored_path):
+            return stored_path
+        return os.path.join(os.path.dirname(model_path), os.path.basename(stored_path))
 
 
 def create_model(model_type: str, **kwargs) -> Any:
     """Factory function to create appropriate model based on type"""
     if model_type in ['bert', 'biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
         # Extract specific model name if provided
+        bert_model = kwargs.pop('bert_model', None)
         if model_type == 'bert':
-            model_type = kwargs.get('bert_model', 'biobert')
+            model_type = bert_model or 'biobert'
         return TransformerClassifier(model_type=model_type, **kwargs)
     
     elif model_type in ['gemma2-2b']:
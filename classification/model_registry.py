@@ -0,0 +1,358 @@
+"""
+Process-wide registry of loaded ML models for inference
+Keeps trained classifiers in memory between predictions instead of reloading
+weights and tokenizers from media/trained_models/ on every request
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from django.conf import settings
+
+from .ml_models import create_model
+
+logger = logging.getLogger(__name__)
+
+
+def artifact_version(path: str) -> Tuple[float, int]:
+    """Return a cheap version signature (latest mtime, total size) for a model artifact
+
+    BERT models are stored as directories, traditional/hybrid models as single
+    .pkl files, so both layouts are handled. Retraining a model rewrites its
+    artifact, which changes the signature and makes the registry reload it.
+    """
+    if os.path.isdir(path):
+        latest_mtime = os.path.getmtime(path)
+        total_size = 0
+        for root, _dirs, files in os.walk(path):
+            for file in files:
+                try:
+                    stat = os.stat(os.path.join(root, file))
+                except OSError:
+                    continue
+                latest_mtime = max(latest_mtime, stat.st_mtime)
+                total_size += stat.st_size
+        return latest_mtime, total_size
+
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+class _RegistryEntry:
+    """A loaded model together with its bookkeeping data"""
+
+    def __init__(self, model: Any, version: Tuple, size_bytes: int):
+        self.model = model
+        self.version = version
+        self.size_bytes = size_bytes
+        self.loaded_at = time.time()
+        self.last_access = self.loaded_at
+        self.hits = 0
+
+
+class _InFlightLoad:
+    """Shared state for a load that other threads can wait on (single-flight)"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.model = None
+        self.error = None
+
+
+class ModelRegistry:
+    """
+    Thread-safe LRU registry of loaded models
+
+    Entries are keyed by ``MLModel.id`` and tagged with the model version.
+    The registry enforces a memory budget and a maximum number of entries
+    (evicting least recently used models first) and drops entries that have
+    not been used for ``ttl`` seconds. Concurrent requests for a model that
+    is not loaded yet share a single load. Pinned models (the warm pool) are
+    exempt from TTL expiry and LRU eviction.
+    """
+
+    def __init__(self, max_memory_mb: int = 4096, max_entries: int = 4, ttl: int = 300):
+        self.max_memory_bytes = max_memory_mb * 1024 * 1024
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[int, _RegistryEntry]" = OrderedDict()
+        self._in_flight: Dict[Tuple, _InFlightLoad] = {}
+        self._pinned = set()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: int, version: Tuple, loader: Callable[[], Any],
+            size_bytes: int = 0) -> Any:
+        """Return the model for ``key``, calling ``loader`` only if it is not cached
+
+        Args:
+            key: Registry key (the ``MLModel`` primary key)
+            version: Model version (see ``model_version``); a different version forces a reload
+            loader: Callable returning a loaded, ready-to-predict model
+            size_bytes: Estimated memory footprint used for the memory budget
+        """
+        with self._lock:
+            self._expire_locked()
+
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                entry.last_access = time.time()
+                entry.hits += 1
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.model
+
+            if entry is not None:
+                logger.info(f"Model {key} artifact or serving options changed, reloading")
+                self._evict_locked(key)
+
+            self.misses += 1
+            flight_key = (key, version)
+            in_flight = self._in_flight.get(flight_key)
+            is_owner = in_flight is None
+            if is_owner:
+                in_flight = _InFlightLoad()
+                self._in_flight[flight_key] = in_flight
+
+        if not is_owner:
+            # Another thread is already loading this model - wait for it
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.model
+
+        try:
+            load_start = time.time()
+            model = loader()
+            logger.info(f"Loaded model {key} into registry in {time.time() - load_start:.2f}s")
+        except Exception as e:
+            in_flight.error = e
+            raise
+        else:
+            in_flight.model = model
+            with self._lock:
+                self._entries[key] = _RegistryEntry(model, version, size_bytes)
+                self._enforce_limits_locked()
+            return model
+        finally:
+            with self._lock:
+                self._in_flight.pop(flight_key, None)
+            in_flight.event.set()
+
+    def invalidate(self, key: int) -> bool:
+        """Drop a model from the registry (e.g. after it was deleted or retrained)"""
+        with self._lock:
+            if key in self._entries:
+                self._evict_locked(key)
+                return True
+        return False
+
+    def pin(self, key: int) -> bool:
+        """Keep ``key`` loaded regardless of idle time and LRU pressure
+
+        Pinned models must fit the registry budget with one entry to spare for
+        on-demand loads; a pin that would exceed it is refused.
+
+        Returns:
+            Whether ``key`` is pinned
+        """
+        with self._lock:
+            if key in self._pinned:
+                return True
+            pinned = self._pinned | {key}
+            pinned_bytes = sum(
+                entry.size_bytes for k, entry in self._entries.items() if k in pinned
+            )
+            if len(pinned) >= self.max_entries or pinned_bytes > self.max_memory_bytes:
+                logger.warning(
+                    f"Not pinning model {key}: pinned models would exceed the registry budget "
+                    f"({self.max_entries} entries, {self.max_memory_bytes // (1024 * 1024)} MB)"
+                )
+                return False
+            self._pinned.add(key)
+            return True
+
+    def unpin(self, key: int):
+        with self._lock:
+            self._pinned.discard(key)
+
+    def is_loaded(self, key: int) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def peek(self, key: int) -> Any:
+        """Return a loaded model without counting a hit or touching its LRU position"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.model if entry is not None else None
+
+    def clear(self):
+        """Drop all loaded models"""
+        with self._lock:
+            for key in list(self._entries):
+                self._evict_locked(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return registry statistics for monitoring"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'memory_mb': round(self._total_bytes_locked() / (1024 * 1024), 2),
+                'max_memory_mb': round(self.max_memory_bytes / (1024 * 1024), 2),
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'pinned': sorted(self._pinned),
+                'models': {
+                    key: {
+                        'size_mb': round(entry.size_bytes / (1024 * 1024), 2),
+                        'hits': entry.hits,
+                        'idle_seconds': round(time.time() - entry.last_access, 1),
+                    }
+                    for key, entry in self._entries.items()
+                },
+            }
+
+    def _total_bytes_locked(self) -> int:
+        return sum(entry.size_bytes for entry in self._entries.values())
+
+    def _evict_locked(self, key: int):
+        self._entries.pop(key, None)
+        self.evictions += 1
+        logger.info(f"Evicted model {key} from registry")
+
+    def _expire_locked(self):
+        if self.ttl <= 0:
+            return
+        cutoff = time.time() - self.ttl
+        for key in [k for k, entry in self._entries.items()
+                    if entry.last_access < cutoff and k not in self._pinned]:
+            self._evict_locked(key)
+
+    def _enforce_limits_locked(self):
+        # Always keep the most recently loaded model, even if it alone exceeds the budget
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries
+            or self._total_bytes_locked() > self.max_memory_bytes
+        ):
+            newest_key = next(reversed(self._entries))
+            evictable = [k for k in self._entries if k not in self._pinned and k != newest_key]
+            if not evictable:
+                break
+            self._evict_locked(evictable[0])
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_model_registry() -> ModelRegistry:
+    """Return the process-wide model registry, creating it from settings on first use"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(
+                    max_memory_mb=getattr(settings, 'ML_MODEL_CACHE_MAX_MEMORY_MB', 4096),
+                    max_entries=getattr(settings, 'ML_MODEL_CACHE_MAX_ENTRIES', 4),
+                    ttl=getattr(settings, 'ML_MODEL_CACHE_TTL', 300),
+                )
+    return _registry
+
+
+def inference_backend_for(model) -> str:
+    """Serving backend for a transformer model: MLModel.parameters, then settings"""
+    parameters = model.parameters or {}
+    return parameters.get('inference_backend', getattr(settings, 'ML_INFERENCE_BACKEND', 'eager'))
+
+
+def gemma_options(model) -> Dict[str, Any]:
+    """Scoring and loading options for a Gemma model: MLModel.parameters, then settings
+
+    A loaded model keeps the scoring mode saved with it unless MLModel.parameters sets one.
+    """
+    parameters = model.parameters or {}
+    return {
+        'scoring': parameters.get('scoring', getattr(settings, 'GEMMA_SCORING_MODE', 'generate')),
+        'restore_scoring': 'scoring' not in parameters,
+        'likelihood_max_rows': parameters.get(
+            'likelihood_max_rows', getattr(settings, 'GEMMA_LIKELIHOOD_MAX_ROWS', 8)
+        ),
+        'low_memory': parameters.get('low_memory', getattr(settings, 'GEMMA_LOW_MEMORY', False)),
+        'cpu_dtype': parameters.get('cpu_dtype', getattr(settings, 'GEMMA_CPU_DTYPE', 'bfloat16')),
+        'weight_quantization': parameters.get(
+            'weight_quantization', getattr(settings, 'GEMMA_WEIGHT_QUANTIZATION', '')
+        ) or None,
+    }
+
+
+def serving_options(model) -> Dict[str, Any]:
+    """``create_model`` arguments an ``MLModel`` row is served with: MLModel.parameters, then settings"""
+    parameters = model.parameters or {}
+
+    if model.model_type == 'bert':
+        return {
+            'model_type': parameters.get('bert_model', 'biobert'),
+            'backend': inference_backend_for(model),
+            'quantized': parameters.get('quantized', False),
+        }
+    elif model.model_type in ['biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
+        return {
+            'model_type': model.model_type,
+            'backend': inference_backend_for(model),
+            'quantized': parameters.get('quantized', False),
+        }
+    elif model.model_type in ['gemma2-2b']:
+        return {'model_type': model.model_type, **gemma_options(model)}
+    elif model.model_type == 'traditional':
+        return {'model_type': 'traditional', 'algorithm': parameters.get('algorithm', 'svm')}
+    elif model.model_type == 'hybrid':
+        return {
+            'model_type': 'hybrid',
+            'transformer_type': parameters.get('transformer_type', 'biobert'),
+            'traditional_algorithm': parameters.get('traditional_algorithm', 'svm'),
+            'concurrent_components': getattr(settings, 'HYBRID_CONCURRENT_COMPONENTS', True),
+            'pipeline_batch_size': getattr(settings, 'HYBRID_PIPELINE_BATCH_SIZE', 16),
+        }
+    else:
+        raise ValueError(f"Unsupported model type: {model.model_type}")
+
+
+def build_inference_model(model) -> Any:
+    """Create an (unloaded) classifier instance matching an ``MLModel`` row"""
+    return create_model(**serving_options(model))
+
+
+def model_version(model, model_file_path: str) -> Tuple:
+    """Version signature of a served model: its artifact version plus a digest of its serving options
+
+    Changing MLModel.parameters (backend, quantization, Gemma scoring or loading
+    options) or the matching settings changes the signature, so every process
+    reloads the model on its next request, not only the one that made the change.
+    """
+    options = json.dumps(serving_options(model), sort_keys=True, default=str)
+    return artifact_version(model_file_path) + (hashlib.sha1(options.encode('utf-8')).hexdigest()[:12],)
+
+
+def get_trained_model(model, model_file_path: str, version: Optional[Tuple] = None) -> Any:
+    """Return a loaded classifier for ``model``, served from the registry when possible"""
+    version = version or model_version(model, model_file_path)
+
+    def loader():
+        ml_model = build_inference_model(model)
+        ml_model.load_model(model_file_path)
+        return ml_model
+
+    # On-disk artifact size is a reasonable proxy for the in-memory footprint
+    return get_model_registry().get(model.id, version, loader, size_bytes=version[1])
@@ -56,6 +56,15 @@ class MLModel(models.Model):
         related_name='models',
         help_text="Dataset used for training"
     )
+    dataset_snapshot_version = models.IntegerField(
+        null=True, blank=True,
+        help_text="Version of the dataset snapshot the model was trained on"
+    )
+    dataset_snapshot_hash = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Content hash of the dataset snapshot the model was trained on"
+    )
     parameters = models.JSONField(
         default=dict,
         help_text="Model hyperparameters and configuration"
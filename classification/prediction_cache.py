@@ -0,0 +1,211 @@
+"""
+Content-addressed prediction cache shared across workers
+Stores per-label scores keyed by model, model version (artifact and serving
+options) and a hash of the normalized article text, so repeat classifications
+of the same article skip model loading and inference entirely
+"""
+import hashlib
+import logging
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _cache():
+    return caches[getattr(settings, 'PREDICTION_CACHE_ALIAS', 'default')]
+
+
+def cache_enabled() -> bool:
+    """Whether predictions should be looked up in / stored to the cache"""
+    return getattr(settings, 'PREDICTION_CACHE_ENABLED', True)
+
+
+def normalize_text(title: str, abstract: str) -> str:
+    """Normalize an article so trivially different copies share a cache entry"""
+    text = unicodedata.normalize('NFC', f"{title} {abstract}")
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def text_hash(title: str, abstract: str) -> str:
+    return hashlib.sha256(normalize_text(title, abstract).encode('utf-8')).hexdigest()
+
+
+def version_token(version: Tuple) -> str:
+    """Short stable token for a model version signature (see ``model_registry.model_version``)"""
+    return hashlib.sha1(repr(version).encode('utf-8')).hexdigest()[:12]
+
+
+def _generation_key(model_id: int) -> str:
+    return f"prediction_cache:generation:{model_id}"
+
+
+def _generation(model_id: int) -> int:
+    return _cache().get(_generation_key(model_id), 0)
+
+
+def _entry_key(model_id: int, generation: int, version: str, digest: str) -> str:
+    return f"prediction_cache:{model_id}:{generation}:{version}:{digest}"
+
+
+def _incr_counter(name: str, amount: int = 1):
+    if amount <= 0:
+        return
+    key = f"prediction_cache:{name}"
+    cache = _cache()
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Counter does not exist yet
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def applies(entry: Dict, threshold: float) -> bool:
+    """Whether a cached entry can answer a request at ``threshold``
+
+    Entries of classifiers whose confidences only cover the predicted labels keep
+    the model's own prediction, which is only valid for the threshold it was made at.
+    """
+    return entry.get('predicted_domains') is None or entry.get('threshold') == threshold
+
+
+def derive_prediction(entry: Dict, threshold: float) -> Tuple[List[str], Dict[str, float], Dict[str, float]]:
+    """Apply ``threshold`` to a cached entry
+
+    Returns:
+        Tuple of (predicted_domains, confidence_scores, all_scores)
+    """
+    all_scores = entry['all_scores']
+    if entry.get('predicted_domains') is not None:
+        predicted_domains = list(entry['predicted_domains'])
+    else:
+        predicted_domains = [label for label, score in all_scores.items() if score >= threshold]
+    if entry.get('all_confidences'):
+        confidence_scores = dict(all_scores)
+    else:
+        confidence_scores = {label: all_scores[label] for label in predicted_domains}
+    return predicted_domains, confidence_scores, all_scores
+
+
+def make_entry(all_scores: Dict[str, float], all_confidences: bool,
+               predicted_domains: List[str], threshold: float) -> Dict:
+    """Build a cache entry from a model's prediction
+
+    Scores of classifiers that report confidences for every label
+    (transformer/traditional) are threshold-independent and re-thresholded on
+    every hit. For the others (e.g. Gemma, whose generated labels ignore the
+    threshold) the model's own predicted domains are kept with their threshold.
+
+    Args:
+        all_scores: Score for every label
+        all_confidences: Whether the classifier reports confidence_scores for every
+            label rather than only predicted ones
+        predicted_domains: Labels the model predicted at ``threshold``
+        threshold: Threshold the prediction was made at
+    """
+    return {
+        'all_scores': {label: float(score) for label, score in all_scores.items()},
+        'all_confidences': all_confidences,
+        'predicted_domains': None if all_confidences else list(predicted_domains),
+        'threshold': threshold,
+    }
+
+
+def get_many(model_id: int, version: Tuple, articles: Iterable[Dict], threshold: float) -> List[Optional[Dict]]:
+    """Look up cached entries for ``articles`` (dicts with 'title' and 'abstract')
+
+    Returns one entry (or None on a miss) per article, in order. Entries that
+    do not apply at ``threshold`` count as misses.
+    """
+    articles = list(articles)
+    if not cache_enabled() or not articles:
+        return [None] * len(articles)
+
+    try:
+        generation = _generation(model_id)
+        token = version_token(version)
+        keys = [
+            _entry_key(model_id, generation, token, text_hash(article['title'], article['abstract']))
+            for article in articles
+        ]
+        found = _cache().get_many(keys)
+        entries = [
+            entry if entry is not None and applies(entry, threshold) else None
+            for entry in (found.get(key) for key in keys)
+        ]
+
+        hits = sum(1 for entry in entries if entry is not None)
+        _incr_counter('hits', hits)
+        _incr_counter('misses', len(entries) - hits)
+        return entries
+    except Exception as e:
+        logger.warning(f"Prediction cache lookup failed: {str(e)}")
+        return [None] * len(articles)
+
+
+def set_many(model_id: int, version: Tuple, articles: Iterable[Dict], entries: Iterable[Dict]):
+    """Store entries for ``articles`` (dicts with 'title' and 'abstract')"""
+    if not cache_enabled():
+        return
+
+    try:
+        generation = _generation(model_id)
+        token = version_token(version)
+        values = {
+            _entry_key(model_id, generation, token, text_hash(article['title'], article['abstract'])): entry
+            for article, entry in zip(articles, entries)
+        }
+        if values:
+            _cache().set_many(values, timeout=getattr(settings, 'PREDICTION_CACHE_TTL', 86400))
+    except Exception as e:
+        logger.warning(f"Prediction cache store failed: {str(e)}")
+
+
+def lookup(model_id: int, version: Tuple, title: str, abstract: str, threshold: float) -> Optional[Dict]:
+    """Look up the cached entry for a single article"""
+    return get_many(model_id, version, [{'title': title, 'abstract': abstract}], threshold)[0]
+
+
+def store(model_id: int, version: Tuple, title: str, abstract: str, entry: Dict):
+    """Store the entry for a single article"""
+    set_many(model_id, version, [{'title': title, 'abstract': abstract}], [entry])
+
+
+def invalidate_model(model_id: int):
+    """Invalidate every cached prediction of a model (after retraining or deletion)
+
+    Entries are not deleted one by one; bumping the model's generation makes the
+    old keys unreachable and they expire with their TTL.
+    """
+    cache = _cache()
+    key = _generation_key(model_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+    except Exception as e:
+        logger.warning(f"Failed to invalidate prediction cache for model {model_id}: {str(e)}")
+
+
+def stats() -> Dict:
+    """Return shared hit/miss counters"""
+    try:
+        counters = _cache().get_many(['prediction_cache:hits', 'prediction_cache:misses'])
+    except Exception:
+        counters = {}
+    hits = counters.get('prediction_cache:hits', 0)
+    misses = counters.get('prediction_cache:misses', 0)
+    return {
+        'enabled': cache_enabled(),
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        'ttl_seconds': getattr(settings, 'PREDICTION_CACHE_TTL', 86400),
+    }
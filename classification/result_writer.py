@@ -0,0 +1,248 @@
+"""
+Write-behind persistence for ClassificationResult rows
+Buffers prediction results in memory and flushes them with bulk_create from a
+background thread, so serving latency no longer includes the INSERT
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import deque
+from typing import Dict, List
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .models import ClassificationResult
+
+logger = logging.getLogger(__name__)
+
+# Durability modes
+SYNC = 'sync'                # INSERT in the request path (no buffering)
+ASYNC = 'async'              # Buffer; when the buffer is full the caller flushes (backpressure, no drops)
+BEST_EFFORT = 'best_effort'  # Buffer; when the buffer is full the oldest rows are dropped
+
+DURABILITY_MODES = [SYNC, ASYNC, BEST_EFFORT]
+
+# Upper bound of the delay between retries of a failed flush, in seconds
+MAX_RETRY_BACKOFF = 30.0
+
+
+class ResultWriter:
+    """
+    Bounded write-behind buffer for ClassificationResult rows
+
+    Rows are flushed with one ``bulk_create`` whenever ``flush_size`` rows are
+    pending or ``flush_interval`` seconds have passed since the oldest pending
+    row was buffered. Pending rows are flushed on interpreter shutdown and on
+    Celery worker process shutdown. Note that ``created_at`` is set when a row
+    is flushed, which may lag the prediction by up to ``flush_interval``.
+
+    When a flush fails (e.g. SQLite's "database is locked"), ASYNC puts the
+    rows back at the front of the buffer and retries with exponential backoff;
+    they are only dropped after ``max_retries`` consecutive failures, or when
+    re-queueing them would grow the buffer past ``max_buffer`` (the oldest rows
+    go first). BEST_EFFORT drops them right away.
+    """
+
+    def __init__(self, mode: str = SYNC, max_buffer: int = 1000,
+                 flush_size: int = 100, flush_interval: float = 1.0, max_retries: int = 5):
+        if mode not in DURABILITY_MODES:
+            raise ValueError(f"Unsupported result write mode: {mode}")
+
+        self.mode = mode
+        self.max_buffer = max_buffer
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+
+        self._buffer = deque()
+        self._oldest_at = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._stopped = False
+
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self.flush_errors = 0
+        self.retries = 0
+        self.total_flush_ms = 0.0
+
+    def save(self, result: ClassificationResult) -> ClassificationResult:
+        """Persist one result; in buffered modes ``result.id`` stays None"""
+        return self.save_many([result])[0]
+
+    def save_many(self, results: List[ClassificationResult]) -> List[ClassificationResult]:
+        """Persist results according to the durability mode"""
+        if not results:
+            return results
+
+        if self.mode == SYNC or self._stopped:
+            return self._write(results)
+
+        overflow = []
+        with self._lock:
+            if self._oldest_at is None:
+                self._oldest_at = time.time()
+            self._buffer.extend(results)
+
+            while len(self._buffer) > self.max_buffer:
+                row = self._buffer.popleft()
+                if self.mode == BEST_EFFORT:
+                    self.rows_dropped += 1
+                else:
+                    overflow.append(row)
+
+            should_wake = len(self._buffer) >= self.flush_size
+
+        self._ensure_thread()
+
+        if overflow:
+            # Buffer is full: apply backpressure by writing the oldest rows ourselves
+            self._write(overflow, buffered=True)
+        if should_wake:
+            self._wakeup.set()
+
+        return results
+
+    def flush(self):
+        """Write all pending rows now"""
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._buffer)
+                self._buffer.clear()
+                self._oldest_at = None
+            if rows:
+                self._write(rows, buffered=True)
+
+    def stop(self):
+        """Flush pending rows and switch to synchronous writes (shutdown hook)"""
+        self._stopped = True
+        self._wakeup.set()
+        self.flush()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pending = len(self._buffer)
+        return {
+            'mode': self.mode,
+            'pending': pending,
+            'max_buffer': self.max_buffer,
+            'flush_size': self.flush_size,
+            'flush_interval_seconds': self.flush_interval,
+            'rows_written': self.rows_written,
+            'rows_dropped': self.rows_dropped,
+            'flushes': self.flushes,
+            'flush_errors': self.flush_errors,
+            'retries': self.retries,
+            'avg_flush_ms': round(self.total_flush_ms / self.flushes, 3) if self.flushes else 0.0,
+        }
+
+    def _write(self, rows: List[ClassificationResult], buffered: bool = False) -> List[ClassificationResult]:
+        start = time.perf_counter()
+        try:
+            written = ClassificationResult.objects.bulk_create(rows)
+        except Exception as e:
+            self.flush_errors += 1
+            if buffered:
+                self._retry_or_drop(rows, e)
+            else:
+                logger.error(f"Failed to write {len(rows)} classification results: {str(e)}", exc_info=True)
+            return rows
+        self._failures = 0
+        self.flushes += 1
+        self.rows_written += len(written)
+        self.total_flush_ms += (time.perf_counter() - start) * 1000
+        return written
+
+    def _retry_or_drop(self, rows: List[ClassificationResult], error: Exception):
+        """Put rows of a failed flush back in the buffer, or drop them (BEST_EFFORT, retries exhausted, shutdown)"""
+        with self._lock:
+            self._failures += 1
+            attempt = self._failures
+            retry = self.mode != BEST_EFFORT and not self._stopped and attempt <= self.max_retries
+            overflow = 0
+            if retry:
+                self._buffer.extendleft(reversed(rows))
+                self._oldest_at = self._oldest_at or time.time()
+                # A failing database must not grow the buffer past its bound
+                overflow = max(0, len(self._buffer) - self.max_buffer)
+                for _ in range(overflow):
+                    self._buffer.popleft()
+                self.rows_dropped += overflow
+                backoff = min(MAX_RETRY_BACKOFF, self.flush_interval * 2 ** (attempt - 1))
+                self._retry_at = time.time() + backoff
+                self.retries += 1
+            else:
+                self._failures = 0
+                self.rows_dropped += len(rows)
+
+        if retry:
+            logger.warning(
+                f"Failed to write {len(rows)} classification results ({str(error)}), "
+                f"retrying in {backoff:.1f}s (attempt {attempt}/{self.max_retries})"
+            )
+            if overflow:
+                logger.error(f"Result buffer full during retries, dropped the {overflow} oldest classification results")
+        else:
+            logger.error(f"Dropped {len(rows)} classification results after a failed write: {str(error)}",
+                         exc_info=True)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='result-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(timeout=self.flush_interval)
+            self._wakeup.clear()
+
+            with self._lock:
+                now = time.time()
+                due = bool(self._buffer) and now >= self._retry_at and (
+                    len(self._buffer) >= self.flush_size
+                    or now - self._oldest_at >= self.flush_interval
+                )
+            if due:
+                try:
+                    self.flush()
+                finally:
+                    # The writer thread has its own DB connection; don't leak it
+                    close_old_connections()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_result_writer() -> ResultWriter:
+    """Return the process-wide result writer, creating it from settings on first use"""
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = ResultWriter(
+                    mode=getattr(settings, 'CLASSIFICATION_RESULT_WRITE_MODE', SYNC),
+                    max_buffer=getattr(settings, 'CLASSIFICATION_RESULT_BUFFER_SIZE', 1000),
+                    flush_size=getattr(settings, 'CLASSIFICATION_RESULT_FLUSH_SIZE', 100),
+                    flush_interval=getattr(settings, 'CLASSIFICATION_RESULT_FLUSH_INTERVAL', 1.0),
+                    max_retries=getattr(settings, 'CLASSIFICATION_RESULT_MAX_RETRIES', 5),
+                )
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def flush_pending_results(**kwargs):
+    """Flush buffered results; usable as a Celery shutdown signal handler"""
+    if _writer is not None:
+        _writer.stop()
@@ -0,0 +1,153 @@
+"""
+Dataset-calibrated max_length for transformer models
+Profiles the token-length distribution of a dataset under a model's tokenizer,
+stores it on the Dataset and picks the smallest max_length that covers a
+percentile of the texts, instead of always padding/truncating to 512 tokens
+"""
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+from transformers import AutoTokenizer
+
+from . import token_cache
+from .execution_profiles import ensure_profile
+
+logger = logging.getLogger(__name__)
+
+# Position embeddings of the supported BERT-family models stop at 512
+MODEL_MAX_LENGTH = 512
+MIN_MAX_LENGTH = 32
+
+# Lengths are rounded up to a multiple of this (friendlier tensor shapes)
+LENGTH_MULTIPLE = 8
+
+PROFILE_PERCENTILES = [50, 75, 90, 95, 98, 99, 100]
+
+
+def coverage_percentile() -> float:
+    return float(getattr(settings, 'MAX_LENGTH_COVERAGE_PERCENTILE', 98))
+
+
+def calibration_enabled() -> bool:
+    return getattr(settings, 'MAX_LENGTH_CALIBRATION', True)
+
+
+def round_length(length: int) -> int:
+    """Round a token count up to LENGTH_MULTIPLE within [MIN_MAX_LENGTH, MODEL_MAX_LENGTH]"""
+    rounded = -(-int(length) // LENGTH_MULTIPLE) * LENGTH_MULTIPLE
+    return int(min(MODEL_MAX_LENGTH, max(MIN_MAX_LENGTH, rounded)))
+
+
+def recommend_max_length(profile: Dict[str, Any], percentile: float) -> int:
+    """Smallest max_length covering ``percentile`` of the profiled texts"""
+    if not profile['samples']:
+        return MODEL_MAX_LENGTH
+    # quantiles[p] is the length of an actual text, so every text up to it fits
+    return round_length(profile['quantiles'][min(100, int(np.ceil(percentile)))])
+
+
+def length_profile(lengths: np.ndarray, tokenizer_name: str, texts_sha256: str) -> Dict[str, Any]:
+    """Summary of a token-length distribution, as stored on ``Dataset.token_length_profiles``"""
+    lengths = np.asarray(lengths)
+    quantiles = (
+        np.percentile(lengths, np.arange(101), method='higher').astype(int).tolist() if len(lengths) else [0] * 101
+    )
+    histogram, edges = np.histogram(lengths, bins=16, range=(0, MODEL_MAX_LENGTH))
+    profile = {
+        'tokenizer': tokenizer_name,
+        'texts_sha256': texts_sha256,
+        'samples': int(len(lengths)),
+        'mean': round(float(lengths.mean()), 1) if len(lengths) else 0.0,
+        'quantiles': quantiles,
+        'percentiles': {str(p): quantiles[p] for p in PROFILE_PERCENTILES},
+        # Texts reaching MODEL_MAX_LENGTH were cut off by the tokenizer
+        'truncated_fraction': round(float(np.mean(lengths >= MODEL_MAX_LENGTH)), 4) if len(lengths) else 0.0,
+        'histogram': {'counts': histogram.tolist(), 'edges': edges.astype(int).tolist()},
+        'profiled_at': time.time(),
+    }
+    profile['recommended'] = {str(p): recommend_max_length(profile, p) for p in (90, 95, 98, 99)}
+    return profile
+
+
+def token_lengths(texts: List[str], tokenizer) -> np.ndarray:
+    """Token length of every text, truncated at MODEL_MAX_LENGTH (served by the token cache)"""
+    cached = token_cache.get_or_tokenize(texts, tokenizer, MODEL_MAX_LENGTH)
+    if cached is not None:
+        return np.asarray(cached.lengths)
+    encodings = tokenizer([str(text) for text in texts], truncation=True, max_length=MODEL_MAX_LENGTH)
+    return np.array([len(ids) for ids in encodings['input_ids']])
+
+
+def profile_dataset(dataset, tokenizer_name: str, texts: Optional[List[str]] = None,
+                    save: bool = True) -> Dict[str, Any]:
+    """Profile ``dataset`` under ``tokenizer_name`` and store the result on the Dataset row
+
+    Args:
+        dataset: The ``Dataset`` to profile
+        tokenizer_name: Hugging Face name of the model's tokenizer
+        texts: The training texts, when the caller already built them
+        save: Persist the profile in ``Dataset.token_length_profiles``
+    """
+    if texts is None:
+        texts = dataset_texts(dataset)
+    texts_sha256 = token_cache.dataset_hash(texts)
+
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(tokenizer_name, use_fast=ensure_profile().use_fast_tokenizer)
+    profile = length_profile(token_lengths(texts, tokenizer), tokenizer_name, texts_sha256)
+    logger.info(
+        f"Token lengths of dataset {dataset.id} under {tokenizer_name}: P50 {profile['percentiles']['50']}, "
+        f"P98 {profile['percentiles']['98']}, max {profile['percentiles']['100']} "
+        f"({profile['samples']} texts, {time.perf_counter() - start:.1f}s)"
+    )
+
+    if save:
+        profiles = dict(dataset.token_length_profiles or {})
+        profiles[tokenizer_name] = profile
+        dataset.token_length_profiles = profiles
+        dataset.save(update_fields=['token_length_profiles', 'updated_at'])
+    return profile
+
+
+def dataset_texts(dataset) -> List[str]:
+    """Title + abstract of every labelled sample, the way training builds its texts"""
+    from dataset_management.snapshots import load_snapshot
+
+    return load_snapshot(dataset).texts(labelled_only=True)
+
+
+def stored_profile(dataset, tokenizer_name: str, texts: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+    """The stored profile, or None when missing or computed over different texts"""
+    profile = (dataset.token_length_profiles or {}).get(tokenizer_name)
+    if profile and texts is not None and profile.get('texts_sha256') != token_cache.dataset_hash(texts):
+        return None
+    return profile
+
+
+def calibrated_max_length(dataset, tokenizer_name: str, texts: Optional[List[str]] = None,
+                          requested: Optional[int] = None) -> Tuple[int, str]:
+    """max_length to train a model on ``dataset`` with, and where it came from
+
+    An explicitly requested length always wins; otherwise the smallest length
+    covering MAX_LENGTH_COVERAGE_PERCENTILE of the dataset's texts is used,
+    profiling the dataset first if it has no up-to-date profile.
+
+    Returns:
+        Tuple of (max_length, source) with source 'requested', 'calibrated P<n>' or 'default'
+    """
+    if requested:
+        return int(requested), 'requested'
+    if not calibration_enabled() or dataset is None:
+        return MODEL_MAX_LENGTH, 'default'
+
+    percentile = coverage_percentile()
+    try:
+        profile = stored_profile(dataset, tokenizer_name, texts) or profile_dataset(dataset, tokenizer_name, texts)
+    except Exception as e:
+        logger.warning(f"Could not profile token lengths of dataset {dataset.id}: {str(e)}")
+        return MODEL_MAX_LENGTH, 'default'
+
+    return recommend_max_length(profile, percentile), f"calibrated P{percentile:g}"
@@ -0,0 +1,104 @@
+"""
+Copy-on-write sharing of model weights across forked worker processes
+Loads the hot models once in a parent process (Celery prefork master, gunicorn
+master) and keeps them read-only, so pool processes forked
+afterwards share the weight pages instead of each loading their own copy
+"""
+import gc
+import logging
+import os
+import time
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db import connections
+
+from . import memory_stats
+
+logger = logging.getLogger(__name__)
+
+_preload_state: Dict[str, Any] = {}
+
+
+def sharing_enabled() -> bool:
+    return getattr(settings, 'ML_SHARE_MODEL_WEIGHTS', False)
+
+
+def _torch_modules(ml_model) -> List[Any]:
+    """torch modules held by a classifier (hybrid ensembles hold two classifiers)"""
+    import torch.nn as nn
+
+    modules = []
+    for component in (ml_model, getattr(ml_model, 'transformer_classifier', None)):
+        module = getattr(component, 'model', None)
+        if isinstance(module, nn.Module):
+            modules.append(module)
+    return modules
+
+
+def make_read_only(ml_model):
+    """Put a classifier's torch modules in inference mode so nothing writes to the weights
+
+    Gradients and training-mode buffers (e.g. batch norm statistics) would
+    dirty the shared pages and turn them into private copies in every child.
+    """
+    for module in _torch_modules(ml_model):
+        module.eval()
+        module.requires_grad_(False)
+
+
+def preload_for_fork(trigger: str) -> Dict[str, Any]:
+    """Load the hot models in this (parent) process before it forks its workers
+
+    Only weights are loaded: running inference here would start torch's
+    OpenMP thread pool, which is not safe to fork. Each child runs the
+    synthetic warm-up inference itself, from the Celery
+    ``worker_process_init`` handler or gunicorn's ``post_worker_init`` hook.
+    """
+    from .model_registry import get_model_registry
+    from .warmup import warm_up
+
+    start = time.time()
+    before = memory_stats.memory_breakdown()
+    state = warm_up(trigger=f"{trigger}-parent", pin=True, run_inference=False)
+    loaded = [model_id for model_id, report in state['models'].items() if 'error' not in report]
+
+    registry = get_model_registry()
+    for model_id in loaded:
+        make_read_only(registry.peek(model_id))
+
+    # Children must not inherit the parent's database connections
+    connections.close_all()
+
+    # Move everything allocated so far into the permanent generation, so the
+    # children's garbage collections do not write to (and un-share) those pages
+    gc.collect()
+    gc.freeze()
+
+    _preload_state.update({
+        'trigger': trigger,
+        'parent_pid': os.getpid(),
+        'models': loaded,
+        'failed': {
+            model_id: report['error'] for model_id, report in state['models'].items() if 'error' in report
+        },
+        'seconds': round(time.time() - start, 2),
+        'parent_memory_before': before,
+        'parent_memory_after': memory_stats.memory_breakdown(),
+        'frozen_objects': gc.get_freeze_count(),
+    })
+    logger.info(
+        f"Preloaded {len(loaded)} models for copy-on-write sharing in {_preload_state['seconds']:.2f}s "
+        f"({gc.get_freeze_count()} objects frozen)"
+    )
+    return dict(_preload_state)
+
+
+def status() -> Dict[str, Any]:
+    """Sharing mode, what the parent preloaded and this process's unique vs shared memory"""
+    return {
+        'enabled': sharing_enabled(),
+        'inherited': bool(_preload_state) and _preload_state['parent_pid'] != os.getpid(),
+        'preload': dict(_preload_state),
+        'memory': memory_stats.memory_breakdown(),
+    }
@@ -14,13 +14,31 @@ from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
 from .models import MLModel, TrainingJob, ClassificationResult
-from dataset_management.models import Dataset, DatasetSample
+from dataset_management.models import Dataset
+from dataset_management.snapshots import load_snapshot
 from .ml_models import create_model, MEDICAL_BERT_MODELS
+from .model_registry import get_trained_model, model_version, gemma_options
+from . import prediction_cache, memory_stats
+from .result_writer import get_result_writer
+from .micro_batching import get_micro_batcher, micro_batching_enabled
 from .hyperparameter_optimization import HyperparameterOptimizer
+from .sequence_length import calibrated_max_length
 
 logger = logging.getLogger(__name__)
 
 
+def transformer_type_for(model) -> Optional[str]:
+    """BERT-family model a model trains (its transformer component for hybrids), else None"""
+    parameters = model.parameters or {}
+    if model.model_type == 'bert':
+        return parameters.get('bert_model', 'biobert')
+    if model.model_type in MEDICAL_BERT_MODELS:
+        return model.model_type
+    if model.model_type == 'hybrid':
+        return parameters.get('transformer_type', 'biobert')
+    return None
+
+
 @shared_task(bind=True, time_limit=7200, soft_time_limit=7000)  # 2 hour limit
 def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
     """
@@ -64,35 +82,39 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
         model.training_started_at = timezone.now()
         model.save()
         
-        # Get dataset samples
-        samples = DatasetSample.objects.filter(dataset=model.dataset)
-        total_samples = samples.count()
+        # Get dataset samples from the dataset's columnar snapshot
+        # (written by streaming rows from the database in chunks if it does not exist yet)
+        load_start = time.time()
+        rss_before = memory_stats.current_rss_mb()
+        peak_rss_before = memory_stats.peak_rss_mb()
+        snapshot = load_snapshot(model.dataset)
         
-        if total_samples == 0:
+        if len(snapshot) == 0:
             raise ValueError("No samples found in dataset")
         
-        logger.info(f"Training on {total_samples} samples")
-        
-        # Prepare training data
-        texts = []
-        labels = []
-        
-        for sample in samples:
-            # Combine title and abstract
-            combined_text = f"{sample.title} {sample.abstract}".strip()
-            texts.append(combined_text)
-            labels.append(sample.medical_domains or [])
+        logger.info(f"Training on {len(snapshot)} samples (dataset snapshot v{snapshot.version})")
         
-        # Filter out samples with no labels
-        valid_data = [(text, label) for text, label in zip(texts, labels) if label]
-        if not valid_data:
+        # Title + abstract of the samples with labels
+        texts, labels = snapshot.training_data()
+        if not texts:
             raise ValueError("No samples with valid labels found")
         
-        texts, labels = zip(*valid_data)
-        texts = list(texts)
-        labels = list(labels)
+        data_loading = {
+            'seconds': round(time.time() - load_start, 2),
+            'rss_before_mb': round(rss_before, 1),
+            'rss_after_mb': round(memory_stats.current_rss_mb(), 1),
+            'peak_rss_before_mb': round(peak_rss_before, 1),
+            'peak_rss_after_mb': round(memory_stats.peak_rss_mb(), 1),
+        }
+        logger.info(
+            f"Using {len(texts)} samples with valid labels (loaded in {data_loading['seconds']}s, "
+            f"peak RSS {data_loading['peak_rss_before_mb']} -> {data_loading['peak_rss_after_mb']} MB)"
+        )
         
-        logger.info(f"Using {len(texts)} samples with valid labels")
+        # Record the exact data the model is trained on
+        model.dataset_snapshot_version = snapshot.version
+        model.dataset_snapshot_hash = snapshot.content_hash
+        model.save(update_fields=['dataset_snapshot_version', 'dataset_snapshot_hash'])
         
         # Extract training parameters
         total_epochs = training_config.get('total_epochs', 3)
@@ -172,24 +194,31 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
         # Get model parameters
         model_params = model.parameters or {}
         
-        if model.model_type == 'bert':
-            # Use BioBERT as default for generic 'bert' type
-            bert_model = model_params.get('bert_model', 'biobert')
-            ml_model = create_model(
-                model_type=bert_model,
-                max_length=model_params.get('max_length', 512)
+        # BERT-family models (and the transformer of hybrids) train with a max_length
+        # calibrated on the dataset's token lengths unless one was set explicitly
+        transformer_type = transformer_type_for(model)
+        max_length, max_length_source = None, None
+        if transformer_type:
+            max_length, max_length_source = calibrated_max_length(
+                model.dataset, MEDICAL_BERT_MODELS[transformer_type]['model_name'], texts,
+                requested=model_params.get('max_length')
             )
-        elif model.model_type in ['biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
+            logger.info(f"Using max_length {max_length} ({max_length_source}) for {transformer_type}")
+        
+        if model.model_type in ['bert', 'biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
+            # Generic 'bert' models use their bert_model parameter (BioBERT by default)
             ml_model = create_model(
-                model_type=model.model_type,
-                max_length=model_params.get('max_length', 512)
+                model_type=transformer_type,
+                max_length=max_length,
+                length_bucketing=getattr(settings, 'TRAINING_LENGTH_BUCKETING', True)
             )
         elif model.model_type in ['gemma2-2b']:
             # Filter out BERT-specific parameters for Gemma models
             gemma_params = {
                 'model_type': model.model_type,
                 'num_labels': len(model.dataset.medical_domains) if model.dataset.medical_domains else 10,
-                'max_length': model_params.get('max_length', 512)
+                'max_length': model_params.get('max_length', 512),
+                **gemma_options(model)
             }
             # Add device parameter if specified
             if 'device' in model_params:
@@ -201,16 +230,19 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
             ml_model = create_model(
                 model_type='traditional',
                 algorithm=algorithm,
-                max_features=model_params.get('max_features', 10000)
+                max_features=model_params.get('max_features', 10000),
+                C=model_params.get('C', 1.0),
+                n_jobs=getattr(settings, 'TRADITIONAL_TRAINING_N_JOBS', -1)
             )
         elif model.model_type == 'hybrid':
-            transformer_type = model_params.get('transformer_type', 'biobert')
             traditional_algorithm = model_params.get('traditional_algorithm', 'svm')
             ml_model = create_model(
                 model_type='hybrid',
                 transformer_type=transformer_type,
                 traditional_algorithm=traditional_algorithm
             )
+            ml_model.transformer_classifier.max_length = max_length
+            ml_model.transformer_classifier.length_bucketing = getattr(settings, 'TRAINING_LENGTH_BUCKETING', True)
         else:
             raise ValueError(f"Unsupported model type: {model.model_type}")
         
@@ -237,7 +269,7 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
                 'dataloader_pin_memory': False,  # Disable for M1 stability
                 'fp16': False,  # Disable half precision on M1
                 'report_to': [],  # Disable wandb/tensorboard
-                'save_safetensors': False,  # Use legacy format for M1 compatibility
+                'save_safetensors': True,  # Checkpoints load zero-copy, like the final artifact
                 'no_cuda': True,  # Explicitly disable CUDA attempts
                 'skip_memory_metrics': True,  # Reduce memory overhead
                 'gradient_checkpointing': False,  # Disable for M1 stability
@@ -271,6 +303,9 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
         try:
             ml_model.save_model(model_path)
             
+            # Cached predictions from a previous training run are stale now
+            prediction_cache.invalidate_model(model.id)
+            
             # Update model with correct file path based on model type
             if model.model_type in ['bert', 'biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
                 # BERT models save to directory format
@@ -356,7 +391,19 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
             'model_type': model.model_type,
             'total_samples': len(texts),
             'unique_labels': len(set().union(*labels)) if labels else 0,
+            'data_loading': data_loading,
+            'peak_rss_mb': round(memory_stats.peak_rss_mb(), 1),
         }
+        if model.model_type == 'traditional':
+            model.training_metrics['fit_seconds'] = training_results.get('fit_seconds')
+            model.training_metrics['label_fit_seconds'] = training_results.get('label_fit_seconds')
+        else:
+            # Effective tokens/sec and padding ratio of each transformer training epoch
+            transformer_results = training_results.get('transformer_results', training_results)
+            model.training_metrics['epoch_throughput'] = transformer_results.get('epoch_throughput')
+        if max_length:
+            model.training_metrics['max_length'] = max_length
+            model.training_metrics['max_length_source'] = max_length_source
         
         model.validation_metrics = {
             'validation_split': validation_split,
@@ -460,6 +507,45 @@ def start_model_training(self, model_id: int, training_config: Dict) -> Dict:
         return {"status": "cancelled", "message": error_msg}
 
 
+def _resolve_model_file_path(model) -> Optional[str]:
+    """
+    Return the absolute path of a model's trained artifact
+    
+    Returns None (after logging why) when the artifact is missing or incomplete,
+    in which case callers fall back to keyword-based prediction.
+    """
+    if not model.model_path:
+        logger.warning(f"No model file found for model {model.id}, using fallback prediction")
+        return None
+    
+    # Construct full model path
+    model_file_path = os.path.join(settings.MEDIA_ROOT, str(model.model_path))
+    
+    if not os.path.exists(model_file_path):
+        logger.warning(f"Model file not found at {model_file_path}, using fallback")
+        return None
+    
+    # For BERT models, check if it's a directory with required files
+    if model.model_type in ['bert', 'biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
+        if os.path.isdir(model_file_path):
+            # Check if required files exist in the directory
+            required_files = ['config.json', 'vocab.txt']
+            model_files = ['model.safetensors', 'pytorch_model.bin']  # Either format
+            
+            if not all(os.path.exists(os.path.join(model_file_path, f)) for f in required_files):
+                logger.warning(f"Required BERT model files missing in {model_file_path}, using fallback")
+                return None
+            
+            if not any(os.path.exists(os.path.join(model_file_path, f)) for f in model_files):
+                logger.warning(f"Model weights file missing in {model_file_path}, using fallback") 
+                return None
+        else:
+            logger.warning(f"BERT model path should be a directory, got file at {model_file_path}, using fallback")
+            return None
+    
+    return model_file_path
+
+
 @shared_task
 def predict_domains(model_id: int, title: str, abstract: str, threshold: float = 0.5) -> Dict:
     """
@@ -476,73 +562,44 @@ def predict_domains(model_id: int, title: str, abstract: str, threshold: float =
         # Combine title and abstract
         combined_text = f"{title} {abstract}".strip()
         
-        # Load the trained model
-        if not model.model_path:
-            # Fallback to placeholder prediction if no model file
-            logger.warning(f"No model file found for model {model.id}, using fallback prediction")
+        model_file_path = _resolve_model_file_path(model)
+        if not model_file_path:
             return _fallback_prediction(model, title, abstract, threshold, start_time)
         
         try:
-            # Construct full model path
-            model_file_path = os.path.join(settings.MEDIA_ROOT, str(model.model_path))
-            
-            if not os.path.exists(model_file_path):
-                logger.warning(f"Model file not found at {model_file_path}, using fallback")
-                return _fallback_prediction(model, title, abstract, threshold, start_time)
+            version = model_version(model, model_file_path)
+            cached = prediction_cache.lookup(model.id, version, title, abstract, threshold)
             
-            # For BERT models, check if it's a directory with required files
-            if model.model_type in ['bert', 'biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
-                if os.path.isdir(model_file_path):
-                    # Check if required files exist in the directory
-                    required_files = ['config.json', 'vocab.txt']
-                    model_files = ['model.safetensors', 'pytorch_model.bin']  # Either format
+            if cached is not None:
+                # Same article already classified by this model version
+                predicted_domains, confidence_scores, all_domain_scores = prediction_cache.derive_prediction(
+                    cached, threshold
+                )
+            else:
+                # Get the trained model from the in-process registry (loads it on first use)
+                ml_model = get_trained_model(model, model_file_path, version)
+                
+                # Make prediction (optionally coalesced with concurrent requests)
+                if micro_batching_enabled():
+                    prediction = get_micro_batcher().predict(model.id, ml_model, combined_text, threshold)
+                else:
+                    predictions = ml_model.predict([combined_text], threshold=threshold)
                     
-                    if not all(os.path.exists(os.path.join(model_file_path, f)) for f in required_files):
-                        logger.warning(f"Required BERT model files missing in {model_file_path}, using fallback")
-                        return _fallback_prediction(model, title, abstract, threshold, start_time)
+                    if not predictions:
+                        raise ValueError("No predictions returned from model")
                     
-                    if not any(os.path.exists(os.path.join(model_file_path, f)) for f in model_files):
-                        logger.warning(f"Model weights file missing in {model_file_path}, using fallback") 
-                        return _fallback_prediction(model, title, abstract, threshold, start_time)
-                else:
-                    logger.warning(f"BERT model path should be a directory, got file at {model_file_path}, using fallback")
-                    return _fallback_prediction(model, title, abstract, threshold, start_time)
-            
-            # Load and create the appropriate ML model
-            if model.model_type == 'bert':
-                bert_model = model.parameters.get('bert_model', 'biobert')
-                ml_model = create_model(model_type=bert_model)
-            elif model.model_type in ['biobert', 'clinicalbert', 'scibert', 'pubmedbert']:
-                ml_model = create_model(model_type=model.model_type)
-            elif model.model_type in ['gemma2-2b']:
-                ml_model = create_model(model_type=model.model_type)
-            elif model.model_type == 'traditional':
-                algorithm = model.parameters.get('algorithm', 'svm')
-                ml_model = create_model(model_type='traditional', algorithm=algorithm)
-            elif model.model_type == 'hybrid':
-                transformer_type = model.parameters.get('transformer_type', 'biobert')
-                traditional_algorithm = model.parameters.get('traditional_algorithm', 'svm')
-                ml_model = create_model(
-                    model_type='hybrid',
-                    transformer_type=transformer_type,
-                    traditional_algorithm=traditional_algorithm
+                    prediction = predictions[0]
+                predicted_domains = prediction['predicted_domains']
+                confidence_scores = prediction['confidence_scores']
+                all_domain_scores = prediction['all_scores']
+                
+                prediction_cache.store(
+                    model.id, version, title, abstract,
+                    prediction_cache.make_entry(
+                        all_domain_scores, ml_model.report_all_confidences,
+                        predicted_domains, threshold
+                    )
                 )
-            else:
-                raise ValueError(f"Unsupported model type: {model.model_type}")
-            
-            # Load the trained model
-            ml_model.load_model(model_file_path)
-            
-            # Make prediction
-            predictions = ml_model.predict([combined_text], threshold=threshold)
-            
-            if not predictions:
-                raise ValueError("No predictions returned from model")
-            
-            prediction = predictions[0]
-            predicted_domains = prediction['predicted_domains']
-            confidence_scores = prediction['confidence_scores']
-            all_domain_scores = prediction['all_scores']
             
         except Exception as e:
             logger.warning(f"Failed to load/use trained model: {str(e)}, using fallback")
@@ -551,8 +608,8 @@ def predict_domains(model_id: int, title: str, abstract: str, threshold: float =
         # Calculate inference time
         inference_time_ms = (time.time() - start_time) * 1000
         
-        # Save result to database
-        result = ClassificationResult.objects.create(
+        # Save result to database (in the buffered write modes result.id is None until flushed)
+        result = get_result_writer().save(ClassificationResult(
             model=model,
             title=title,
             abstract=abstract,
@@ -561,7 +618,7 @@ def predict_domains(model_id: int, title: str, abstract: str, threshold: float =
             all_domain_scores=all_domain_scores,
             prediction_threshold=threshold,
             inference_time_ms=inference_time_ms
-        )
+        ))
         
         prediction_result = {
             "result_id": result.id,
@@ -589,82 +646,96 @@ def predict_domains(model_id: int, title: str, abstract: str, threshold: float =
         return {"status": "error", "message": error_msg}
 
 
+def _fallback_scores(model, title: str, abstract: str, threshold: float) -> Tuple[List[str], Dict, Dict]:
+    """
+    Score an article with simple keyword matching based on training data domains
+    
+    Returns:
+        Tuple of (predicted_domains, confidence_scores, all_domain_scores)
+    """
+    # Try to get domains from dataset, otherwise use default medical domains
+    dataset_domains = model.dataset.medical_domains or []
+    
+    # Define some basic medical domain keywords and default domains
+    domain_keywords = {
+        'cardiology': ['heart', 'cardiac', 'cardiovascular', 'coronary', 'artery', 'hypertension'],
+        'neurology': ['brain', 'neural', 'neurological', 'cognitive', 'memory'],
+        'oncology': ['cancer', 'tumor', 'malignant', 'chemotherapy', 'radiation'],
+        'respiratory': ['lung', 'respiratory', 'pulmonary', 'asthma', 'breathing'],
+        'endocrinology': ['diabetes', 'hormone', 'endocrine', 'thyroid', 'insulin', 'diabetic'],
+        'gastroenterology': ['stomach', 'intestine', 'liver', 'digestive', 'gastric'],
+        'infectious_disease': ['infection', 'virus', 'bacteria', 'antibiotic', 'pathogen'],
+        'radiology': ['imaging', 'scan', 'x-ray', 'mri', 'ct'],
+        'emergency_medicine': ['emergency', 'trauma', 'acute', 'critical', 'urgent'],
+        'surgery': ['surgical', 'operation', 'procedure', 'incision', 'operative']
+    }
+    
+    # Use dataset domains if available, otherwise use all available domain keywords
+    available_domains = dataset_domains if dataset_domains else list(domain_keywords.keys())
+    
+    # Simple keyword-based prediction as fallback
+    combined_text = f"{title} {abstract}".lower()
+    domain_scores = {}
+    
+    # Score each available domain
+    for domain in available_domains:
+        score = 0.1  # Higher base score for better responsiveness
+        
+        # Check if domain name appears in text
+        if domain.lower() in combined_text:
+            score += 0.5
+        
+        # Check for domain-specific keywords (more generous scoring)
+        domain_key = domain.lower().replace(' ', '_').replace('-', '_')
+        if domain_key in domain_keywords:
+            keywords = domain_keywords[domain_key]
+            keyword_matches = sum(1 for keyword in keywords if keyword in combined_text)
+            if keyword_matches > 0:
+                score += min(0.7, keyword_matches * 0.3)  # More generous keyword scoring
+        
+        # Add small randomness for variety
+        import random
+        score += random.uniform(-0.03, 0.03)
+        score = max(0.0, min(1.0, score))
+        
+        domain_scores[domain] = score
+    
+    # Apply threshold to get predictions
+    predicted_domains = [domain for domain, score in domain_scores.items() if score >= threshold]
+    confidence_scores = {domain: score for domain, score in domain_scores.items() if score >= threshold}
+    
+    # If no domains meet threshold, return the highest scoring domain if it's reasonable (>0.2)
+    if not predicted_domains and domain_scores:
+        best_domain = max(domain_scores, key=domain_scores.get)
+        best_score = domain_scores[best_domain]
+        if best_score > 0.2:  # Only if it has some relevance
+            predicted_domains = [best_domain]
+            confidence_scores = {best_domain: best_score}
+    
+    # Log prediction details for debugging
+    logger.info(f"Fallback algorithm predicted: {predicted_domains} with scores: {confidence_scores}")
+    logger.info(f"All domain scores: {domain_scores}")
+    logger.info(f"Available domains: {available_domains}")
+    logger.info(f"Text analyzed: {combined_text[:100]}...")
+    
+    return predicted_domains, confidence_scores, domain_scores
+
+
 def _fallback_prediction(model, title: str, abstract: str, threshold: float, start_time: float) -> Dict:
     """
     Fallback prediction method when trained model cannot be loaded
     Uses simple keyword matching based on training data domains
     """
     try:
-        # Try to get domains from dataset, otherwise use default medical domains
-        dataset_domains = model.dataset.medical_domains or []
-        
-        # Define some basic medical domain keywords and default domains
-        domain_keywords = {
-            'cardiology': ['heart', 'cardiac', 'cardiovascular', 'coronary', 'artery', 'hypertension'],
-            'neurology': ['brain', 'neural', 'neurological', 'cognitive', 'memory'],
-            'oncology': ['cancer', 'tumor', 'malignant', 'chemotherapy', 'radiation'],
-            'respiratory': ['lung', 'respiratory', 'pulmonary', 'asthma', 'breathing'],
-            'endocrinology': ['diabetes', 'hormone', 'endocrine', 'thyroid', 'insulin', 'diabetic'],
-            'gastroenterology': ['stomach', 'intestine', 'liver', 'digestive', 'gastric'],
-            'infectious_disease': ['infection', 'virus', 'bacteria', 'antibiotic', 'pathogen'],
-            'radiology': ['imaging', 'scan', 'x-ray', 'mri', 'ct'],
-            'emergency_medicine': ['emergency', 'trauma', 'acute', 'critical', 'urgent'],
-            'surgery': ['surgical', 'operation', 'procedure', 'incision', 'operative']
-        }
-        
-        # Use dataset domains if available, otherwise use all available domain keywords
-        available_domains = dataset_domains if dataset_domains else list(domain_keywords.keys())
-        
-        # Simple keyword-based prediction as fallback
-        combined_text = f"{title} {abstract}".lower()
-        domain_scores = {}
-        
-        # Score each available domain
-        for domain in available_domains:
-            score = 0.1  # Higher base score for better responsiveness
-            
-            # Check if domain name appears in text
-            if domain.lower() in combined_text:
-                score += 0.5
-            
-            # Check for domain-specific keywords (more generous scoring)
-            domain_key = domain.lower().replace(' ', '_').replace('-', '_')
-            if domain_key in domain_keywords:
-                keywords = domain_keywords[domain_key]
-                keyword_matches = sum(1 for keyword in keywords if keyword in combined_text)
-                if keyword_matches > 0:
-                    score += min(0.7, keyword_matches * 0.3)  # More generous keyword scoring
-            
-            # Add small randomness for variety
-            import random
-            score += random.uniform(-0.03, 0.03)
-            score = max(0.0, min(1.0, score))
-            
-            domain_scores[domain] = score
-        
-        # Apply threshold to get predictions
-        predicted_domains = [domain for domain, score in domain_scores.items() if score >= threshold]
-        confidence_scores = {domain: score for domain, score in domain_scores.items() if score >= threshold}
-        
-        # If no domains meet threshold, return the highest scoring domain if it's reasonable (>0.2)
-        if not predicted_domains and domain_scores:
-            best_domain = max(domain_scores, key=domain_scores.get)
-            best_score = domain_scores[best_domain]
-            if best_score > 0.2:  # Only if it has some relevance
-                predicted_domains = [best_domain]
-                confidence_scores = {best_domain: best_score}
-        
-        # Log prediction details for debugging
-        logger.info(f"Fallback algorithm predicted: {predicted_domains} with scores: {confidence_scores}")
-        logger.info(f"All domain scores: {domain_scores}")
-        logger.info(f"Available domains: {available_domains}")
-        logger.info(f"Text analyzed: {combined_text[:100]}...")
+        predicted_domains, confidence_scores, domain_scores = _fallback_scores(
+            model, title, abstract, threshold
+        )
         
         # Calculate inference time
         inference_time_ms = (time.time() - start_time) * 1000
         
-        # Save result to database
-        result = ClassificationResult.objects.create(
+        # Save result to database (in the buffered write modes result.id is None until flushed)
+        result = get_result_writer().save(ClassificationResult(
             model=model,
             title=title,
             abstract=abstract,
@@ -673,7 +744,7 @@ def _fallback_prediction(model, title: str, abstract: str, threshold: float, sta
             all_domain_scores=domain_scores,
             prediction_threshold=threshold,
             inference_time_ms=inference_time_ms
-        )
+        ))
         
         prediction_result = {
             "result_id": result.id,
@@ -697,12 +768,138 @@ def _fallback_prediction(model, title: str, abstract: str, threshold: float, sta
         return {"status": "error", "message": error_msg}
 
 
+def predict_domains_batch(model, articles: List[Dict], threshold: float = 0.5,
+                          chunk_size: Optional[int] = None) -> List[Dict]:
+    """
+    Predict medical domains for many articles with a single model load
+    
+    Articles already in the prediction cache are served from it; the rest are
+    run through ``ml_model.predict_batch`` in chunks of ``chunk_size`` and all results
+    are handed to the result writer as one ``bulk_create``. Each article's inference time is its
+    share of the chunk it was processed in.
+    
+    Args:
+        model: Trained MLModel instance
+        articles: Dicts with 'title' and 'abstract' keys
+        threshold: Prediction threshold
+        chunk_size: Number of texts per predict call (defaults to settings.PREDICTION_BATCH_SIZE)
+    
+    Returns:
+        One result dict per article, in input order, shaped like predict_domains output
+    """
+    chunk_size = chunk_size or getattr(settings, 'PREDICTION_BATCH_SIZE', 64)
+    
+    model_file_path = _resolve_model_file_path(model)
+    version = model_version(model, model_file_path) if model_file_path else None
+    ml_model = None
+    load_failed = model_file_path is None
+    
+    scored = []  # (predicted_domains, confidence_scores, all_scores, inference_time_ms, fallback)
+    
+    for chunk_start in range(0, len(articles), chunk_size):
+        chunk = articles[chunk_start:chunk_start + chunk_size]
+        chunk_start_time = time.time()
+        
+        cached = prediction_cache.get_many(model.id, version, chunk, threshold) if version else [None] * len(chunk)
+        chunk_scores = [
+            prediction_cache.derive_prediction(entry, threshold) + (False,) if entry is not None else None
+            for entry in cached
+        ]
+        misses = [i for i, entry in enumerate(cached) if entry is None]
+        
+        if misses and ml_model is None and not load_failed:
+            # Load lazily so fully cached batches never touch the model
+            try:
+                ml_model = get_trained_model(model, model_file_path, version)
+            except Exception as e:
+                logger.warning(f"Failed to load trained model: {str(e)}, using fallback")
+                load_failed = True
+        
+        predictions = None
+        if misses and ml_model is not None:
+            try:
+                texts = [f"{chunk[i]['title']} {chunk[i]['abstract']}".strip() for i in misses]
+                batch = ml_model.predict_batch(texts, threshold=threshold)
+                if len(batch) != len(misses):
+                    raise ValueError(f"Expected {len(misses)} predictions, got {len(batch)}")
+                # Per-article dicts are only needed for persistence and the response
+                predictions = batch.to_dicts(include_components=False)
+            except Exception as e:
+                logger.warning(f"Batch inference failed: {str(e)}, using fallback for chunk")
+                predictions = None
+        
+        if predictions is not None:
+            for i, prediction in zip(misses, predictions):
+                chunk_scores[i] = (
+                    prediction['predicted_domains'], prediction['confidence_scores'],
+                    prediction['all_scores'], False
+                )
+            prediction_cache.set_many(
+                model.id, version, [chunk[i] for i in misses],
+                [
+                    prediction_cache.make_entry(
+                        prediction['all_scores'], batch.report_all_confidences,
+                        prediction['predicted_domains'], threshold
+                    )
+                    for prediction in predictions
+                ]
+            )
+        else:
+            for i in misses:
+                chunk_scores[i] = _fallback_scores(
+                    model, chunk[i]['title'], chunk[i]['abstract'], threshold
+                ) + (True,)
+        
+        # Amortize the chunk time over its articles
+        per_article_ms = (time.time() - chunk_start_time) * 1000 / max(len(chunk), 1)
+        for predicted_domains, confidence_scores, all_scores, fallback in chunk_scores:
+            scored.append((predicted_domains, confidence_scores, all_scores, per_article_ms, fallback))
+    
+    # Persist all results in one bulk insert (write-behind unless in sync mode)
+    result_rows = get_result_writer().save_many([
+        ClassificationResult(
+            model=model,
+            title=article['title'],
+            abstract=article['abstract'],
+            predicted_domains=predicted_domains,
+            confidence_scores=confidence_scores,
+            all_domain_scores=all_scores,
+            prediction_threshold=threshold,
+            inference_time_ms=inference_time_ms
+        )
+        for article, (predicted_domains, confidence_scores, all_scores, inference_time_ms, _) in zip(articles, scored)
+    ])
+    
+    results = []
+    for article, row, (predicted_domains, confidence_scores, all_scores, inference_time_ms, fallback) in zip(
+        articles, result_rows, scored
+    ):
+        prediction_result = {
+            "result_id": row.id,
+            "title": article['title'],
+            "predicted_domains": predicted_domains,
+            "confidence_scores": confidence_scores,
+            "all_domain_scores": all_scores,
+            "inference_time_ms": inference_time_ms,
+            "model_used": f"{model.name} (fallback)" if fallback else model.name,
+            "model_type": model.model_type,
+            "status": "success"
+        }
+        if fallback:
+            prediction_result["fallback"] = True
+        results.append(prediction_result)
+    
+    logger.info(f"Batch prediction of {len(articles)} articles completed in chunks of {chunk_size}")
+    return results
+
+
 @shared_task
 def batch_predict_domains(model_id: int, articles: List[Dict], threshold: float = 0.5) -> Dict:
     """
     Predict medical domains for multiple articles in batch
     
-    More efficient than individual predictions for processing multiple articles.
+    Loads the model once, runs batched inference and saves all results with a
+    single bulk insert.
     """
     start_time = time.time()
     
@@ -710,13 +907,7 @@ def batch_predict_domains(model_id: int, articles: List[Dict], threshold: float
         model = MLModel.objects.get(id=model_id, is_trained=True)
         logger.info(f"Batch prediction with model: {model.name} for {len(articles)} articles")
         
-        results = []
-        
-        for article in articles:
-            # Use the single prediction function for each article
-            prediction = predict_domains(model_id, article['title'], article['abstract'], threshold)
-            if prediction.get('status') == 'success':
-                results.append(prediction)
+        results = predict_domains_batch(model, articles, threshold)
         
         processing_time = time.time() - start_time
         
@@ -759,12 +950,14 @@ def run_model_comparison(comparison_id: int) -> Dict:
             # Use validation split from first model's dataset
             test_dataset = models.first().dataset
         
-        test_samples = DatasetSample.objects.filter(dataset=test_dataset)[:100]  # Limit for demo
+        snapshot = load_snapshot(test_dataset)
+        test_samples = snapshot.head(100)  # Limit for demo
         
         comparison_results = {
             "models": {},
             "summary": {},
-            "test_samples_count": len(test_samples)
+            "test_samples_count": len(test_samples),
+            "test_dataset_snapshot": {"version": snapshot.version, "content_hash": snapshot.content_hash}
         }
         
         for model in models:
@@ -777,14 +970,15 @@ def run_model_comparison(comparison_id: int) -> Dict:
             }
             
             # Run predictions on test samples (simplified)
-            for sample in test_samples[:10]:  # Limit for demo
-                prediction = predict_domains(model.id, sample.title, sample.abstract)
-                if prediction.get('status') == 'success':
-                    model_results["predictions"].append({
-                        "sample_id": sample.id,
-                        "predicted_domains": prediction["predicted_domains"],
-                        "confidence_scores": prediction["confidence_scores"]
-                    })
+            samples_to_predict = test_samples[:10]  # Limit for demo
+            articles = [{'title': sample['title'], 'abstract': sample['abstract']} for sample in samples_to_predict]
+            predictions = predict_domains_batch(model, articles) if model.is_trained else []
+            for sample, prediction in zip(samples_to_predict, predictions):
+                model_results["predictions"].append({
+                    "sample_id": sample['sample_id'],
+                    "predicted_domains": prediction["predicted_domains"],
+                    "confidence_scores": prediction["confidence_scores"]
+                })
             
             comparison_results["models"][model.name] = model_results
         
@@ -824,31 +1018,16 @@ def optimize_hyperparameters(self, model_id: int, optimization_config: Dict) ->
         model.status = 'training'  # Use training status for optimization
         model.save()
         
-        # Get dataset samples
-        samples = DatasetSample.objects.filter(dataset=model.dataset)
-        total_samples = samples.count()
+        # Get dataset samples from the dataset's columnar snapshot
+        snapshot = load_snapshot(model.dataset)
         
-        if total_samples == 0:
+        if len(snapshot) == 0:
             raise ValueError("No samples found in dataset")
         
-        # Prepare training data
-        texts = []
-        labels = []
-        
-        for sample in samples:
-            combined_text = f"{sample.title} {sample.abstract}".strip()
-            texts.append(combined_text)
-            labels.append(sample.medical_domains or [])
-        
-        # Filter out samples with no labels
-        valid_data = [(text, label) for text, label in zip(texts, labels) if label]
-        if not valid_data:
+        texts, labels = snapshot.training_data()
+        if not texts:
             raise ValueError("No samples with valid labels found")
         
-        texts, labels = zip(*valid_data)
-        texts = list(texts)
-        labels = list(labels)
-        
         logger.info(f"Optimizing hyperparameters on {len(texts)} samples")
         
         # Extract optimization parameters
@@ -856,8 +1035,19 @@ def optimize_hyperparameters(self, model_id: int, optimization_config: Dict) ->
         timeout = optimization_config.get('timeout', 3600)  # 1 hour default
         optimization_metric = optimization_config.get('metric', 'f1_macro')
         
+        # Trials train on the dataset-calibrated max_length of each candidate transformer
+        calibrated_max_lengths = {}
+        if model.model_type in MEDICAL_BERT_MODELS or model.model_type in ['bert', 'hybrid']:
+            for transformer_type in ['biobert', 'clinicalbert', 'scibert']:
+                max_length, source = calibrated_max_length(
+                    model.dataset, MEDICAL_BERT_MODELS[transformer_type]['model_name'], texts
+                )
+                if source != 'default':
+                    calibrated_max_lengths[transformer_type] = max_length
+            logger.info(f"Calibrated max_length per transformer: {calibrated_max_lengths}")
+        
         # Create optimizer
-        optimizer = HyperparameterOptimizer(model.model_type, optimization_metric)
+        optimizer = HyperparameterOptimizer(model.model_type, optimization_metric, calibrated_max_lengths)
         
         # Run optimization
         optimization_results = optimizer.optimize(
@@ -878,7 +1068,9 @@ def optimize_hyperparameters(self, model_id: int, optimization_config: Dict) ->
         updated_params['optimization_results'] = {
             'best_value': best_value,
             'n_trials': optimization_results['n_trials'],
-            'metric': optimization_metric
+            'metric': optimization_metric,
+            'dataset_snapshot_version': snapshot.version,
+            'dataset_snapshot_hash': snapshot.content_hash
         }
         
         model.parameters = updated_params
@@ -1,3 +1,986 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import torch
+from django.core.cache import caches
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase, override_settings
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.multioutput import MultiOutputClassifier
+from sklearn.svm import SVC, LinearSVC
+
+from dataset_management.models import Dataset
+
+from . import compact_artifacts, prediction_cache, token_cache
+from .micro_batching import MicroBatcher
+from .compact_artifacts import CompactTfidfVectorizer
+from .ml_models import (
+    FusedLinearHead, GemmaClassifier, LinearOneVsRestEngine, PredictionBatch, TraditionalMLClassifier
+)
+from .model_registry import ModelRegistry, model_version
+from .models import ClassificationResult, MLModel
+from .result_writer import ASYNC, BEST_EFFORT, SYNC, ResultWriter
+
+try:
+    from transformers import Gemma2Config, Gemma2ForCausalLM
+except ImportError:
+    Gemma2Config = Gemma2ForCausalLM = None
+
+try:
+    from tokenizers import Tokenizer, models as tokenizer_models, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+except ImportError:
+    PreTrainedTokenizerFast = None
+
+
+class CharTokenizer:
+    """Character-level stand-in for the Gemma tokenizer, enough to drive a tiny random model"""
+    pad_token_id = 0
+    eos_token_id = 1
+    bos_token_id = 2
+    vocab_size = 128
+
+    def __call__(self, text, add_special_tokens=True, truncation=False, max_length=None):
+        ids = [3 + ord(char) % (self.vocab_size - 3) for char in text]
+        if truncation and max_length is not None:
+            ids = ids[:max_length]
+        if add_special_tokens:
+            ids = [self.bos_token_id] + ids
+        return {'input_ids': ids}
+
+
+@unittest.skipIf(Gemma2ForCausalLM is None, "transformers without Gemma 2 support")
+class GemmaLikelihoodScoringTests(SimpleTestCase):
+    """Likelihood scoring against a real (tiny, randomly initialized) Gemma 2 model and its cache"""
+
+    LABELS = ['Cardiology', 'Neurology', 'Oncology', 'Pediatrics', 'Psychiatry']
+    TEXTS = [
+        'Atrial fibrillation outcomes after catheter ablation.',
+        'Glioma resection in children.',
+        'Depression',
+    ]
+
+    def make_classifier(self, likelihood_max_rows=4):
+        torch.manual_seed(0)
+        config = Gemma2Config(
+            vocab_size=CharTokenizer.vocab_size, hidden_size=32, intermediate_size=64,
+            num_hidden_layers=2, num_attention_heads=2, num_key_value_heads=1, head_dim=16,
+            max_position_embeddings=1024, pad_token_id=0, eos_token_id=1, bos_token_id=2,
+            attn_implementation='eager'
+        )
+        classifier = GemmaClassifier(device='cpu', scoring='likelihood', likelihood_max_rows=likelihood_max_rows)
+        classifier.tokenizer = CharTokenizer()
+        classifier.model = Gemma2ForCausalLM(config).eval()
+        classifier.all_labels = list(self.LABELS)
+        classifier.num_labels = len(self.LABELS)
+        return classifier
+
+    def test_scores_are_independent_probabilities(self):
+        batch = self.make_classifier().predict_batch(self.TEXTS)
+
+        self.assertEqual(batch.scores.shape, (len(self.TEXTS), len(self.LABELS)))
+        self.assertTrue(np.all((batch.scores >= 0) & (batch.scores <= 1)))
+
+    def test_reuses_the_prompt_cache(self):
+        classifier = self.make_classifier()
+        classifier.predict_batch(self.TEXTS)
+
+        self.assertTrue(classifier.label_cache_reuse)
+
+    def test_cached_scores_match_full_prompt_scores(self):
+        cached = self.make_classifier()
+        full = self.make_classifier()
+        full.label_cache_reuse = False
+
+        np.testing.assert_allclose(
+            cached.predict_batch(self.TEXTS).scores, full.predict_batch(self.TEXTS).scores, atol=1e-4
+        )
+
+    def test_forward_passes_are_capped_at_max_rows(self):
+        classifier = self.make_classifier(likelihood_max_rows=3)
+        batch_sizes = []
+        classifier.model.register_forward_pre_hook(
+            lambda module, args, kwargs: batch_sizes.append(kwargs['input_ids'].shape[0]), with_kwargs=True
+        )
+        scores = classifier.predict_batch(self.TEXTS).scores
+
+        # One prompt pass per text batch, then the (text, label) questions in passes of at most 3 rows
+        self.assertEqual(batch_sizes[0], len(self.TEXTS))
+        self.assertTrue(all(size <= 3 for size in batch_sizes[1:]))
+        unbounded = self.make_classifier(likelihood_max_rows=100).predict_batch(self.TEXTS).scores
+        np.testing.assert_allclose(scores, unbounded, atol=1e-4)
+
+
+class ModelRegistryTests(SimpleTestCase):
+    """LRU/TTL eviction, single-flight loading and pinning of the model registry"""
+
+    def load(self, registry, key, version=('v1',), size_bytes=0):
+        return registry.get(key, version, lambda: f'model-{key}', size_bytes=size_bytes)
+
+    def test_hit_after_first_load(self):
+        registry = ModelRegistry(max_entries=2)
+        loader = mock.Mock(return_value='model')
+
+        self.assertEqual(registry.get(1, ('v1',), loader), 'model')
+        self.assertEqual(registry.get(1, ('v1',), loader), 'model')
+        self.assertEqual(loader.call_count, 1)
+        self.assertEqual((registry.hits, registry.misses), (1, 1))
+
+    def test_new_version_reloads(self):
+        registry = ModelRegistry(max_entries=2)
+        self.load(registry, 1, version=('v1',))
+
+        loader = mock.Mock(return_value='retrained')
+        self.assertEqual(registry.get(1, ('v2',), loader), 'retrained')
+        loader.assert_called_once_with()
+
+    def test_evicts_least_recently_used_over_max_entries(self):
+        registry = ModelRegistry(max_entries=2)
+        self.load(registry, 1)
+        self.load(registry, 2)
+        self.load(registry, 1)  # 2 is now the least recently used
+        self.load(registry, 3)
+
+        self.assertTrue(registry.is_loaded(1))
+        self.assertFalse(registry.is_loaded(2))
+        self.assertTrue(registry.is_loaded(3))
+
+    def test_evicts_over_memory_budget(self):
+        registry = ModelRegistry(max_memory_mb=1, max_entries=4)
+        self.load(registry, 1, size_bytes=600 * 1024)
+        self.load(registry, 2, size_bytes=600 * 1024)
+
+        self.assertFalse(registry.is_loaded(1))
+        self.assertTrue(registry.is_loaded(2))
+
+    def test_keeps_newest_model_even_if_over_budget(self):
+        registry = ModelRegistry(max_memory_mb=1, max_entries=4)
+        self.load(registry, 1, size_bytes=2 * 1024 * 1024)
+
+        self.assertTrue(registry.is_loaded(1))
+
+    def test_expires_idle_models_after_ttl(self):
+        registry = ModelRegistry(max_entries=4, ttl=60)
+        with mock.patch('classification.model_registry.time.time', return_value=1000.0):
+            self.load(registry, 1)
+        with mock.patch('classification.model_registry.time.time', return_value=1059.0):
+            self.load(registry, 2)
+        with mock.patch('classification.model_registry.time.time', return_value=1061.0):
+            self.load(registry, 2)
+
+        self.assertFalse(registry.is_loaded(1))
+        self.assertTrue(registry.is_loaded(2))
+
+    def test_concurrent_requests_share_a_single_load(self):
+        registry = ModelRegistry(max_entries=2)
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return object()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(registry.get(1, ('v1',), loader)))
+            for _ in range(4)
+        ]
+        threads[0].start()
+        self.assertTrue(started.wait(5))
+        for thread in threads[1:]:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_failed_load_is_raised_and_not_cached(self):
+        registry = ModelRegistry(max_entries=2)
+
+        with self.assertRaises(RuntimeError):
+            registry.get(1, ('v1',), mock.Mock(side_effect=RuntimeError('corrupt artifact')))
+        self.assertFalse(registry.is_loaded(1))
+        self.assertEqual(self.load(registry, 1), 'model-1')
+
+    def test_pinned_models_survive_ttl_and_lru(self):
+        registry = ModelRegistry(max_entries=2, ttl=60)
+        with mock.patch('classification.model_registry.time.time', return_value=1000.0):
+            self.load(registry, 1)
+            self.assertTrue(registry.pin(1))
+        with mock.patch('classification.model_registry.time.time', return_value=2000.0):
+            self.load(registry, 2)
+            self.load(registry, 3)
+
+        self.assertTrue(registry.is_loaded(1))
+        self.assertFalse(registry.is_loaded(2))
+        self.assertTrue(registry.is_loaded(3))
+
+    def test_pins_leave_one_entry_for_on_demand_loads(self):
+        registry = ModelRegistry(max_entries=3)
+
+        self.assertTrue(registry.pin(1))
+        self.assertTrue(registry.pin(2))
+        self.assertFalse(registry.pin(3))
+        self.assertEqual(registry.stats()['pinned'], [1, 2])
+
+    def test_pins_must_fit_the_memory_budget(self):
+        registry = ModelRegistry(max_memory_mb=1, max_entries=4)
+        self.load(registry, 1, size_bytes=700 * 1024)
+        self.assertTrue(registry.pin(1))
+        self.load(registry, 2, size_bytes=400 * 1024)
+
+        self.assertFalse(registry.pin(2))
+        self.assertEqual(registry.stats()['pinned'], [1])
+
+
+class ModelVersionTests(SimpleTestCase):
+    """The served version covers both the artifact and the serving options"""
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.pkl')
+        os.write(handle, b'weights')
+        os.close(handle)
+        self.addCleanup(os.remove, self.path)
+
+    def test_stable_for_unchanged_model(self):
+        model = MLModel(id=1, model_type='traditional', parameters={'algorithm': 'svm'})
+
+        self.assertEqual(model_version(model, self.path), model_version(model, self.path))
+
+    def test_changes_with_serving_parameters(self):
+        svm = MLModel(id=1, model_type='traditional', parameters={'algorithm': 'svm'})
+        logistic = MLModel(id=1, model_type='traditional', parameters={'algorithm': 'logistic'})
+
+        self.assertNotEqual(model_version(svm, self.path), model_version(logistic, self.path))
+
+    def test_changes_with_serving_settings(self):
+        model = MLModel(id=1, model_type='gemma2-2b', parameters={})
+        with override_settings(GEMMA_SCORING_MODE='generate'):
+            generate = model_version(model, self.path)
+        with override_settings(GEMMA_SCORING_MODE='likelihood'):
+            likelihood = model_version(model, self.path)
+
+        self.assertNotEqual(generate, likelihood)
+
+
+class RecordingModel:
+    """Stand-in classifier that records every batched ``predict`` call"""
+
+    def __init__(self, release: threading.Event = None, error: Exception = None):
+        self.calls = []
+        self.release = release
+        self.error = error
+
+    def predict(self, texts, threshold=0.5):
+        self.calls.append(list(texts))
+        if self.release is not None:
+            self.release.wait(5)
+        if self.error is not None:
+            raise self.error
+        return [{'text': text, 'threshold': threshold} for text in texts]
+
+
+class MicroBatcherTests(SimpleTestCase):
+    """Coalescing of concurrent single-article predictions"""
+
+    def predict_concurrently(self, batcher, ml_model, texts, threshold=0.5):
+        results, errors = {}, {}
+
+        def run(text):
+            try:
+                results[text] = batcher.predict(1, ml_model, text, threshold=threshold)
+            except Exception as e:
+                errors[text] = e
+
+        threads = [threading.Thread(target=run, args=(text,)) for text in texts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        return results, errors
+
+    def test_concurrent_requests_share_one_predict_call(self):
+        batcher = MicroBatcher(max_batch_size=4, window_ms=2000)
+        ml_model = RecordingModel()
+        texts = ['a', 'b', 'c', 'd']
+
+        results, errors = self.predict_concurrently(batcher, ml_model, texts)
+
+        self.assertEqual(errors, {})
+        self.assertEqual(len(ml_model.calls), 1)
+        self.assertCountEqual(ml_model.calls[0], texts)
+        for text in texts:
+            self.assertEqual(results[text]['text'], text)
+        self.assertEqual(batcher.stats()['queues']['model_1@0.5']['batch_size_histogram'], {4: 1})
+
+    def test_batches_are_capped_at_max_batch_size(self):
+        batcher = MicroBatcher(max_batch_size=2, window_ms=2000)
+        ml_model = RecordingModel()
+
+        results, errors = self.predict_concurrently(batcher, ml_model, ['a', 'b', 'c', 'd'])
+
+        self.assertEqual(len(results), 4)
+        self.assertEqual(sorted(len(call) for call in ml_model.calls), [2, 2])
+
+    def test_lone_request_is_served_after_the_window(self):
+        batcher = MicroBatcher(max_batch_size=16, window_ms=20)
+        ml_model = RecordingModel()
+
+        self.assertEqual(batcher.predict(1, ml_model, 'a')['text'], 'a')
+        self.assertEqual(ml_model.calls, [['a']])
+
+    def test_thresholds_are_batched_separately(self):
+        batcher = MicroBatcher(max_batch_size=16, window_ms=20)
+        ml_model = RecordingModel()
+
+        self.assertEqual(batcher.predict(1, ml_model, 'a', threshold=0.3)['threshold'], 0.3)
+        self.assertEqual(batcher.predict(1, ml_model, 'b', threshold=0.7)['threshold'], 0.7)
+        self.assertEqual(batcher.stats()['active_queues'], 2)
+
+    def test_predict_errors_reach_every_caller(self):
+        batcher = MicroBatcher(max_batch_size=2, window_ms=2000)
+        ml_model = RecordingModel(error=RuntimeError('out of memory'))
+
+        results, errors = self.predict_concurrently(batcher, ml_model, ['a', 'b'])
+
+        self.assertEqual(results, {})
+        self.assertEqual(set(errors), {'a', 'b'})
+        self.assertTrue(all(isinstance(error, RuntimeError) for error in errors.values()))
+        self.assertEqual(batcher.stats()['queues']['model_1@0.5']['errors'], 1)
+
+    def test_times_out_when_the_batch_does_not_finish(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        batcher = MicroBatcher(max_batch_size=1, window_ms=0, timeout=0.05)
+
+        with self.assertRaises(FutureTimeoutError):
+            batcher.predict(1, RecordingModel(release=release), 'a')
+
+
+@override_settings(
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+        'predictions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-predictions'},
+    },
+    PREDICTION_CACHE_ENABLED=True,
+    PREDICTION_CACHE_ALIAS='predictions',
+)
+class PredictionCacheTests(SimpleTestCase):
+    """Generation-based invalidation and threshold handling of cached predictions"""
+
+    VERSION = (1700000000.0, 1024, 'abc123')
+    ARTICLE = {'title': 'Statins after myocardial infarction', 'abstract': 'A cohort study.'}
+    SCORES = {'Cardiology': 0.9, 'Oncology': 0.4, 'Neurology': 0.1}
+
+    def setUp(self):
+        caches['predictions'].clear()
+
+    def store(self, entry, version=VERSION):
+        prediction_cache.store(1, version, self.ARTICLE['title'], self.ARTICLE['abstract'], entry)
+
+    def lookup(self, threshold=0.5, version=VERSION, model_id=1):
+        return prediction_cache.lookup(model_id, version, self.ARTICLE['title'], self.ARTICLE['abstract'], threshold)
+
+    def test_hit_for_whitespace_variants_of_the_article(self):
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+
+        entry = prediction_cache.lookup(1, self.VERSION, ' Statins  after myocardial\ninfarction ', 'A cohort study.', 0.5)
+        self.assertEqual(entry['all_scores'], self.SCORES)
+
+    def test_miss_for_other_model_or_version(self):
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+
+        self.assertIsNone(self.lookup(model_id=2))
+        self.assertIsNone(self.lookup(version=self.VERSION[:2] + ('def456',)))
+
+    def test_invalidate_model_bumps_the_generation(self):
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+        self.assertIsNotNone(self.lookup())
+
+        prediction_cache.invalidate_model(1)
+        self.assertIsNone(self.lookup())
+
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+        self.assertIsNotNone(self.lookup())
+        prediction_cache.invalidate_model(1)
+        self.assertIsNone(self.lookup())
+
+    def test_threshold_independent_entries_are_rethresholded(self):
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+
+        entry = self.lookup(threshold=0.3)
+        predicted, confidences, all_scores = prediction_cache.derive_prediction(entry, 0.3)
+        self.assertEqual(predicted, ['Cardiology', 'Oncology'])
+        self.assertEqual(confidences, self.SCORES)
+        self.assertEqual(all_scores, self.SCORES)
+
+    def test_threshold_bound_entries_keep_the_model_prediction(self):
+        # Gemma-style: generated labels need not match the scores at the threshold
+        self.store(prediction_cache.make_entry(self.SCORES, False, ['Oncology'], 0.5))
+
+        predicted, confidences, _ = prediction_cache.derive_prediction(self.lookup(threshold=0.5), 0.5)
+        self.assertEqual(predicted, ['Oncology'])
+        self.assertEqual(confidences, {'Oncology': 0.4})
+
+    def test_threshold_bound_entries_miss_at_other_thresholds(self):
+        entry = prediction_cache.make_entry(self.SCORES, False, ['Oncology'], 0.5)
+        self.store(entry)
+
+        self.assertFalse(prediction_cache.applies(entry, 0.3))
+        self.assertIsNone(self.lookup(threshold=0.3))
+        self.assertTrue(prediction_cache.applies(entry, 0.5))
+
+    def test_disabled_cache_always_misses(self):
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+
+        with self.settings(PREDICTION_CACHE_ENABLED=False):
+            self.assertIsNone(self.lookup())
+
+    def test_counts_hits_and_misses(self):
+        self.store(prediction_cache.make_entry(self.SCORES, True, ['Cardiology'], 0.5))
+        self.lookup()
+        self.lookup(model_id=2)
+
+        stats = prediction_cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+
+class ResultWriterTests(TestCase):
+    """Flush, overflow and retry behaviour of each result write mode
+
+    The background flush thread is not started; flushes run in the test thread.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        dataset = Dataset.objects.create(name='Results', file_path='datasets/results.csv')
+        cls.ml_model = MLModel.objects.create(name='SVM', model_type='traditional', dataset=dataset)
+
+    def setUp(self):
+        patcher = mock.patch.object(ResultWriter, '_ensure_thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_results(self, count):
+        return [
+            ClassificationResult(model=self.ml_model, title=f'Article {i}', abstract='Abstract')
+            for i in range(count)
+        ]
+
+    def fail_writes(self, side_effect=None):
+        return mock.patch.object(
+            ClassificationResult.objects, 'bulk_create',
+            side_effect=side_effect or OperationalError('database is locked')
+        )
+
+    def test_sync_writes_in_the_request_path(self):
+        writer = ResultWriter(mode=SYNC)
+
+        result = writer.save(self.make_results(1)[0])
+
+        self.assertIsNotNone(result.id)
+        self.assertEqual(ClassificationResult.objects.count(), 1)
+        self.assertEqual(writer.stats()['pending'], 0)
+
+    def test_sync_failure_is_logged_not_raised(self):
+        writer = ResultWriter(mode=SYNC)
+
+        with self.fail_writes():
+            writer.save(self.make_results(1)[0])
+
+        self.assertEqual(writer.stats()['flush_errors'], 1)
+        self.assertEqual(writer.stats()['pending'], 0)
+
+    def test_async_buffers_until_flush(self):
+        writer = ResultWriter(mode=ASYNC, flush_size=100)
+
+        result = writer.save(self.make_results(1)[0])
+        self.assertIsNone(result.id)
+        self.assertEqual(ClassificationResult.objects.count(), 0)
+        self.assertEqual(writer.stats()['pending'], 1)
+
+        writer.flush()
+        self.assertEqual(ClassificationResult.objects.count(), 1)
+        self.assertEqual(writer.stats()['pending'], 0)
+        self.assertEqual(writer.stats()['rows_written'], 1)
+
+    def test_async_overflow_is_written_by_the_caller(self):
+        writer = ResultWriter(mode=ASYNC, max_buffer=2)
+
+        writer.save_many(self.make_results(3))
+
+        self.assertEqual(list(ClassificationResult.objects.values_list('title', flat=True)), ['Article 0'])
+        self.assertEqual(writer.stats()['pending'], 2)
+        self.assertEqual(writer.stats()['rows_dropped'], 0)
+
+    def test_best_effort_overflow_drops_the_oldest_rows(self):
+        writer = ResultWriter(mode=BEST_EFFORT, max_buffer=2)
+
+        writer.save_many(self.make_results(3))
+        self.assertEqual(ClassificationResult.objects.count(), 0)
+        self.assertEqual(writer.stats()['rows_dropped'], 1)
+
+        writer.flush()
+        self.assertCountEqual(
+            ClassificationResult.objects.values_list('title', flat=True), ['Article 1', 'Article 2']
+        )
+
+    def test_async_failed_flush_requeues_rows(self):
+        writer = ResultWriter(mode=ASYNC)
+        writer.save_many(self.make_results(2))
+
+        with self.fail_writes():
+            writer.flush()
+        self.assertEqual(writer.stats()['pending'], 2)
+        self.assertEqual(writer.stats()['retries'], 1)
+        self.assertEqual(writer.stats()['rows_dropped'], 0)
+
+        writer.flush()
+        self.assertEqual(ClassificationResult.objects.count(), 2)
+
+    def test_async_requeue_is_bounded_by_max_buffer(self):
+        writer = ResultWriter(mode=ASYNC, max_buffer=3)
+        writer.save_many(self.make_results(3))
+        late_rows = [
+            ClassificationResult(model=self.ml_model, title=f'Late {i}', abstract='Abstract') for i in range(2)
+        ]
+
+        def locked_while_requests_arrive(rows):
+            writer.save_many(late_rows)
+            raise OperationalError('database is locked')
+
+        with self.fail_writes(locked_while_requests_arrive):
+            writer.flush()
+
+        self.assertEqual(writer.stats()['pending'], 3)
+        self.assertEqual(writer.stats()['rows_dropped'], 2)
+        writer.flush()
+        self.assertCountEqual(
+            ClassificationResult.objects.values_list('title', flat=True), ['Article 2', 'Late 0', 'Late 1']
+        )
+
+    def test_async_drops_rows_after_max_retries(self):
+        writer = ResultWriter(mode=ASYNC, max_retries=1)
+        writer.save_many(self.make_results(2))
+
+        with self.fail_writes():
+            writer.flush()
+            writer.flush()
+
+        self.assertEqual(writer.stats()['pending'], 0)
+        self.assertEqual(writer.stats()['rows_dropped'], 2)
+
+    def test_best_effort_drops_a_failed_flush(self):
+        writer = ResultWriter(mode=BEST_EFFORT)
+        writer.save_many(self.make_results(2))
+
+        with self.fail_writes():
+            writer.flush()
+
+        self.assertEqual(writer.stats()['pending'], 0)
+        self.assertEqual(writer.stats()['rows_dropped'], 2)
+        self.assertEqual(writer.stats()['retries'], 0)
+
+    def test_stop_flushes_and_switches_to_sync_writes(self):
+        writer = ResultWriter(mode=ASYNC)
+        writer.save(self.make_results(1)[0])
+
+        writer.stop()
+        self.assertEqual(ClassificationResult.objects.count(), 1)
+
+        self.assertIsNotNone(writer.save(self.make_results(1)[0]).id)
+
+
+def legacy_score_dicts(probs, labels, threshold):
+    """Per-text dicts as the transformer and traditional classifiers built them before PredictionBatch"""
+    predictions = []
+    for row in probs:
+        predictions.append({
+            'predicted_domains': [label for label, prob in zip(labels, row) if prob >= threshold],
+            'confidence_scores': {label: float(prob) for label, prob in zip(labels, row)},
+            'all_scores': {label: float(prob) for label, prob in zip(labels, row)},
+        })
+    return predictions
+
+
+def legacy_ensemble_dicts(transformer_predictions, traditional_predictions, labels, weights, threshold):
+    """Per-text dicts as the hybrid ensemble built them before PredictionBatch"""
+    predictions = []
+    for transformer, traditional in zip(transformer_predictions, traditional_predictions):
+        combined_scores = {
+            label: weights['transformer'] * transformer['all_scores'].get(label, 0.0)
+            + weights['traditional'] * traditional['all_scores'].get(label, 0.0)
+            for label in labels
+        }
+        predicted_labels = [label for label, score in combined_scores.items() if score >= threshold]
+        predictions.append({
+            'predicted_domains': predicted_labels,
+            'confidence_scores': {label: combined_scores[label] for label in predicted_labels},
+            'all_scores': combined_scores,
+            'individual_predictions': {'transformer': transformer, 'traditional': traditional},
+        })
+    return predictions
+
+
+class PredictionBatchTests(SimpleTestCase):
+    """PredictionBatch reproduces the per-text dicts the classifiers used to build directly"""
+
+    LABELS = ['Cardiology', 'Neurology', 'Oncology']
+    SCORES = np.array([[0.9, 0.2, 0.5], [0.1, 0.7, 0.3], [0.45, 0.55, 0.05]], dtype=np.float32)
+
+    def assertPredictionsEqual(self, actual, expected):
+        self.assertEqual(len(actual), len(expected))
+        for got, want in zip(actual, expected):
+            self.assertEqual(set(got), set(want))
+            for field, value in want.items():
+                if field == 'predicted_domains':
+                    self.assertEqual(got[field], value)
+                elif field == 'individual_predictions':
+                    for name, component in value.items():
+                        self.assertPredictionsEqual([got[field][name]], [component])
+                else:
+                    self.assertEqual(list(got[field]), list(value))
+                    for label, score in value.items():
+                        self.assertAlmostEqual(got[field][label], score, places=6)
+
+    def test_to_dicts_matches_legacy_output(self):
+        batch = PredictionBatch(self.SCORES, self.LABELS, threshold=0.5)
+
+        self.assertPredictionsEqual(batch.to_dicts(), legacy_score_dicts(self.SCORES, self.LABELS, 0.5))
+        self.assertPredictionsEqual(batch.to_dicts(0.3), legacy_score_dicts(self.SCORES, self.LABELS, 0.3))
+
+    def test_to_dicts_reports_predicted_confidences_only(self):
+        batch = PredictionBatch(self.SCORES, self.LABELS, threshold=0.5, report_all_confidences=False)
+
+        self.assertEqual(
+            [prediction['confidence_scores'] for prediction in batch.to_dicts()],
+            [
+                {'Cardiology': float(self.SCORES[0, 0]), 'Oncology': float(self.SCORES[0, 2])},
+                {'Neurology': float(self.SCORES[1, 1])},
+                {'Neurology': float(self.SCORES[2, 1])},
+            ]
+        )
+
+    def test_to_dicts_merges_extras(self):
+        extras = [{'generated_text': text} for text in ['a', 'b', 'c']]
+        batch = PredictionBatch(self.SCORES, self.LABELS, extras=extras)
+
+        self.assertEqual([prediction['generated_text'] for prediction in batch.to_dicts()], ['a', 'b', 'c'])
+
+    def test_align_reorders_and_zero_fills_labels(self):
+        batch = PredictionBatch(self.SCORES, self.LABELS)
+
+        aligned = batch.align(['Oncology', 'Pediatrics', 'Cardiology'])
+
+        np.testing.assert_array_equal(
+            aligned.scores,
+            np.stack([self.SCORES[:, 2], np.zeros(3, dtype=np.float32), self.SCORES[:, 0]], axis=1)
+        )
+        self.assertIs(batch.align(self.LABELS), batch)
+
+    def test_weighted_average_matches_legacy_ensemble(self):
+        weights = {'transformer': 0.6, 'traditional': 0.4}
+        # The traditional model saw a different label order and no Neurology samples
+        traditional_labels = ['Oncology', 'Cardiology']
+        traditional_scores = np.array([[0.8, 0.3], [0.2, 0.6], [0.5, 0.5]], dtype=np.float32)
+        transformer = PredictionBatch(self.SCORES, self.LABELS)
+        traditional = PredictionBatch(traditional_scores, traditional_labels)
+
+        ensemble = PredictionBatch.weighted_average(
+            {'transformer': transformer, 'traditional': traditional}, weights, self.LABELS, threshold=0.5
+        )
+
+        expected = legacy_ensemble_dicts(
+            legacy_score_dicts(self.SCORES, self.LABELS, 0.0),
+            legacy_score_dicts(traditional_scores, traditional_labels, 0.0),
+            self.LABELS, weights, 0.5
+        )
+        self.assertPredictionsEqual(ensemble.to_dicts(), expected)
+
+
+DOMAIN_WORDS = {
+    'Cardiology': ['heart', 'cardiac', 'arrhythmia', 'coronary', 'atrial', 'infarction'],
+    'Neurology': ['brain', 'stroke', 'seizure', 'neuron', 'cognitive', 'dementia'],
+    'Oncology': ['tumor', 'cancer', 'chemotherapy', 'metastasis', 'carcinoma', 'radiation'],
+}
+FILLER_WORDS = ['patients', 'study', 'cohort', 'outcome', 'trial', 'analysis', 'clinical', 'risk']
+
+
+def synthetic_corpus(n_texts=80, seed=0):
+    """Short multi-label abstracts built from per-domain keywords, with (n_texts, n_labels) targets"""
+    rng = np.random.RandomState(seed)
+    labels = list(DOMAIN_WORDS)
+    texts = []
+    targets = np.zeros((n_texts, len(labels)), dtype=int)
+    for i in range(n_texts):
+        chosen = rng.choice(len(labels), size=rng.randint(1, 3), replace=False)
+        targets[i, chosen] = 1
+        words = [word for j in chosen for word in rng.choice(DOMAIN_WORDS[labels[j]], size=4)]
+        words += list(rng.choice(FILLER_WORDS, size=6))
+        rng.shuffle(words)
+        texts.append(' '.join(words))
+    return texts, targets
+
+
+class FusedLinearHeadTests(SimpleTestCase):
+    """The fused weight matrix reproduces each estimator's own predict_proba"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        texts, cls.targets = synthetic_corpus()
+        cls.X = TfidfVectorizer().fit_transform(texts)
+
+    def assertFusedMatches(self, classifier):
+        classifier.fit(self.X, self.targets)
+        head = FusedLinearHead.from_estimators(classifier.estimators_, self.X.shape[1])
+
+        self.assertIsNotNone(head)
+        self.assertEqual(head.shape, (self.X.shape[1], self.targets.shape[1]))
+        expected = np.stack([proba[:, 1] for proba in classifier.predict_proba(self.X)], axis=1)
+        scores = head.predict_proba(self.X)
+        self.assertEqual(scores.dtype, np.float32)
+        np.testing.assert_allclose(scores, expected, atol=1e-3)
+
+    def test_logistic_regression_parity(self):
+        self.assertFusedMatches(MultiOutputClassifier(LogisticRegression(solver='liblinear')))
+
+    def test_platt_scaled_linear_svc_parity(self):
+        self.assertFusedMatches(MultiOutputClassifier(SVC(kernel='linear', probability=True, random_state=0)))
+
+    def test_non_linear_kernels_are_not_fused(self):
+        classifier = MultiOutputClassifier(SVC(kernel='rbf', probability=True, random_state=0))
+        classifier.fit(self.X, self.targets)
+
+        self.assertIsNone(FusedLinearHead.from_estimators(classifier.estimators_, self.X.shape[1]))
+
+    def test_constant_labels_keep_their_score(self):
+        constant = np.array([np.nan, 1.0, np.nan], dtype=np.float32)
+        head = FusedLinearHead(
+            np.ones((self.X.shape[1], 3), dtype=np.float32), np.zeros(3, dtype=np.float32),
+            np.ones(3, dtype=np.float32), np.zeros(3, dtype=np.float32), constant
+        )
+
+        scores = head.predict_proba(self.X)
+        np.testing.assert_array_equal(scores[:, 1], 1.0)
+        self.assertTrue(np.all(scores[:, 0] > 0.5))
+
+    def test_save_and_load_round_trip(self):
+        classifier = MultiOutputClassifier(LogisticRegression(solver='liblinear')).fit(self.X, self.targets)
+        head = FusedLinearHead.from_estimators(classifier.estimators_, self.X.shape[1])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'head.npz')
+            head.save(path)
+            loaded = FusedLinearHead.load(path)
+
+        np.testing.assert_array_equal(loaded.predict_proba(self.X), head.predict_proba(self.X))
+
+
+class LinearOneVsRestEngineTests(SimpleTestCase):
+    """The parallel liblinear engine matches per-label scikit-learn models"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        texts, cls.targets = synthetic_corpus(n_texts=100)
+        cls.X = TfidfVectorizer().fit_transform(texts)
+
+    def test_logistic_regression_parity_with_predict_proba(self):
+        engine = LinearOneVsRestEngine(algorithm='logistic_regression', C=1.0).fit(self.X, self.targets)
+
+        expected = np.stack([
+            LogisticRegression(C=1.0, solver='liblinear', random_state=42)
+            .fit(self.X, self.targets[:, j]).predict_proba(self.X)[:, 1]
+            for j in range(self.targets.shape[1])
+        ], axis=1)
+        np.testing.assert_allclose(engine.predict_proba(self.X), expected, atol=1e-4)
+
+    def test_svm_scores_follow_the_margin(self):
+        engine = LinearOneVsRestEngine(algorithm='svm', C=1.0).fit(self.X, self.targets)
+        scores = engine.predict_proba(self.X)
+
+        fit_idx, _ = train_test_split(np.arange(self.X.shape[0]), test_size=0.1, random_state=42)
+        self.assertTrue(np.all((scores >= 0) & (scores <= 1)))
+        for j in range(self.targets.shape[1]):
+            margin = LinearSVC(C=1.0, random_state=42).fit(
+                self.X[fit_idx], self.targets[fit_idx, j]
+            ).decision_function(self.X)
+            # Platt scaling is monotonic, so probabilities rank texts like the SVM margin
+            ranked = scores[np.argsort(margin), j]
+            self.assertTrue(np.all(np.diff(ranked) >= -1e-6))
+
+    def test_thread_count_does_not_change_the_model(self):
+        serial = LinearOneVsRestEngine(algorithm='svm', n_jobs=1).fit(self.X, self.targets)
+        parallel = LinearOneVsRestEngine(algorithm='svm', n_jobs=-1).fit(self.X, self.targets)
+
+        np.testing.assert_array_equal(serial.predict_proba(self.X), parallel.predict_proba(self.X))
+
+    def test_single_class_labels_get_a_constant_score(self):
+        targets = np.hstack([self.targets, np.zeros((self.targets.shape[0], 1), dtype=int)])
+
+        engine = LinearOneVsRestEngine(algorithm='logistic_regression').fit(self.X, targets)
+
+        np.testing.assert_array_equal(engine.predict_proba(self.X)[:, -1], 0.0)
+        self.assertEqual(len(engine.fit_seconds_), targets.shape[1])
+
+    def test_predict_before_fit_raises(self):
+        with self.assertRaises(ValueError):
+            LinearOneVsRestEngine().predict_proba(self.X)
+
+    def test_rejects_non_linear_algorithms(self):
+        with self.assertRaises(ValueError):
+            LinearOneVsRestEngine(algorithm='random_forest')
+
+
+class CompactTfidfVectorizerTests(SimpleTestCase):
+    """The compact vectorizer produces the same matrix as the TfidfVectorizer it was built from"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.texts, cls.targets = synthetic_corpus()
+        cls.unseen = [
+            'Cardiac tumor in the brain: a case report',
+            '',
+            'supercalifragilisticexpialidocious cardiomyopathies',
+            'Heart HEART heart, stroke!',
+        ]
+
+    def assertTransformMatches(self, **params):
+        vectorizer = TfidfVectorizer(**params).fit(self.texts)
+        compact = CompactTfidfVectorizer.from_vectorizer(vectorizer)
+
+        for texts in (self.texts, self.unseen):
+            expected = vectorizer.transform(texts)
+            actual = compact.transform(texts)
+            self.assertEqual(actual.shape, expected.shape)
+            self.assertEqual(actual.dtype, expected.dtype)
+            np.testing.assert_allclose(actual.toarray(), expected.toarray(), rtol=1e-12, atol=1e-12)
+
+    def test_default_parameters(self):
+        self.assertTransformMatches()
+
+    def test_traditional_classifier_parameters(self):
+        self.assertTransformMatches(max_features=40, stop_words='english', ngram_range=(1, 2), lowercase=True)
+
+    def test_weighting_options(self):
+        self.assertTransformMatches(sublinear_tf=True, norm='l1')
+        self.assertTransformMatches(binary=True, use_idf=False, norm=None)
+        self.assertTransformMatches(smooth_idf=False, stop_words=['patients', 'study'])
+
+    def test_custom_tokenizers_are_rejected(self):
+        vectorizer = TfidfVectorizer(tokenizer=str.split, token_pattern=None).fit(self.texts)
+
+        with self.assertRaises(ValueError):
+            CompactTfidfVectorizer.from_vectorizer(vectorizer)
+
+    def test_saved_artifact_round_trip(self):
+        classifier = TraditionalMLClassifier(algorithm='logistic_regression', n_jobs=1)
+        labels = [
+            [label for label, selected in zip(DOMAIN_WORDS, row) if selected] for row in self.targets
+        ]
+        classifier.train(self.texts, labels)
+
+        with tempfile.TemporaryDirectory() as directory:
+            model_path = os.path.join(directory, 'model.pkl')
+            classifier.save_model(model_path)
+            self.assertTrue(compact_artifacts.has_compact_artifact(model_path))
+
+            compact = TraditionalMLClassifier(algorithm='logistic_regression')
+            compact.load_model(model_path)
+            pickled = TraditionalMLClassifier(algorithm='logistic_regression', use_compact_artifact=False)
+            pickled.load_model(model_path)
+
+            self.assertIsInstance(compact.vectorizer, CompactTfidfVectorizer)
+            self.assertIsInstance(pickled.vectorizer, TfidfVectorizer)
+            texts = self.texts[:10] + self.unseen
+            np.testing.assert_allclose(
+                compact.predict_batch(texts).scores, pickled.predict_batch(texts).scores, atol=1e-6
+            )
+
+
+def word_level_tokenizer(words):
+    """Fast (Rust-backed) word-level tokenizer over ``words``, built without downloading anything"""
+    vocab = {'[UNK]': 0, '[PAD]': 1, **{word: i + 2 for i, word in enumerate(words)}}
+    backend = Tokenizer(tokenizer_models.WordLevel(vocab, unk_token='[UNK]'))
+    backend.pre_tokenizer = pre_tokenizers.Whitespace()
+    return PreTrainedTokenizerFast(tokenizer_object=backend, unk_token='[UNK]', pad_token='[PAD]')
+
+
+class SlowTokenizer:
+    """Python tokenizer without a serialized backend"""
+
+    def __init__(self, vocab, **init_kwargs):
+        self.vocab = vocab
+        self.init_kwargs = init_kwargs
+
+    def get_vocab(self):
+        return dict(self.vocab)
+
+
+@unittest.skipIf(PreTrainedTokenizerFast is None, "tokenizers is not installed")
+class TokenCacheKeyTests(SimpleTestCase):
+    """Token cache keys only change when the tokenized output can change"""
+
+    WORDS = sorted({word for words in DOMAIN_WORDS.values() for word in words} | set(FILLER_WORDS))
+    TEXTS = ['heart study', 'brain tumor cohort', 'cancer trial patients']
+
+    def key(self, texts=TEXTS, tokenizer=None, max_length=8):
+        return token_cache.cache_key(texts, tokenizer or word_level_tokenizer(self.WORDS), max_length)[0]
+
+    def test_stable_for_equal_inputs(self):
+        self.assertEqual(self.key(), self.key())
+        self.assertEqual(self.key(texts=list(self.TEXTS)), self.key(texts=tuple(self.TEXTS)))
+
+    def test_stable_after_truncating_calls(self):
+        tokenizer = word_level_tokenizer(self.WORDS)
+        before = self.key(tokenizer=tokenizer)
+        # Calls with truncation/padding leave per-call state on the Rust backend
+        tokenizer(list(self.TEXTS), truncation=True, max_length=2, padding='max_length')
+
+        self.assertEqual(self.key(tokenizer=tokenizer), before)
+
+    def test_changes_with_texts_and_their_boundaries(self):
+        self.assertNotEqual(self.key(), self.key(texts=self.TEXTS[:2]))
+        self.assertNotEqual(self.key(), self.key(texts=list(reversed(self.TEXTS))))
+        self.assertNotEqual(token_cache.dataset_hash(['ab', 'c']), token_cache.dataset_hash(['a', 'bc']))
+
+    def test_changes_with_max_length_and_vocabulary(self):
+        self.assertNotEqual(self.key(), self.key(max_length=16))
+        self.assertNotEqual(self.key(), self.key(tokenizer=word_level_tokenizer(self.WORDS[:-1])))
+
+    def test_slow_tokenizer_fingerprint_ignores_kwarg_order(self):
+        vocab = {'[UNK]': 0, 'heart': 1}
+        first = SlowTokenizer(vocab, do_lower_case=True, model_max_length=512)
+        second = SlowTokenizer(vocab, model_max_length=512, do_lower_case=True)
+        cased = SlowTokenizer(vocab, do_lower_case=False, model_max_length=512)
+
+        self.assertEqual(token_cache.tokenizer_fingerprint(first), token_cache.tokenizer_fingerprint(second))
+        self.assertNotEqual(token_cache.tokenizer_fingerprint(first), token_cache.tokenizer_fingerprint(cased))
+
+    def test_second_lookup_is_served_from_disk(self):
+        tokenizer = word_level_tokenizer(self.WORDS)
+        with tempfile.TemporaryDirectory() as directory, \
+                self.settings(TOKEN_CACHE_PATH=directory, TOKEN_CACHE_ENABLED=True, TOKEN_CACHE_WORKERS=1):
+            hits = token_cache.stats()['hits']
+            first = token_cache.get_or_tokenize(self.TEXTS, tokenizer, 8)
+            second = token_cache.get_or_tokenize(self.TEXTS, word_level_tokenizer(self.WORDS), 8)
+
+            self.assertEqual(token_cache.stats()['hits'], hits + 1)
+            self.assertEqual(second.key, first.key)
+            self.assertEqual([len(ids) for ids in (first[i] for i in range(len(first)))], [2, 3, 3])
+            for i in range(len(self.TEXTS)):
+                np.testing.assert_array_equal(second[i], first[i])
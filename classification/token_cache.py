@@ -0,0 +1,378 @@
+"""
+Persistent cache of tokenized training texts
+Token ids are computed once per (dataset content, tokenizer, max_length) and
+stored as flat .npy arrays that are memory-mapped on reuse, so epochs, eval
+passes, HPO trials and post-training evaluation never re-tokenize the same
+abstracts. Entries are evicted least-recently-used by total size and by age.
+"""
+import hashlib
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .execution_profiles import M1_SAFE, available_cpus, get_active_profile
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+ARRAY_NAMES = ['input_ids', 'offsets', 'lengths']
+
+# Below this many texts per worker a pool costs more than it saves
+MIN_TEXTS_PER_WORKER = 500
+
+# Half-written entries of crashed processes are removed after this long
+STALE_TMP_SECONDS = 3600
+
+_stats = {'hits': 0, 'misses': 0, 'tokenize_seconds': 0.0, 'evicted': 0}
+_stats_lock = threading.Lock()
+
+
+def _setting(name: str, default: Any) -> Any:
+    """Read a Django setting, falling back to ``default`` outside a configured project"""
+    try:
+        from django.conf import settings
+        if settings.configured:
+            return getattr(settings, name, default)
+    except ImportError:
+        pass
+    return default
+
+
+def cache_root() -> Optional[str]:
+    path = _setting('TOKEN_CACHE_PATH', None)
+    return str(path) if path else None
+
+
+def cache_enabled() -> bool:
+    return bool(_setting('TOKEN_CACHE_ENABLED', True)) and cache_root() is not None
+
+
+def _count(name: str, amount: float = 1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def dataset_hash(texts: Sequence[str]) -> str:
+    """Content hash of an ordered list of texts"""
+    digest = hashlib.sha256()
+    for text in texts:
+        encoded = str(text).encode('utf-8')
+        # Length prefix so ['ab', 'c'] and ['a', 'bc'] hash differently
+        digest.update(len(encoded).to_bytes(8, 'little'))
+        digest.update(encoded)
+    return digest.hexdigest()
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of everything that changes a tokenizer's output: class, name, vocabulary and rules"""
+    digest = hashlib.sha256()
+    digest.update(type(tokenizer).__name__.encode('utf-8'))
+    digest.update(str(getattr(tokenizer, 'name_or_path', '')).encode('utf-8'))
+    backend = getattr(tokenizer, 'backend_tokenizer', None)
+    if backend is not None:
+        # Serialized fast tokenizer: vocabulary, normalizer, pre-tokenizer and post-processor.
+        # Truncation/padding are per-call state (set by any call with truncation=True), not rules
+        serialized = json.loads(backend.to_str())
+        serialized.pop('truncation', None)
+        serialized.pop('padding', None)
+        digest.update(json.dumps(serialized, sort_keys=True).encode('utf-8'))
+    else:
+        digest.update(json.dumps(sorted(tokenizer.get_vocab().items())).encode('utf-8'))
+        digest.update(json.dumps(tokenizer.init_kwargs, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_key(texts: Sequence[str], tokenizer, max_length: int) -> Tuple[str, Dict[str, Any]]:
+    """Return the entry key and the components it was derived from"""
+    components = {
+        'dataset_sha256': dataset_hash(texts),
+        'tokenizer': str(getattr(tokenizer, 'name_or_path', '')),
+        'tokenizer_sha256': tokenizer_fingerprint(tokenizer),
+        'max_length': int(max_length),
+        'version': FORMAT_VERSION,
+    }
+    key = hashlib.sha256(json.dumps(components, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    return key, components
+
+
+class TokenizedTexts:
+    """
+    Unpadded token ids of a list of texts, stored flat with per-text offsets
+
+    ``input_ids[offsets[i]:offsets[i + 1]]`` are the ids of text ``i``; with a
+    cache hit all three arrays are read-only memory maps.
+    """
+
+    def __init__(self, input_ids: np.ndarray, offsets: np.ndarray, lengths: np.ndarray, key: str = None):
+        self.input_ids = input_ids
+        self.offsets = offsets
+        self.lengths = lengths
+        self.key = key
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        return self.input_ids[self.offsets[index]:self.offsets[index + 1]]
+
+    def as_encodings(self, indices: Sequence[int] = None,
+                     input_names: Sequence[str] = ('input_ids', 'attention_mask')) -> Dict[str, List[np.ndarray]]:
+        """Unpadded encodings in the layout the tokenizer returns, ready for ``tokenizer.pad``"""
+        indices = range(len(self)) if indices is None else indices
+        input_ids = [self[i].tolist() for i in indices]
+        encodings = {'input_ids': input_ids}
+        if 'attention_mask' in input_names:
+            encodings['attention_mask'] = [[1] * len(ids) for ids in input_ids]
+        if 'token_type_ids' in input_names:
+            # Single-sequence inputs only ever use segment 0
+            encodings['token_type_ids'] = [[0] * len(ids) for ids in input_ids]
+        return encodings
+
+
+def _tokenize(tokenizer, texts: Sequence[str], max_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (flat int32 ids, int32 lengths) for ``texts``, truncated but not padded"""
+    ids = tokenizer([str(text) for text in texts], truncation=True, max_length=max_length)['input_ids']
+    lengths = np.fromiter((len(row) for row in ids), dtype=np.int32, count=len(ids))
+    flat = np.fromiter(itertools.chain.from_iterable(ids), dtype=np.int32, count=int(lengths.sum()))
+    return flat, lengths
+
+
+# Tokenizer of a pool worker process, sent once by the pool initializer
+_worker_tokenizer = None
+
+
+def _init_worker(tokenizer):
+    global _worker_tokenizer
+    _worker_tokenizer = tokenizer
+
+
+def _tokenize_in_worker(texts: List[str], max_length: int) -> Tuple[np.ndarray, np.ndarray]:
+    return _tokenize(_worker_tokenizer, texts, max_length)
+
+
+def _pool_size(n_texts: int) -> int:
+    profile = get_active_profile()
+    if profile is not None and profile.name == M1_SAFE:
+        return 1
+    workers = _setting('TOKEN_CACHE_WORKERS', 0) or available_cpus()
+    return max(1, min(workers, n_texts // MIN_TEXTS_PER_WORKER))
+
+
+def tokenize_parallel(tokenizer, texts: Sequence[str], max_length: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Tokenize ``texts`` in chunks over a worker pool
+
+    Uses spawned processes where the current process may have children. Celery
+    prefork children are daemonic and cannot, so there fast (Rust) tokenizers,
+    which release the GIL while encoding, run on threads instead.
+
+    Returns:
+        Tuple of (flat ids, lengths, number of workers used)
+    """
+    texts = [str(text) for text in texts]
+    workers = _pool_size(len(texts))
+    if workers == 1:
+        return (*_tokenize(tokenizer, texts, max_length), 1)
+
+    chunk_size = -(-len(texts) // (workers * 4))
+    chunks = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+
+    if not multiprocessing.current_process().daemon:
+        executor = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker, initargs=(tokenizer,)
+        )
+        task, task_args = _tokenize_in_worker, ()
+    elif getattr(tokenizer, 'is_fast', False):
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tokenize')
+        task, task_args = _tokenize, (tokenizer,)
+    else:
+        return (*_tokenize(tokenizer, texts, max_length), 1)
+
+    with executor:
+        futures = [executor.submit(task, *task_args, chunk, max_length) for chunk in chunks]
+        results = [future.result() for future in futures]
+    flat = np.concatenate([ids for ids, _ in results])
+    lengths = np.concatenate([lengths for _, lengths in results])
+    return flat, lengths, workers
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(cache_root(), key)
+
+
+def _load_entry(key: str) -> TokenizedTexts:
+    directory = _entry_dir(key)
+    arrays = {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode='r', allow_pickle=False)
+        for name in ARRAY_NAMES
+    }
+    if len(arrays['offsets']) != len(arrays['lengths']) + 1 or arrays['offsets'][-1] != len(arrays['input_ids']):
+        raise ValueError(f"Token cache entry {key} is inconsistent")
+    # Touch the manifest: its mtime is the entry's last use for LRU eviction
+    try:
+        os.utime(os.path.join(directory, MANIFEST_NAME))
+    except OSError:
+        pass
+    return TokenizedTexts(arrays['input_ids'], arrays['offsets'], arrays['lengths'], key)
+
+
+def _write_entry(key: str, components: Dict[str, Any], tokenized: TokenizedTexts, workers: int,
+                 seconds: float):
+    """Write an entry into a private directory and rename it into place (atomic per entry)"""
+    root = cache_root()
+    os.makedirs(root, exist_ok=True)
+    tmp_dir = os.path.join(root, f".{key}.tmp-{os.getpid()}-{threading.get_ident()}")
+    os.makedirs(tmp_dir)
+    try:
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), getattr(tokenized, name), allow_pickle=False)
+        manifest = {
+            **components,
+            'texts': len(tokenized),
+            'tokens': int(tokenized.lengths.sum()),
+            'tokenize_seconds': round(seconds, 3),
+            'workers': workers,
+            'created_at': time.time(),
+        }
+        with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_dir, _entry_dir(key))
+    except OSError:
+        # Another process stored the same entry first, or the disk is full
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not os.path.isdir(_entry_dir(key)):
+            raise
+
+
+def get_or_tokenize(texts: Sequence[str], tokenizer, max_length: int) -> Optional[TokenizedTexts]:
+    """Token ids of ``texts`` from the cache, tokenizing and storing them on a miss
+
+    Returns None when the cache is disabled, so callers tokenize on the fly.
+    """
+    if not cache_enabled():
+        return None
+
+    start = time.perf_counter()
+    key, components = cache_key(texts, tokenizer, max_length)
+    if os.path.exists(os.path.join(_entry_dir(key), MANIFEST_NAME)):
+        try:
+            tokenized = _load_entry(key)
+            _count('hits')
+            logger.info(
+                f"Token cache hit {key[:12]}: {len(tokenized)} texts, {components['tokenizer']} "
+                f"max_length {max_length} ({(time.perf_counter() - start) * 1000:.0f} ms)"
+            )
+            return tokenized
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable token cache entry {key[:12]}: {str(e)}")
+            shutil.rmtree(_entry_dir(key), ignore_errors=True)
+
+    _count('misses')
+    tokenize_start = time.perf_counter()
+    flat, lengths, workers = tokenize_parallel(tokenizer, texts, max_length)
+    seconds = time.perf_counter() - tokenize_start
+    _count('tokenize_seconds', seconds)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    tokenized = TokenizedTexts(flat, offsets, lengths, key)
+    logger.info(
+        f"Token cache miss {key[:12]}: tokenized {len(tokenized)} texts ({int(lengths.sum())} tokens) "
+        f"with {components['tokenizer']} max_length {max_length} in {seconds:.1f}s on {workers} workers"
+    )
+
+    try:
+        _write_entry(key, components, tokenized, workers, seconds)
+        evict()
+    except OSError as e:
+        logger.warning(f"Could not store token cache entry {key[:12]}: {str(e)}")
+    return tokenized
+
+
+def list_entries() -> List[Dict[str, Any]]:
+    """Entries on disk with their key, path, last use (manifest mtime) and size"""
+    root = cache_root()
+    if not root or not os.path.isdir(root):
+        return []
+    entries = []
+    for name in os.listdir(root):
+        directory = os.path.join(root, name)
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if name.startswith('.') or not os.path.exists(manifest_path):
+            continue
+        entries.append({
+            'key': name,
+            'path': directory,
+            'last_used': os.path.getmtime(manifest_path),
+            'size_bytes': sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file()),
+        })
+    return entries
+
+
+def evict(max_size_mb: float = None, max_age_days: float = None) -> Dict[str, Any]:
+    """Drop entries unused for ``max_age_days``, then least recently used ones over ``max_size_mb``
+
+    Defaults come from TOKEN_CACHE_MAX_SIZE_MB and TOKEN_CACHE_MAX_AGE_DAYS.
+    """
+    max_size_mb = _setting('TOKEN_CACHE_MAX_SIZE_MB', 2048) if max_size_mb is None else max_size_mb
+    max_age_days = _setting('TOKEN_CACHE_MAX_AGE_DAYS', 30) if max_age_days is None else max_age_days
+    root = cache_root()
+    now = time.time()
+
+    if root and os.path.isdir(root):
+        for name in os.listdir(root):
+            path = os.path.join(root, name)
+            if name.startswith('.') and now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+    entries = sorted(list_entries(), key=lambda entry: entry['last_used'])
+    total = sum(entry['size_bytes'] for entry in entries)
+    removed = []
+    for entry in entries:
+        expired = max_age_days > 0 and now - entry['last_used'] > max_age_days * 86400
+        over_budget = total > max_size_mb * 1024 * 1024
+        if not (expired or over_budget):
+            continue
+        shutil.rmtree(entry['path'], ignore_errors=True)
+        total -= entry['size_bytes']
+        removed.append(entry['key'])
+
+    if removed:
+        _count('evicted', len(removed))
+        logger.info(f"Evicted {len(removed)} token cache entries ({total / (1024 * 1024):.1f} MB kept)")
+    return {'removed': removed, 'size_mb': round(total / (1024 * 1024), 2)}
+
+
+def clear() -> int:
+    """Remove every entry; returns how many there were"""
+    entries = list_entries()
+    for entry in entries:
+        shutil.rmtree(entry['path'], ignore_errors=True)
+    return len(entries)
+
+
+def stats() -> Dict[str, Any]:
+    """Hit/miss counters of this process plus what is on disk"""
+    with _stats_lock:
+        counters = dict(_stats)
+    entries = list_entries()
+    lookups = counters['hits'] + counters['misses']
+    return {
+        'enabled': cache_enabled(),
+        'path': cache_root(),
+        **counters,
+        'tokenize_seconds': round(counters['tokenize_seconds'], 2),
+        'hit_rate': round(counters['hits'] / lookups, 4) if lookups else 0.0,
+        'entries': len(entries),
+        'size_mb': round(sum(entry['size_bytes'] for entry in entries) / (1024 * 1024), 2),
+    }
@@ -0,0 +1,231 @@
+"""
+Warm pools of hot models for inference processes
+Loads the configured "hot" models into the model registry when a Celery pool
+process, a gunicorn worker or the ASGI server starts and runs a synthetic
+prediction through each one, so the first request after a deploy or worker
+recycle does not pay the cold load
+"""
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from .models import MLModel
+from .model_registry import get_model_registry, get_trained_model
+
+logger = logging.getLogger(__name__)
+
+# Readiness states
+IDLE = 'idle'          # Warm-up has not run in this process
+WARMING = 'warming'
+READY = 'ready'        # Every hot model loaded and answered the synthetic prediction
+DEGRADED = 'degraded'  # Finished, but some models failed (they are served by the fallback path)
+DISABLED = 'disabled'  # Warm-up is switched off; the process is ready immediately
+
+# Synthetic article used to trigger lazy allocations (tokenizer, kernels, KV caches)
+WARMUP_TITLE = "Randomized trial of antihypertensive therapy in patients with type 2 diabetes"
+WARMUP_ABSTRACT = (
+    "We assessed cardiovascular outcomes, renal function and adverse events in adults "
+    "treated for hypertension and followed for five years."
+)
+
+# Batch shapes exercised during warm-up: a single request and a small batch
+WARMUP_BATCH_SIZES = (1, 8)
+
+
+def serving_candidates():
+    """Trained models with an artifact on disk, best F1 first (what classify_single picks from)"""
+    return MLModel.objects.filter(
+        is_trained=True,
+        model_path__isnull=False  # Only models with actual files
+    ).exclude(model_path='').order_by('-f1_score')
+
+
+def hot_models() -> List[MLModel]:
+    """Models to keep warm: ML_WARMUP_MODEL_IDS, or the best-F1 model of each type
+
+    The default set is capped at the registry's entry limit, since warming
+    more models would only evict the ones warmed first.
+    """
+    model_ids = getattr(settings, 'ML_WARMUP_MODEL_IDS', [])
+    if model_ids:
+        models = {model.id: model for model in serving_candidates().filter(id__in=model_ids)}
+        missing = [model_id for model_id in model_ids if model_id not in models]
+        if missing:
+            logger.warning(f"Warm-up models not found or not trained: {missing}")
+        return [models[model_id] for model_id in model_ids if model_id in models]
+
+    best_per_type = {}
+    for model in serving_candidates():
+        best_per_type.setdefault(model.model_type, model)
+    return list(best_per_type.values())[:get_model_registry().max_entries]
+
+
+class _WarmupState:
+    """Readiness of this process, reported by the /ready endpoint"""
+
+    def __init__(self):
+        self.status = IDLE
+        self.trigger = None
+        self.started_at = None
+        self.finished_at = None
+        self.models: Dict[int, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'status': self.status,
+            'ready': self.status in (READY, DEGRADED, DISABLED),
+            'trigger': self.trigger,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'duration_seconds': round(self.finished_at - self.started_at, 2)
+            if self.started_at and self.finished_at else None,
+            'models': dict(self.models),
+        }
+
+
+_state = _WarmupState()
+_run_lock = threading.Lock()
+
+
+def warmup_enabled() -> bool:
+    return getattr(settings, 'ML_WARMUP_ENABLED', False)
+
+
+def warm_model(model: MLModel, pin: bool = True, run_inference: bool = True) -> Dict[str, Any]:
+    """Load one model into the registry and run the synthetic predictions through it"""
+    from .tasks import _resolve_model_file_path
+
+    model_file_path = _resolve_model_file_path(model)
+    if not model_file_path:
+        raise FileNotFoundError(f"No usable artifact for model {model.id}")
+
+    load_start = time.time()
+    ml_model = get_trained_model(model, model_file_path)
+    load_seconds = time.time() - load_start
+    if pin:
+        pin = get_model_registry().pin(model.id)
+
+    text = f"{WARMUP_TITLE} {WARMUP_ABSTRACT}"
+    inference_ms = {}
+    for batch_size in (WARMUP_BATCH_SIZES if run_inference else ()):
+        inference_start = time.time()
+        ml_model.predict_batch([text] * batch_size, threshold=settings.DEFAULT_PREDICTION_THRESHOLD)
+        inference_ms[batch_size] = round((time.time() - inference_start) * 1000, 2)
+
+    return {
+        'name': model.name,
+        'model_type': model.model_type,
+        'load_seconds': round(load_seconds, 2),
+        'warmup_inference_ms': inference_ms,
+        'pinned': pin,
+    }
+
+
+def warm_up(models: Optional[List[MLModel]] = None, trigger: str = 'manual',
+            pin: Optional[bool] = None, run_inference: bool = True) -> Dict[str, Any]:
+    """Warm the hot models in this process and update its readiness
+
+    Args:
+        models: Models to warm (default: ``hot_models()``)
+        trigger: What started the warm-up ('celery', 'asgi', 'wsgi', 'manual'), for reporting
+        pin: Keep the models in the registry past TTL/LRU (default: ML_WARMUP_PIN_MODELS)
+        run_inference: Run the synthetic predictions (off when preloading a parent before fork)
+    """
+    if pin is None:
+        pin = getattr(settings, 'ML_WARMUP_PIN_MODELS', False)
+
+    with _run_lock:
+        with _state.lock:
+            _state.status = WARMING
+            _state.trigger = trigger
+            _state.started_at = time.time()
+            _state.finished_at = None
+            _state.models = {}
+
+        if models is None:
+            models = hot_models()
+
+        failures = 0
+        for model in models:
+            try:
+                report = warm_model(model, pin=pin, run_inference=run_inference)
+                logger.info(
+                    f"Warmed model {model.id} ({model.model_type}) in {report['load_seconds']:.2f}s, "
+                    f"synthetic inference {report['warmup_inference_ms']} ms"
+                )
+            except Exception as e:
+                failures += 1
+                report = {'name': model.name, 'model_type': model.model_type, 'error': str(e)}
+                logger.warning(f"Warm-up of model {model.id} failed: {str(e)}")
+            with _state.lock:
+                _state.models[model.id] = report
+
+        with _state.lock:
+            _state.status = DEGRADED if failures else READY
+            _state.finished_at = time.time()
+        logger.info(f"Warm-up ({trigger}) finished: {len(models) - failures}/{len(models)} models warm")
+        return status()
+
+
+def warm_up_in_background(trigger: str) -> Optional[threading.Thread]:
+    """Start the warm-up on a daemon thread so process startup is not blocked
+
+    Requests arriving meanwhile are not lost: they wait on the registry's
+    in-flight load of the same model instead of starting a second one.
+    """
+    if not warmup_enabled():
+        with _state.lock:
+            _state.status = DISABLED
+        return None
+
+    def run():
+        from django.db import close_old_connections
+        try:
+            warm_up(trigger=trigger)
+        except Exception as e:
+            logger.error(f"Warm-up ({trigger}) failed: {str(e)}", exc_info=True)
+            with _state.lock:
+                _state.status = DEGRADED
+                _state.finished_at = time.time()
+        finally:
+            close_old_connections()
+
+    with _state.lock:
+        _state.status = WARMING
+        _state.trigger = trigger
+    thread = threading.Thread(target=run, name='model-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+async def lifespan_app(scope, receive, send):
+    """ASGI lifespan handler: warm the hot models in the background when the server starts
+
+    Servers without lifespan support never call it; their processes warm
+    models on first use instead.
+    """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            warm_up_in_background(trigger='asgi')
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def is_ready() -> bool:
+    return status()['ready']
+
+
+def status() -> Dict[str, Any]:
+    with _state.lock:
+        state = _state.as_dict()
+    if state['status'] == IDLE and not warmup_enabled():
+        # No startup hook ran (e.g. runserver), and none would warm anything
+        state.update(status=DISABLED, ready=True)
+    return state
@@ -0,0 +1,151 @@
+"""
+Weight file formats of trained transformer models
+Reads ``model.safetensors`` zero-copy: tensors are views into a private memory
+map of the file, so weights are paged in lazily from the OS page cache (shared
+by every process on the host) instead of being deserialized into RAM
+"""
+import json
+import logging
+import os
+import struct
+from typing import Any, Dict, Tuple
+
+import torch
+
+logger = logging.getLogger(__name__)
+
+SAFETENSORS_NAME = 'model.safetensors'
+LEGACY_NAME = 'pytorch_model.bin'
+
+# How TransformerClassifier loads eager weights
+AUTO = 'auto'                # mmap when model.safetensors exists, else the pickled legacy file
+MMAP = 'mmap'                # Zero-copy memory-mapped safetensors
+SAFETENSORS = 'safetensors'  # transformers' regular (copying) safetensors load
+LEGACY = 'bin'               # Pickled pytorch_model.bin, fully deserialized
+
+LOAD_MODES = [AUTO, MMAP, SAFETENSORS, LEGACY]
+
+_DTYPES = {
+    'F64': torch.float64,
+    'F32': torch.float32,
+    'F16': torch.float16,
+    'BF16': torch.bfloat16,
+    'I64': torch.int64,
+    'I32': torch.int32,
+    'I16': torch.int16,
+    'I8': torch.int8,
+    'U8': torch.uint8,
+    'BOOL': torch.bool,
+}
+
+
+def weights_format(model_dir: str) -> str:
+    """'safetensors', 'bin' or 'missing' for a model directory"""
+    if os.path.exists(os.path.join(model_dir, SAFETENSORS_NAME)):
+        return SAFETENSORS
+    if os.path.exists(os.path.join(model_dir, LEGACY_NAME)):
+        return LEGACY
+    return 'missing'
+
+
+def resolve_load_mode(mode: str, model_dir: str) -> str:
+    if mode not in LOAD_MODES:
+        raise ValueError(f"Unsupported weights load mode: {mode}")
+    if mode == AUTO:
+        return MMAP if weights_format(model_dir) == SAFETENSORS else LEGACY
+    return mode
+
+
+def read_safetensors_header(path: str) -> Tuple[Dict[str, Any], int]:
+    """Return the tensor index of a safetensors file and the byte offset of its data section"""
+    with open(path, 'rb') as f:
+        (header_size,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_size))
+    header.pop('__metadata__', None)
+    return header, 8 + header_size
+
+
+def mmap_state_dict(path: str) -> Dict[str, torch.Tensor]:
+    """Map a safetensors file and return its tensors as views into the mapping
+
+    The mapping is private (copy-on-write): pages stay shared with the page
+    cache and other processes until something writes to a tensor.
+    """
+    header, data_start = read_safetensors_header(path)
+    storage = torch.UntypedStorage.from_file(path, shared=False, nbytes=os.path.getsize(path))
+
+    state_dict = {}
+    for name, info in header.items():
+        dtype = _DTYPES.get(info['dtype'])
+        if dtype is None:
+            raise ValueError(f"Unsupported safetensors dtype {info['dtype']} for {name}")
+        begin, end = info['data_offsets']
+        raw = torch.empty(0, dtype=torch.uint8).set_(storage, data_start + begin, (end - begin,))
+        element_size = torch.empty(0, dtype=dtype).element_size()
+        if (data_start + begin) % element_size:
+            # Unaligned tensors cannot be viewed in place; copy just this one
+            raw = raw.clone()
+        state_dict[name] = raw.view(dtype).reshape(info['shape'])
+    return state_dict
+
+
+def load_mmap_model(model_class: Any, model_dir: str) -> Any:
+    """Build ``model_class`` from its config and point its parameters at the mapped weights
+
+    Parameters are created on the meta device (no random init, no allocation)
+    and replaced by the mapped tensors; buffers that are not stored in the
+    checkpoint keep their real values.
+    """
+    from accelerate import init_empty_weights
+    from transformers import AutoConfig
+
+    config = AutoConfig.from_pretrained(model_dir)
+    with init_empty_weights(include_buffers=False):
+        model = model_class.from_config(config)
+
+    state_dict = mmap_state_dict(os.path.join(model_dir, SAFETENSORS_NAME))
+    model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    still_empty = [name for name, param in model.named_parameters() if param.is_meta]
+    if still_empty:
+        raise ValueError(f"{len(still_empty)} parameters missing from {SAFETENSORS_NAME}, e.g. {still_empty[0]}")
+
+    model.eval()
+    return model
+
+
+def convert_to_safetensors(model_class: Any, model_dir: str, keep_legacy: bool = False) -> Dict[str, Any]:
+    """Rewrite a model directory's pickled weights as safetensors and verify them
+
+    Returns:
+        A record with the file sizes and the number of verified tensors
+    """
+    legacy_path = os.path.join(model_dir, LEGACY_NAME)
+    if not os.path.exists(legacy_path):
+        raise FileNotFoundError(f"No {LEGACY_NAME} in {model_dir}")
+
+    model = model_class.from_pretrained(model_dir, use_safetensors=False)
+    # save_pretrained de-duplicates tied tensors, which safetensors cannot store twice
+    model.save_pretrained(model_dir, safe_serialization=True)
+
+    reference = model.state_dict()
+    converted = mmap_state_dict(os.path.join(model_dir, SAFETENSORS_NAME))
+    mismatched = [
+        name for name, tensor in converted.items()
+        if name in reference and not torch.equal(reference[name], tensor)
+    ]
+    if mismatched:
+        os.remove(os.path.join(model_dir, SAFETENSORS_NAME))
+        raise ValueError(f"Converted weights differ from {LEGACY_NAME}: {', '.join(mismatched[:5])}")
+
+    record = {
+        'legacy_size_mb': round(os.path.getsize(legacy_path) / (1024 * 1024), 2),
+        'safetensors_size_mb': round(os.path.getsize(os.path.join(model_dir, SAFETENSORS_NAME)) / (1024 * 1024), 2),
+        'verified_tensors': len(converted),
+        'legacy_removed': not keep_legacy,
+    }
+    if not keep_legacy:
+        os.remove(legacy_path)
+    logger.info(f"Converted {model_dir} to {SAFETENSORS_NAME} ({record['verified_tensors']} tensors verified)")
+    return record
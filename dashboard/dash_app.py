@@ -26,7 +26,8 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
 import json
 
-from dataset_management.models import Dataset, DatasetSample
+from dataset_management.models import Dataset
+from dataset_management.snapshots import load_snapshot
 from classification.models import MLModel, ClassificationResult, TrainingJob
 
 # Create thread executor for Django ORM calls
@@ -56,22 +57,21 @@ def get_dataset_statistics():
     
     stats = []
     for dataset in datasets:
-        samples = DatasetSample.objects.filter(dataset=dataset)
-        sample_count = samples.count()
+        # Columnar snapshot: statistics cover every sample without per-row ORM queries.
+        # Only existing snapshots are read; datasets still processing or without one are skipped
+        if dataset.snapshot_version is None:
+            continue
+        try:
+            snapshot = load_snapshot(dataset, dataset.snapshot_version)
+        except (FileNotFoundError, ValueError):
+            continue
+        sample_count = len(snapshot)
         
         if sample_count > 0:
-            # Calculate text lengths
-            text_lengths = []
-            domain_counts = {}
+            text_lengths = snapshot.text_lengths()
+            domain_counts = {domain: count for domain, count in snapshot.label_counts().items() if count}
             
-            for sample in samples[:1000]:  # Limit for performance
-                text_len = len(f"{sample.title} {sample.abstract}")
-                text_lengths.append(text_len)
-                
-                for domain in sample.medical_domains or []:
-                    domain_counts[domain] = domain_counts.get(domain, 0) + 1
-            
-            avg_length = np.mean(text_lengths) if text_lengths else 0
+            avg_length = float(np.mean(text_lengths)) if len(text_lengths) else 0
             top_domains = sorted(domain_counts.items(), key=lambda x: x[1], reverse=True)[:5]
             
             stats.append({
@@ -178,6 +178,11 @@ def get_dataset_stats(request: HttpRequest, dataset_id: int):
         "domain_distribution": dataset.domain_distribution,
         "avg_title_length": dataset.avg_title_length,
         "avg_abstract_length": dataset.avg_abstract_length,
+        "token_length_profiles": {
+            tokenizer: {key: profile.get(key) for key in ('samples', 'mean', 'percentiles', 'truncated_fraction', 'recommended')}
+            for tokenizer, profile in (dataset.token_length_profiles or {}).items()
+        },
+        "snapshot_version": dataset.snapshot_version,
         "is_validated": dataset.is_validated,
         "validation_errors": dataset.validation_errors,
         "file_size_mb": dataset.file_size_mb,
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class DatasetManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'dataset_management'
+
+    def ready(self):
+        # Sample changes invalidate the dataset's columnar snapshot
+        from . import signals  # noqa: F401
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+"""
+Management command to write, list and prune columnar dataset snapshots
+"""
+from django.core.management.base import BaseCommand, CommandError
+from dataset_management.models import Dataset
+from dataset_management import snapshots
+from classification.models import MLModel
+from classification import memory_stats
+
+
+class Command(BaseCommand):
+    help = 'Write columnar snapshots of datasets and prune versions no model was trained on'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'dataset_ids',
+            nargs='*',
+            type=int,
+            help='Datasets to snapshot (default: all)'
+        )
+        parser.add_argument(
+            '--list',
+            action='store_true',
+            help='Only list the existing snapshot versions'
+        )
+        parser.add_argument(
+            '--prune',
+            action='store_true',
+            help='Delete versions that are neither current nor recorded on a model'
+        )
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.all().order_by('id')
+        if options['dataset_ids']:
+            datasets = datasets.filter(id__in=options['dataset_ids'])
+            missing = set(options['dataset_ids']) - set(datasets.values_list('id', flat=True))
+            if missing:
+                raise CommandError(f"Datasets not found: {', '.join(str(i) for i in sorted(missing))}")
+
+        for dataset in datasets:
+            if not options['list']:
+                previous = dataset.snapshot_version
+                snapshot = snapshots.write_snapshot(dataset)
+                state = 'unchanged' if snapshot.version == previous else 'written'
+                self.stdout.write(self.style.SUCCESS(
+                    f"✅ {dataset.name}: v{snapshot.version} {state} ({len(snapshot)} rows, "
+                    f"{len(snapshot.labels)} labels, {snapshot.content_hash[:12]})"
+                ))
+
+            if options['prune']:
+                referenced = set(
+                    MLModel.objects.filter(dataset=dataset, dataset_snapshot_version__isnull=False)
+                    .values_list('dataset_snapshot_version', flat=True)
+                )
+                keep = referenced | ({dataset.snapshot_version} if dataset.snapshot_version else set())
+                removed = snapshots.prune(dataset.id, sorted(keep))
+                if removed:
+                    self.stdout.write(f"   🗑️  {dataset.name}: removed {', '.join(f'v{v}' for v in removed)}")
+
+            versions = snapshots.list_versions(dataset.id)
+            current = dataset.snapshot_version
+            self.stdout.write(
+                f"   {dataset.name} (id {dataset.id}): "
+                + (', '.join(f"v{v}{'*' if v == current else ''}" for v in versions) or 'no snapshots')
+            )
+
+        self.stdout.write(f"\nPeak RSS of this run: {memory_stats.peak_rss_mb():.0f} MB")
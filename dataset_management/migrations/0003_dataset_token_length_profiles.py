@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataset_management', '0002_alter_datasetsample_dataset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='token_length_profiles',
+            field=models.JSONField(blank=True, default=dict, help_text='Token-length distribution of the samples per tokenizer, used to calibrate max_length'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dataset_management', '0003_dataset_token_length_profiles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='snapshot_version',
+            field=models.IntegerField(blank=True, help_text="Current version of the dataset's columnar snapshot", null=True),
+        ),
+    ]
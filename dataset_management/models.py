@@ -77,6 +77,15 @@ class Dataset(models.Model):
         default=dict,
         help_text="Distribution of samples per medical domain"
     )
+    token_length_profiles = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Token-length distribution of the samples per tokenizer, used to calibrate max_length"
+    )
+    snapshot_version = models.IntegerField(
+        null=True, blank=True,
+        help_text="Current version of the dataset's columnar snapshot"
+    )
     
     class Meta:
         ordering = ['-uploaded_at']
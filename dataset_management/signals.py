@@ -0,0 +1,64 @@
+"""
+Signal handlers for dataset samples
+Changes to the snapshotted fields of a dataset's samples invalidate its current
+snapshot, so the next reader (training, HPO, comparison) snapshots the samples again
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Dataset, DatasetSample
+
+# Sample fields stored in snapshots; saves limited to other fields keep the snapshot
+SNAPSHOT_FIELDS = frozenset(['dataset', 'dataset_id', 'title', 'abstract', 'medical_domains'])
+
+_deferred = threading.local()
+
+
+def invalidate_snapshot(dataset_id: int):
+    """Clear ``Dataset.snapshot_version`` so the next reader writes a fresh snapshot"""
+    Dataset.objects.filter(id=dataset_id, snapshot_version__isnull=False).update(snapshot_version=None)
+
+
+def _is_deferred(dataset_id: int) -> bool:
+    return dataset_id in getattr(_deferred, 'dataset_ids', ())
+
+
+@contextmanager
+def deferred_snapshot_invalidation(dataset: Dataset):
+    """Skip per-sample invalidation while ``dataset``'s samples are rewritten in bulk
+
+    The snapshot is invalidated once on exit (in the database and on ``dataset``)
+    instead of with one UPDATE per created or deleted sample.
+    """
+    dataset_ids = getattr(_deferred, 'dataset_ids', None)
+    if dataset_ids is None:
+        dataset_ids = _deferred.dataset_ids = set()
+    dataset_ids.add(dataset.id)
+    try:
+        yield
+    finally:
+        dataset_ids.discard(dataset.id)
+        invalidate_snapshot(dataset.id)
+        dataset.snapshot_version = None
+
+
+@receiver(post_save, sender=DatasetSample)
+def invalidate_snapshot_on_save(sender, instance, update_fields=None, **kwargs):
+    """Invalidate the dataset's snapshot when a sample's snapshotted fields may have changed"""
+    if update_fields is not None and not SNAPSHOT_FIELDS.intersection(update_fields):
+        return
+    if not _is_deferred(instance.dataset_id):
+        invalidate_snapshot(instance.dataset_id)
+
+
+@receiver(post_delete, sender=DatasetSample)
+def invalidate_snapshot_on_delete(sender, instance, origin=None, **kwargs):
+    """Invalidate the dataset's snapshot when one of its samples is deleted"""
+    if isinstance(origin, Dataset):
+        # The dataset itself is being deleted along with its samples
+        return
+    if not _is_deferred(instance.dataset_id):
+        invalidate_snapshot(instance.dataset_id)
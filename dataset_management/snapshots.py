@@ -0,0 +1,356 @@
+"""
+Immutable, versioned columnar snapshots of datasets
+Each processed dataset is written once to an uncompressed Arrow IPC file
+(sample id, title, abstract, label ids) with a manifest holding the label
+vocabulary and a content hash. Training, hyperparameter optimization, model
+comparison and the dashboard memory-map the snapshot instead of iterating
+DatasetSample rows through the ORM.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+import pyarrow.ipc as pa_ipc
+from django.conf import settings
+
+from classification import memory_stats
+
+from .models import Dataset, DatasetSample
+
+logger = logging.getLogger(__name__)
+
+FORMAT_NAME = 'dataset-snapshot'
+FORMAT_VERSION = 1
+MANIFEST_NAME = 'manifest.json'
+DATA_NAME = 'samples.arrow'
+
+SCHEMA = {
+    'sample_id': pl.Int64,
+    'title': pl.Utf8,
+    'abstract': pl.Utf8,
+    'label_ids': pl.List(pl.UInt16),
+}
+
+
+def corpus_chunk_size() -> int:
+    """Rows fetched from the database, and read back from snapshots, per chunk"""
+    return int(getattr(settings, 'CORPUS_CHUNK_SIZE', 2000))
+
+
+def snapshot_root() -> str:
+    return str(getattr(settings, 'DATASET_SNAPSHOT_PATH', settings.MEDIA_ROOT / 'dataset_snapshots'))
+
+
+def snapshot_dir(dataset_id: int, version: int) -> str:
+    return os.path.join(snapshot_root(), str(dataset_id), f"v{version}")
+
+
+def list_versions(dataset_id: int) -> List[int]:
+    """Versions of the dataset's snapshots present on disk, oldest first"""
+    directory = os.path.join(snapshot_root(), str(dataset_id))
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name[1:]) for name in os.listdir(directory)
+        if name.startswith('v') and name[1:].isdigit()
+        and os.path.exists(os.path.join(directory, name, MANIFEST_NAME))
+    )
+
+
+class DatasetSnapshot:
+    """
+    A memory-mapped dataset snapshot
+
+    Rows are in sample id order, the order the ORM returned them in, so train/
+    validation splits match those of models trained before snapshots existed.
+    """
+
+    def __init__(self, directory: str, manifest: Dict[str, Any], frame: pl.DataFrame):
+        self.directory = directory
+        self.manifest = manifest
+        self.frame = frame
+
+    @property
+    def dataset_id(self) -> int:
+        return self.manifest['dataset_id']
+
+    @property
+    def version(self) -> int:
+        return self.manifest['version']
+
+    @property
+    def content_hash(self) -> str:
+        return self.manifest['content_hash']
+
+    @property
+    def labels(self) -> List[str]:
+        """Label vocabulary in order of first appearance; ``label_ids`` index into it"""
+        return self.manifest['labels']
+
+    def __len__(self) -> int:
+        return self.frame.height
+
+    @property
+    def sample_ids(self) -> np.ndarray:
+        return self.frame['sample_id'].to_numpy()
+
+    def _rows(self, labelled_only: bool) -> pl.DataFrame:
+        if labelled_only:
+            return self.frame.filter(pl.col('label_ids').list.len() > 0)
+        return self.frame
+
+    @staticmethod
+    def _texts(rows: pl.DataFrame) -> List[str]:
+        return rows.select(
+            pl.concat_str([pl.col('title'), pl.col('abstract')], separator=' ').str.strip_chars()
+        ).to_series().to_list()
+
+    def _label_lists(self, rows: pl.DataFrame) -> List[List[str]]:
+        labels = self.labels
+        return [[labels[i] for i in ids] for ids in rows['label_ids'].to_list()]
+
+    def texts(self, labelled_only: bool = False) -> List[str]:
+        """Title + abstract of every row, the text the models are trained on"""
+        return self._texts(self._rows(labelled_only))
+
+    def label_lists(self, labelled_only: bool = False) -> List[List[str]]:
+        """Label names of every row"""
+        return self._label_lists(self._rows(labelled_only))
+
+    def iter_training_data(self, chunk_size: Optional[int] = None) -> Iterator[Tuple[List[str], List[List[str]]]]:
+        """Yield (texts, labels) of the labelled rows, ``chunk_size`` rows of the mapped file at a time"""
+        chunk_size = chunk_size or corpus_chunk_size()
+        for offset in range(0, len(self), chunk_size):
+            rows = self.frame.slice(offset, chunk_size).filter(pl.col('label_ids').list.len() > 0)
+            yield self._texts(rows), self._label_lists(rows)
+
+    def training_data(self) -> Tuple[List[str], List[List[str]]]:
+        """(texts, labels) of the labelled rows
+
+        Built chunk by chunk, so only the resulting Python lists are held in
+        memory besides the mapped file.
+        """
+        texts, labels = [], []
+        for chunk_texts, chunk_labels in self.iter_training_data():
+            texts.extend(chunk_texts)
+            labels.extend(chunk_labels)
+        return texts, labels
+
+    def label_counts(self) -> Dict[str, int]:
+        """Number of rows carrying each label"""
+        ids = self.frame['label_ids'].explode().drop_nulls().to_numpy()
+        counts = np.bincount(ids.astype(np.int64), minlength=len(self.labels))
+        return {label: int(count) for label, count in zip(self.labels, counts)}
+
+    def text_lengths(self) -> np.ndarray:
+        """Character length of every row's title + abstract"""
+        return (
+            self.frame['title'].str.len_chars() + self.frame['abstract'].str.len_chars() + 1
+        ).to_numpy()
+
+    def head(self, n: int) -> List[Dict[str, Any]]:
+        """The first ``n`` rows as dicts of sample_id, title and abstract"""
+        return self.frame.head(n).select(['sample_id', 'title', 'abstract']).to_dicts()
+
+
+@functools.lru_cache(maxsize=16)
+def _open(directory: str) -> DatasetSnapshot:
+    """Read a snapshot directory; snapshots are immutable, so opened ones are reused"""
+    with open(os.path.join(directory, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT_NAME or manifest.get('format_version', 0) > FORMAT_VERSION:
+        raise ValueError(f"Unsupported dataset snapshot {manifest.get('format')} v{manifest.get('format_version')}")
+
+    frame = pl.read_ipc(os.path.join(directory, manifest['file']), memory_map=True)
+    if frame.height != manifest['rows']:
+        raise ValueError(f"Dataset snapshot {directory} is inconsistent with its manifest")
+    return DatasetSnapshot(directory, manifest, frame)
+
+
+def _hash_field(digest, value: str):
+    encoded = value.encode('utf-8')
+    digest.update(len(encoded).to_bytes(8, 'little'))
+    digest.update(encoded)
+
+
+def stream_samples(dataset: Dataset, chunk_size: Optional[int] = None) -> Iterator[List[Tuple[int, str, str, List[str]]]]:
+    """Yield the dataset's (id, title, abstract, domains) rows in id order, ``chunk_size`` at a time
+
+    Only these columns are fetched, through a server-side cursor on databases
+    that support one, so memory stays bounded by the chunk size rather than
+    the dataset size.
+    """
+    chunk_size = chunk_size or corpus_chunk_size()
+    rows = DatasetSample.objects.filter(dataset=dataset).order_by('id').values_list(
+        'id', 'title', 'abstract', 'medical_domains'
+    ).iterator(chunk_size=chunk_size)
+    chunk = []
+    for sample_id, title, abstract, domains in rows:
+        chunk.append((sample_id, title, abstract, [str(domain) for domain in domains or []]))
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _same_samples(snapshot: DatasetSnapshot, content_hash: str, ids_digest: bytes) -> bool:
+    """Whether ``snapshot`` holds exactly the samples hashed into ``content_hash`` / ``ids_digest``"""
+    return snapshot.content_hash == content_hash and \
+        hashlib.sha256(snapshot.sample_ids.astype(np.int64).tobytes()).digest() == ids_digest
+
+
+def write_snapshot(dataset: Dataset) -> DatasetSnapshot:
+    """Snapshot the dataset's current samples and make it the dataset's current version
+
+    Rows are streamed from the database, encoded into Arrow record batches and
+    appended to the IPC file one chunk at a time, so memory stays bounded by
+    the chunk size. When the samples are unchanged since the latest snapshot,
+    that snapshot is kept and returned instead of adding a new version.
+    Concurrent writers of the same dataset (e.g. two training tasks on a just
+    invalidated dataset) each claim a version directory with an atomic rename;
+    one that loses the race to identical samples returns the winner's snapshot.
+    """
+    start = time.perf_counter()
+    peak_before = memory_stats.peak_rss_mb()
+    digest = hashlib.sha256()
+    ids_digest = hashlib.sha256()
+    # Labels get ids in order of first appearance, so every chunk is encoded as it arrives
+    index: Dict[str, int] = {}
+    rows_written = 0
+    labelled_rows = 0
+
+    # Written to a temporary directory and renamed, so readers never see a partial snapshot
+    parent = os.path.join(snapshot_root(), str(dataset.id))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = os.path.join(parent, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(tmp_dir)
+    try:
+        writer = None
+        with open(os.path.join(tmp_dir, DATA_NAME), 'wb') as sink:
+            for rows in stream_samples(dataset):
+                label_ids = []
+                for _sample_id, title, abstract, domains in rows:
+                    for value in (title, abstract, '\x1f'.join(domains)):
+                        _hash_field(digest, value)
+                    label_ids.append([index.setdefault(name, len(index)) for name in domains])
+                    labelled_rows += bool(domains)
+                sample_ids = np.array([row[0] for row in rows], dtype=np.int64)
+                ids_digest.update(sample_ids.tobytes())
+
+                table = pl.DataFrame({
+                    'sample_id': sample_ids,
+                    'title': [row[1] for row in rows],
+                    'abstract': [row[2] for row in rows],
+                    'label_ids': label_ids,
+                }, schema=SCHEMA).to_arrow()
+                if writer is None:
+                    writer = pa_ipc.new_file(sink, table.schema)
+                writer.write_table(table)
+                rows_written += len(rows)
+
+            if writer is None:
+                # No samples: an empty file with the snapshot schema
+                writer = pa_ipc.new_file(sink, pl.DataFrame(schema=SCHEMA).to_arrow().schema)
+            writer.close()
+        content_hash = digest.hexdigest()
+
+        versions = list_versions(dataset.id)
+        if versions:
+            latest = _open(snapshot_dir(dataset.id, versions[-1]))
+            if _same_samples(latest, content_hash, ids_digest.digest()):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                _set_current_version(dataset, latest.version)
+                return latest
+
+        version = (versions[-1] if versions else 0) + 1
+        manifest = {
+            'format': FORMAT_NAME,
+            'format_version': FORMAT_VERSION,
+            'dataset_id': dataset.id,
+            'content_hash': content_hash,
+            'rows': rows_written,
+            'labelled_rows': labelled_rows,
+            'labels': list(index),
+            'file': DATA_NAME,
+            'created_at': time.time(),
+        }
+        while True:
+            manifest['version'] = version
+            with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            try:
+                os.rename(tmp_dir, snapshot_dir(dataset.id, version))
+                break
+            except OSError:
+                if not os.path.isdir(snapshot_dir(dataset.id, version)):
+                    raise
+
+            # A concurrent writer claimed this version first
+            claimed = _open(snapshot_dir(dataset.id, version))
+            if _same_samples(claimed, content_hash, ids_digest.digest()):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                _set_current_version(dataset, version)
+                return claimed
+            version += 1
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _set_current_version(dataset, version)
+    logger.info(
+        f"Wrote snapshot v{version} of dataset {dataset.id}: {rows_written} rows, {len(index)} labels "
+        f"({time.perf_counter() - start:.1f}s, peak RSS {peak_before:.0f} -> {memory_stats.peak_rss_mb():.0f} MB)"
+    )
+    return _open(snapshot_dir(dataset.id, version))
+
+
+def _set_current_version(dataset: Dataset, version: int):
+    if dataset.snapshot_version != version:
+        Dataset.objects.filter(id=dataset.id).update(snapshot_version=version)
+        dataset.snapshot_version = version
+
+
+def load_snapshot(dataset: Dataset, version: Optional[int] = None) -> DatasetSnapshot:
+    """Memory-map a snapshot of ``dataset``
+
+    Without ``version`` the dataset's current snapshot is returned. It is
+    written first if the dataset has none: datasets processed before
+    snapshots existed, or whose samples changed since (see signals.py).
+
+    Raises:
+        FileNotFoundError: If the requested version does not exist
+    """
+    if version is None:
+        # Read the current version from the database: samples may have changed since ``dataset`` was loaded
+        dataset.snapshot_version = Dataset.objects.filter(id=dataset.id).values_list(
+            'snapshot_version', flat=True
+        ).first()
+        version = dataset.snapshot_version
+        if version is None or not os.path.isdir(snapshot_dir(dataset.id, version)):
+            return write_snapshot(dataset)
+
+    directory = snapshot_dir(dataset.id, version)
+    if not os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+        raise FileNotFoundError(f"Snapshot v{version} of dataset {dataset.id} not found at {directory}")
+    return _open(directory)
+
+
+def prune(dataset_id: int, keep: List[int]) -> List[int]:
+    """Delete the dataset's snapshot versions not in ``keep`` and return them"""
+    removed = []
+    for version in list_versions(dataset_id):
+        if version not in keep:
+            shutil.rmtree(snapshot_dir(dataset_id, version), ignore_errors=True)
+            removed.append(version)
+    if removed:
+        _open.cache_clear()
+    return removed
@@ -9,6 +9,8 @@ from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 
 from .models import Dataset, DatasetSample
+from .signals import deferred_snapshot_invalidation
+from .snapshots import write_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -24,6 +26,7 @@ def process_dataset_file(self, dataset_id: int) -> Dict:
     3. Creates DatasetSample objects
     4. Updates dataset statistics
     5. Runs validation checks
+    6. Writes the columnar snapshot used for training
     """
     try:
         dataset = Dataset.objects.get(id=dataset_id)
@@ -88,68 +91,70 @@ def process_dataset_file(self, dataset_id: int) -> Dict:
         
         # Note: Optional columns handled individually in processing loop
         
-        # Clear existing samples if any
-        DatasetSample.objects.filter(dataset=dataset).delete()
-        
-        # Process each row
-        samples_created = 0
-        errors = []
-        all_domains = set()
-        title_lengths = []
-        abstract_lengths = []
-        
-        for idx, row in enumerate(df.iter_rows(named=True)):
-            try:
-                # Extract medical domains using detected column
-                domains = []
-                if domain_column and domain_column in row and row[domain_column] is not None:
-                    domain_value = row[domain_column]
-                    if isinstance(domain_value, str):
-                        # Handle multiple separators: comma, semicolon, pipe
-                        if '|' in domain_value:
-                            domains = [d.strip() for d in domain_value.split('|') if d.strip()]
-                        elif ',' in domain_value:
-                            domains = [d.strip() for d in domain_value.split(',') if d.strip()]
-                        elif ';' in domain_value:
-                            domains = [d.strip() for d in domain_value.split(';') if d.strip()]
+        # Rewriting every sample invalidates the snapshot once, not once per row
+        with deferred_snapshot_invalidation(dataset):
+            # Clear existing samples if any
+            DatasetSample.objects.filter(dataset=dataset).delete()
+        
+            # Process each row
+            samples_created = 0
+            errors = []
+            all_domains = set()
+            title_lengths = []
+            abstract_lengths = []
+        
+            for idx, row in enumerate(df.iter_rows(named=True)):
+                try:
+                    # Extract medical domains using detected column
+                    domains = []
+                    if domain_column and domain_column in row and row[domain_column] is not None:
+                        domain_value = row[domain_column]
+                        if isinstance(domain_value, str):
+                            # Handle multiple separators: comma, semicolon, pipe
+                            if '|' in domain_value:
+                                domains = [d.strip() for d in domain_value.split('|') if d.strip()]
+                            elif ',' in domain_value:
+                                domains = [d.strip() for d in domain_value.split(',') if d.strip()]
+                            elif ';' in domain_value:
+                                domains = [d.strip() for d in domain_value.split(';') if d.strip()]
+                            else:
+                                # Single domain
+                                domains = [domain_value.strip()]
+                        elif isinstance(domain_value, list):
+                            domains = [str(d).strip() for d in domain_value if d]
                         else:
-                            # Single domain
-                            domains = [domain_value.strip()]
-                    elif isinstance(domain_value, list):
-                        domains = [str(d).strip() for d in domain_value if d]
-                    else:
-                        # Convert other types to string
-                        domains = [str(domain_value).strip()]
+                            # Convert other types to string
+                            domains = [str(domain_value).strip()]
                 
-                # Clean and normalize domain names
-                domains = [d.lower().replace(' ', '_').replace('-', '_') for d in domains if d]
-                all_domains.update(domains)
+                    # Clean and normalize domain names
+                    domains = [d.lower().replace(' ', '_').replace('-', '_') for d in domains if d]
+                    all_domains.update(domains)
                 
-                # Create sample
-                sample = DatasetSample.objects.create(
-                    dataset=dataset,
-                    title=str(row['title']),
-                    abstract=str(row['abstract']),
-                    medical_domains=domains,
-                    authors=str(row.get('authors', '')) if row.get('authors') is not None else '',
-                    journal=str(row.get('journal', '')) if row.get('journal') is not None else '',
-                    publication_year=int(row['publication_year']) if row.get('publication_year') is not None else None,
-                    doi=str(row.get('doi', '')) if row.get('doi') is not None else '',
-                )
+                    # Create sample
+                    sample = DatasetSample.objects.create(
+                        dataset=dataset,
+                        title=str(row['title']),
+                        abstract=str(row['abstract']),
+                        medical_domains=domains,
+                        authors=str(row.get('authors', '')) if row.get('authors') is not None else '',
+                        journal=str(row.get('journal', '')) if row.get('journal') is not None else '',
+                        publication_year=int(row['publication_year']) if row.get('publication_year') is not None else None,
+                        doi=str(row.get('doi', '')) if row.get('doi') is not None else '',
+                    )
                 
-                # Collect statistics
-                title_lengths.append(len(sample.title))
-                abstract_lengths.append(len(sample.abstract))
-                samples_created += 1
+                    # Collect statistics
+                    title_lengths.append(len(sample.title))
+                    abstract_lengths.append(len(sample.abstract))
+                    samples_created += 1
                 
-            except Exception as e:
-                error_msg = f"Error processing row {idx}: {str(e)}"
-                errors.append(error_msg)
-                logger.warning(error_msg)
+                except Exception as e:
+                    error_msg = f"Error processing row {idx}: {str(e)}"
+                    errors.append(error_msg)
+                    logger.warning(error_msg)
                 
-                # Stop if too many errors
-                if len(errors) > 100:
-                    break
+                    # Stop if too many errors
+                    if len(errors) > 100:
+                        break
         
         # Update dataset statistics
         dataset.total_samples = samples_created
@@ -162,8 +167,8 @@ def process_dataset_file(self, dataset_id: int) -> Dict:
         
         # Calculate domain distribution
         domain_counts = {}
-        for sample in DatasetSample.objects.filter(dataset=dataset):
-            for domain in sample.medical_domains:
+        for domains in DatasetSample.objects.filter(dataset=dataset).values_list('medical_domains', flat=True).iterator():
+            for domain in domains or []:
                 domain_counts[domain] = domain_counts.get(domain, 0) + 1
         
         dataset.domain_distribution = domain_counts
@@ -171,12 +176,20 @@ def process_dataset_file(self, dataset_id: int) -> Dict:
         dataset.is_validated = len(errors) == 0
         dataset.save()
         
+        # Training reads the snapshot; if writing it fails here it is written on first use
+        snapshot_version = None
+        try:
+            snapshot_version = write_snapshot(dataset).version
+        except Exception as e:
+            logger.warning(f"Could not write snapshot of dataset {dataset.id}: {str(e)}")
+        
         result = {
             "status": "success",
             "samples_created": samples_created,
             "total_domains": len(all_domains),
             "errors": len(errors),
-            "is_validated": dataset.is_validated
+            "is_validated": dataset.is_validated,
+            "snapshot_version": snapshot_version
         }
         
         logger.info(f"Dataset processing completed: {result}")
@@ -237,8 +250,8 @@ def validate_dataset_task(dataset_id: int) -> Dict:
         
         # Check domain consistency
         all_domains = set()
-        for sample in samples:
-            all_domains.update(sample.medical_domains)
+        for domains in samples.values_list('medical_domains', flat=True).iterator():
+            all_domains.update(domains or [])
         
         # Update dataset
         dataset.validation_errors = errors
@@ -288,7 +301,8 @@ def preprocess_dataset_samples(dataset_id: int) -> Dict:
             sample.preprocessed_title = processed_title
             sample.preprocessed_abstract = processed_abstract
             sample.is_preprocessed = True
-            sample.save()
+            # Preprocessed fields are not in the snapshot, so it stays valid
+            sample.save(update_fields=['preprocessed_title', 'preprocessed_abstract', 'is_preprocessed'])
             
             samples_processed += 1
         
@@ -1,3 +1,139 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from . import snapshots
+from .models import Dataset, DatasetSample
+from .signals import deferred_snapshot_invalidation
+
+
+class DatasetSnapshotTests(TestCase):
+    """Snapshot writing, reuse of unchanged samples and invalidation on sample changes"""
+
+    def setUp(self):
+        self.snapshot_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.snapshot_root, ignore_errors=True)
+        settings_override = override_settings(DATASET_SNAPSHOT_PATH=self.snapshot_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        snapshots._open.cache_clear()
+        self.addCleanup(snapshots._open.cache_clear)
+
+        self.dataset = Dataset.objects.create(name='Abstracts', file_path='datasets/abstracts.csv')
+        self.samples = [
+            DatasetSample.objects.create(
+                dataset=self.dataset, title='Statins after infarction', abstract='A cohort study.',
+                medical_domains=['Cardiology']
+            ),
+            DatasetSample.objects.create(
+                dataset=self.dataset, title='Glioma in children', abstract='A case series.',
+                medical_domains=['Oncology', 'Neurology']
+            ),
+            DatasetSample.objects.create(
+                dataset=self.dataset, title='Unlabelled abstract', abstract='No domains yet.',
+                medical_domains=[]
+            ),
+        ]
+
+    def current_version(self):
+        return Dataset.objects.get(id=self.dataset.id).snapshot_version
+
+    def test_write_and_load(self):
+        snapshot = snapshots.load_snapshot(self.dataset)
+
+        self.assertEqual(snapshot.version, 1)
+        self.assertEqual(self.current_version(), 1)
+        self.assertEqual(len(snapshot), 3)
+        self.assertEqual(list(snapshot.sample_ids), [sample.id for sample in self.samples])
+        self.assertEqual(snapshot.labels, ['Cardiology', 'Oncology', 'Neurology'])
+        self.assertEqual(snapshot.label_counts(), {'Cardiology': 1, 'Oncology': 1, 'Neurology': 1})
+
+        texts, labels = snapshot.training_data()
+        self.assertEqual(texts, ['Statins after infarction A cohort study.', 'Glioma in children A case series.'])
+        self.assertEqual(labels, [['Cardiology'], ['Oncology', 'Neurology']])
+
+    def test_chunked_reads_match_whole_reads(self):
+        snapshot = snapshots.load_snapshot(self.dataset)
+
+        chunks = list(snapshot.iter_training_data(chunk_size=1))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(
+            ([text for texts, _ in chunks for text in texts], [label for _, labels in chunks for label in labels]),
+            snapshot.training_data()
+        )
+
+    def test_unchanged_samples_reuse_the_snapshot(self):
+        first = snapshots.write_snapshot(self.dataset)
+        second = snapshots.write_snapshot(self.dataset)
+
+        self.assertEqual(second.version, first.version)
+        self.assertEqual(snapshots.list_versions(self.dataset.id), [1])
+        self.assertIs(snapshots.load_snapshot(self.dataset), first)
+
+    def test_sample_change_invalidates_the_snapshot(self):
+        snapshots.load_snapshot(self.dataset)
+
+        self.samples[0].title = 'Statins after myocardial infarction'
+        self.samples[0].save()
+        self.assertIsNone(self.current_version())
+
+        snapshot = snapshots.load_snapshot(self.dataset)
+        self.assertEqual(snapshot.version, 2)
+        self.assertEqual(snapshot.head(1)[0]['title'], 'Statins after myocardial infarction')
+        self.assertEqual(snapshots.load_snapshot(self.dataset, version=1).head(1)[0]['title'],
+                         'Statins after infarction')
+
+    def test_sample_delete_invalidates_the_snapshot(self):
+        snapshots.load_snapshot(self.dataset)
+
+        self.samples[2].delete()
+        self.assertIsNone(self.current_version())
+        self.assertEqual(len(snapshots.load_snapshot(self.dataset)), 2)
+
+    def test_preprocessing_keeps_the_snapshot(self):
+        snapshots.load_snapshot(self.dataset)
+
+        sample = self.samples[0]
+        sample.preprocessed_title = 'statin infarct'
+        sample.is_preprocessed = True
+        sample.save(update_fields=['preprocessed_title', 'is_preprocessed'])
+
+        self.assertEqual(self.current_version(), 1)
+
+    def test_bulk_ingestion_invalidates_once_on_exit(self):
+        snapshots.load_snapshot(self.dataset)
+
+        with deferred_snapshot_invalidation(self.dataset):
+            DatasetSample.objects.filter(dataset=self.dataset).delete()
+            for i in range(3):
+                DatasetSample.objects.create(dataset=self.dataset, title=f'Reimported {i}', abstract='Abstract')
+            self.assertEqual(self.current_version(), 1)
+
+        self.assertIsNone(self.current_version())
+        self.assertIsNone(self.dataset.snapshot_version)
+        self.assertEqual(snapshots.load_snapshot(self.dataset).version, 2)
+
+    def test_concurrent_writer_of_the_same_samples_returns_the_claimed_version(self):
+        first = snapshots.write_snapshot(self.dataset)
+
+        # A writer that listed the versions before the first one renamed its directory
+        with mock.patch.object(snapshots, 'list_versions', return_value=[]):
+            second = snapshots.write_snapshot(self.dataset)
+
+        self.assertEqual(second.version, first.version)
+        self.assertEqual(os.listdir(os.path.join(self.snapshot_root, str(self.dataset.id))), ['v1'])
+
+    def test_concurrent_writer_of_other_samples_takes_the_next_version(self):
+        snapshots.write_snapshot(self.dataset)
+        self.samples[1].medical_domains = ['Oncology']
+        self.samples[1].save()
+
+        with mock.patch.object(snapshots, 'list_versions', return_value=[]):
+            snapshot = snapshots.write_snapshot(self.dataset)
+
+        self.assertEqual(snapshot.version, 2)
+        self.assertEqual(self.current_version(), 2)
+        self.assertEqual(snapshots.list_versions(self.dataset.id), [1, 2])
@@ -0,0 +1,28 @@
+"""
+Gunicorn server hooks (loaded automatically from the working directory)
+
+Model warm-up and copy-on-write preloading start here, when a server actually
+starts, instead of as a side effect of importing medlitbot_project.wsgi
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medlitbot_project.settings')
+
+
+def when_ready(server):
+    """Master, before workers are forked: load the hot models once to share them copy-on-write"""
+    from django.conf import settings
+    if not (getattr(settings, 'ML_WARMUP_ENABLED', False) and getattr(settings, 'ML_SHARE_MODEL_WEIGHTS', False)):
+        return
+
+    import django
+    django.setup()
+    from classification.shared_weights import preload_for_fork
+    # Workers run the synthetic warm-up inference themselves (post_worker_init)
+    preload_for_fork(trigger='wsgi')
+
+
+def post_worker_init(worker):
+    """Each worker, once the application is loaded: warm the hot models in the background"""
+    from classification.warmup import warm_up_in_background
+    warm_up_in_background(trigger='wsgi')
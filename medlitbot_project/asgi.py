@@ -20,9 +20,13 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medlitbot_project.settings')
 django_asgi_app = get_asgi_application()
 
 from medlitbot_project.routing import websocket_urlpatterns
+from classification.warmup import lifespan_app
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
+    # Hot models are warmed when the server starts, not when this module is imported;
+    # /api/classification/ready reports 503 until they are warm
+    "lifespan": lifespan_app,
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
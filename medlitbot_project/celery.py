@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import celeryd_after_setup, worker_process_init, worker_process_shutdown
 
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'medlitbot_project.settings')
@@ -29,6 +30,55 @@ app.conf.worker_prefetch_multiplier = 1
 app.conf.task_acks_late = True
 app.conf.worker_max_tasks_per_child = 1000
 
+
+@celeryd_after_setup.connect
+def record_worker_layout(sender, instance, **kwargs):
+    """Tell the execution profile which queues this worker serves and its pool size (before forking)"""
+    from classification.execution_profiles import set_process_hints, role_for_queues
+    set_process_hints(
+        role=role_for_queues(instance.app.amqp.queues.consume_from.keys()),
+        host_processes=instance.concurrency if isinstance(instance.concurrency, int) else None
+    )
+
+
+@celeryd_after_setup.connect
+def preload_shared_weights(sender, instance, **kwargs):
+    """Load the hot models once in the parent so prefork children share them copy-on-write"""
+    from classification.execution_profiles import PREDICTION, role_for_queues
+    from classification.shared_weights import preload_for_fork, sharing_enabled
+    from classification.warmup import warmup_enabled
+    if not (warmup_enabled() and sharing_enabled()):
+        return
+    if role_for_queues(instance.app.amqp.queues.consume_from.keys()) == PREDICTION:
+        # Children run the synthetic warm-up inference from warm_model_pool
+        preload_for_fork(trigger='celery')
+
+
+@worker_process_init.connect
+def configure_execution_profile(**kwargs):
+    """Apply the CPU execution profile in each pool process"""
+    from classification.execution_profiles import apply_profile, profile_from_settings
+    apply_profile(profile_from_settings())
+
+
+@worker_process_init.connect
+def warm_model_pool(**kwargs):
+    """Preload the hot models in prediction pool processes (runs after the execution profile)"""
+    from classification.execution_profiles import PREDICTION, get_active_profile
+    from classification.warmup import warm_up_in_background
+    profile = get_active_profile()
+    if profile is None or profile.role == PREDICTION:
+        # Background thread: worker_process_init must return within worker_proc_alive_timeout
+        warm_up_in_background(trigger='celery')
+
+
+@worker_process_shutdown.connect
+def flush_classification_results(**kwargs):
+    """Flush write-behind ClassificationResult rows before a worker process exits"""
+    from classification.result_writer import flush_pending_results
+    flush_pending_results()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 import os
 from pathlib import Path
-from decouple import config
+from decouple import config, Csv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -174,6 +174,12 @@ REDIS_PORT = config('REDIS_PORT', default=6379, cast=int)
 REDIS_DB = config('REDIS_DB', default=0, cast=int)
 REDIS_URL = f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}"
 
+# Prediction cache (content-addressed model outputs, see classification/prediction_cache.py)
+PREDICTION_CACHE_ENABLED = config('PREDICTION_CACHE_ENABLED', default=True, cast=bool)
+PREDICTION_CACHE_ALIAS = 'predictions'
+PREDICTION_CACHE_TTL = config('PREDICTION_CACHE_TTL', default=86400, cast=int)  # 24 hours
+PREDICTION_CACHE_MAX_ENTRIES = config('PREDICTION_CACHE_MAX_ENTRIES', default=50000, cast=int)  # locmem fallback only
+
 # Cache Configuration with Redis fallback
 try:
     import redis
@@ -189,6 +195,16 @@ try:
             "OPTIONS": {
                 "CLIENT_CLASS": "django_redis.client.DefaultClient",
             }
+        },
+        # Size is bounded by TTL here; set maxmemory/allkeys-lru on the Redis server for a hard cap
+        "predictions": {
+            "BACKEND": "django_redis.cache.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "predictions",
+            "TIMEOUT": PREDICTION_CACHE_TTL,
+            "OPTIONS": {
+                "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            }
         }
     }
     
@@ -204,6 +220,14 @@ except (redis.ConnectionError, redis.TimeoutError, Exception) as e:
         "default": {
             "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
             "LOCATION": "medlitbot-cache",
+        },
+        "predictions": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "medlitbot-predictions",
+            "TIMEOUT": PREDICTION_CACHE_TTL,
+            "OPTIONS": {
+                "MAX_ENTRIES": PREDICTION_CACHE_MAX_ENTRIES,
+            }
         }
     }
     
@@ -378,14 +402,66 @@ os.makedirs(BASE_DIR / 'logs', exist_ok=True)
 
 
 # ML/AI Configuration
-ML_MODEL_CACHE_TTL = 300  # 5 minutes
+ML_MODEL_CACHE_TTL = config('ML_MODEL_CACHE_TTL', default=300, cast=int)  # Idle seconds before a loaded model is evicted
+ML_MODEL_CACHE_MAX_MEMORY_MB = config('ML_MODEL_CACHE_MAX_MEMORY_MB', default=4096, cast=int)  # Memory budget for loaded models
+ML_MODEL_CACHE_MAX_ENTRIES = config('ML_MODEL_CACHE_MAX_ENTRIES', default=4, cast=int)  # Max loaded models per process
+ML_WARMUP_ENABLED = config('ML_WARMUP_ENABLED', default=False, cast=bool)  # Preload hot models at Celery worker, gunicorn worker and ASGI (lifespan) startup
+ML_WARMUP_MODEL_IDS = config('ML_WARMUP_MODEL_IDS', default='', cast=Csv(int))  # Hot models; empty = best-F1 trained model per type
+ML_WARMUP_PIN_MODELS = config('ML_WARMUP_PIN_MODELS', default=False, cast=bool)  # Exempt warmed models from TTL/LRU eviction (within the registry budget)
+ML_SHARE_MODEL_WEIGHTS = config('ML_SHARE_MODEL_WEIGHTS', default=False, cast=bool)  # Load hot models in the Celery/gunicorn master, shared copy-on-write
 DEFAULT_PREDICTION_THRESHOLD = 0.5
 MAX_SEQUENCE_LENGTH = 512
 BATCH_SIZE = 16
+PREDICTION_BATCH_SIZE = config('PREDICTION_BATCH_SIZE', default=64, cast=int)  # Texts per predict() call in batch classification
+TRADITIONAL_TRAINING_N_JOBS = config('TRADITIONAL_TRAINING_N_JOBS', default=-1, cast=int)  # Labels fitted in parallel (-1 = all cores)
+ML_INFERENCE_BACKEND = config('ML_INFERENCE_BACKEND', default='eager')  # Transformer serving backend: eager, torchscript or onnx (overridable per model)
+GEMMA_SCORING_MODE = config('GEMMA_SCORING_MODE', default='generate')  # 'generate' (parse generated text) or 'likelihood' (per-label yes/no likelihoods)
+GEMMA_LIKELIHOOD_MAX_ROWS = config('GEMMA_LIKELIHOOD_MAX_ROWS', default=8, cast=int)  # (text, label) questions per likelihood forward pass
+GEMMA_LOW_MEMORY = config('GEMMA_LOW_MEMORY', default=False, cast=bool)  # Stream reduced-precision weights on CPU instead of float32
+GEMMA_CPU_DTYPE = config('GEMMA_CPU_DTYPE', default='bfloat16')  # Weight dtype for the low-memory CPU path
+GEMMA_WEIGHT_QUANTIZATION = config('GEMMA_WEIGHT_QUANTIZATION', default='')  # 'int8' for weight-only quantization (needs torchao)
+HYBRID_CONCURRENT_COMPONENTS = config('HYBRID_CONCURRENT_COMPONENTS', default=True, cast=bool)  # Overlap TF-IDF scoring with the transformer forward pass
+HYBRID_PIPELINE_BATCH_SIZE = config('HYBRID_PIPELINE_BATCH_SIZE', default=16, cast=int)  # Texts per hybrid pipeline stage (0 = whole batch)
+
+# CPU execution profile for torch ('auto' = 'm1_safe' on Apple Silicon, 'cpu' elsewhere)
+ML_EXECUTION_PROFILE = config('ML_EXECUTION_PROFILE', default='auto')
+ML_EXECUTION_ROLE = config('ML_EXECUTION_ROLE', default='')  # training/prediction; empty = derive from Celery queues
+ML_HOST_PROCESSES = config('ML_HOST_PROCESSES', default=0, cast=int)  # ML processes sharing the host's cores; 0 = Celery concurrency
+ML_INTRA_OP_THREADS = config('ML_INTRA_OP_THREADS', default=0, cast=int)  # Explicit torch threads per process; 0 = cores / processes
+
+# Micro-batching of concurrent single-article predictions (opt-in)
+ML_MICRO_BATCHING_ENABLED = config('ML_MICRO_BATCHING_ENABLED', default=False, cast=bool)
+ML_MICRO_BATCH_MAX_SIZE = config('ML_MICRO_BATCH_MAX_SIZE', default=16, cast=int)  # Max requests per batched forward pass
+ML_MICRO_BATCH_WINDOW_MS = config('ML_MICRO_BATCH_WINDOW_MS', default=10, cast=float)  # How long to wait for more requests
+ML_MICRO_BATCH_TIMEOUT = config('ML_MICRO_BATCH_TIMEOUT', default=30, cast=float)  # Seconds a caller waits for its result
+
+# Transformer training data pipeline
+TRAINING_LENGTH_BUCKETING = config('TRAINING_LENGTH_BUCKETING', default=True, cast=bool)  # Batch similar-length texts, pad per batch instead of to max_length
+# Persistent cache of tokenized training/evaluation texts (memory-mapped .npy per dataset + tokenizer + max_length)
+TOKEN_CACHE_ENABLED = config('TOKEN_CACHE_ENABLED', default=True, cast=bool)
+TOKEN_CACHE_PATH = config('TOKEN_CACHE_PATH', default='') or str(BASE_DIR / 'token_cache')
+TOKEN_CACHE_MAX_SIZE_MB = config('TOKEN_CACHE_MAX_SIZE_MB', default=2048, cast=int)  # Least recently used entries evicted above this
+TOKEN_CACHE_MAX_AGE_DAYS = config('TOKEN_CACHE_MAX_AGE_DAYS', default=30, cast=int)  # Entries unused this long are evicted; 0 = never
+TOKEN_CACHE_WORKERS = config('TOKEN_CACHE_WORKERS', default=0, cast=int)  # Tokenization pool size; 0 = available cores
+# Pick max_length from the dataset's token-length profile unless a model sets it explicitly
+MAX_LENGTH_CALIBRATION = config('MAX_LENGTH_CALIBRATION', default=True, cast=bool)
+MAX_LENGTH_COVERAGE_PERCENTILE = config('MAX_LENGTH_COVERAGE_PERCENTILE', default=98, cast=float)  # Share of texts that must fit untruncated
+
+# Write-behind persistence of ClassificationResult rows
+# 'sync' = INSERT in request path, 'async' = buffered with backpressure, 'best_effort' = buffered, drop oldest when full
+# The buffered modes are opt-in: their prediction responses carry result_id None until the row is flushed
+CLASSIFICATION_RESULT_WRITE_MODE = config('CLASSIFICATION_RESULT_WRITE_MODE', default='sync')
+CLASSIFICATION_RESULT_BUFFER_SIZE = config('CLASSIFICATION_RESULT_BUFFER_SIZE', default=1000, cast=int)
+CLASSIFICATION_RESULT_FLUSH_SIZE = config('CLASSIFICATION_RESULT_FLUSH_SIZE', default=100, cast=int)
+CLASSIFICATION_RESULT_FLUSH_INTERVAL = config('CLASSIFICATION_RESULT_FLUSH_INTERVAL', default=1.0, cast=float)  # Seconds
+CLASSIFICATION_RESULT_MAX_RETRIES = config('CLASSIFICATION_RESULT_MAX_RETRIES', default=5, cast=int)  # Failed flushes retried with backoff before rows are dropped (async mode)
 
 # Model storage paths
 MODEL_STORAGE_PATH = MEDIA_ROOT / 'trained_models'
 DATASET_STORAGE_PATH = MEDIA_ROOT / 'datasets'
+DATASET_SNAPSHOT_PATH = MEDIA_ROOT / 'dataset_snapshots'
+# Rows per chunk when streaming samples from the database into snapshots and reading them back
+CORPUS_CHUNK_SIZE = config('CORPUS_CHUNK_SIZE', default=2000, cast=int)
 
 # Create necessary directories
 os.makedirs(MODEL_STORAGE_PATH, exist_ok=True)